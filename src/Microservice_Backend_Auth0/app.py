@@ -1,10 +1,28 @@
-from flask import Flask, make_response, jsonify, redirect, request
+from flask import Flask, Response, g, make_response, jsonify, redirect, request
 from dotenv import load_dotenv
-from cryptography.hazmat.primitives import serialization
+from signing import JWTSigner
+from common.token_cache import VerifiedTokenCache
+from http_client import UpstreamClient
+from session_queue import SessionWriteBehind
+from common.internal_auth import sign_request, verify_request
+from common.revocation import RevocationList
+from common.invalidation import InvalidationBus
+from common.metrics import FAST_LATENCY_BUCKETS, REGISTRY, record_request
+from common.request_log import REQUEST_ID_HEADER, SampledLogger, bind_request_id, current_request_id
+from common.tracing import TRACEPARENT_HEADER, TRACER, create_exporter
+from common.profiling import ProfilerBusy, RequestProfiler, SamplingProfiler
 from datetime import timezone
+import hashlib
+import json
 import os
+import signal
+import time
 import requests
 import jwt
+import redis
+import redis.cluster
+import redis.sentinel
+import uuid
 import datetime
 
 # -----------------------------
@@ -19,9 +37,10 @@ app = Flask(__name__)
 load_dotenv()
 
 AUTH0_DOMAIN = os.getenv("AUTH0_DOMAIN")
-AUTH_URL = f"https://{AUTH0_DOMAIN}/authorize"
-TOKEN_URL = f"https://{AUTH0_DOMAIN}/oauth/token"
-USERINFO_URL = f"https://{AUTH0_DOMAIN}/userinfo"
+AUTH0_BASE_URL = os.getenv("AUTH0_BASE_URL") or f"https://{AUTH0_DOMAIN}" # Override for a stand-in, e.g. src/benchmarks/fake_auth0.py
+AUTH_URL = f"{AUTH0_BASE_URL}/authorize"
+TOKEN_URL = f"{AUTH0_BASE_URL}/oauth/token"
+USERINFO_URL = f"{AUTH0_BASE_URL}/userinfo"
 REDIS_MICROSERVICE_DOMAIN = os.getenv("REDIS_MICROSERVICE_DOMAIN")
 CALLBACK_URL = os.getenv("CALLBACK_URL")
 CLIENT_ID = os.getenv("CLIENT_ID") 
@@ -30,6 +49,192 @@ CLIENT_SECRET = os.getenv("CLIENT_SECRET")
 # App specific
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
+# Signing key
+PRIVATE_KEY_PATH = os.getenv("PRIVATE_KEY_PATH", "private.pem")
+PRIVATE_KEY_POLL_INTERVAL = float(os.getenv("PRIVATE_KEY_POLL_INTERVAL", "5")) # 0 disables rotation
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM") or None # RS256, ES256 or EdDSA, unset follows the key type
+
+# Verification
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000")) # 0 disables the verified token cache
+MAX_BATCH_VERIFY = int(os.getenv("MAX_BATCH_VERIFY", "100")) # Most tokens accepted by one batch /verify-user
+JWKS_MAX_AGE = int(os.getenv("JWKS_MAX_AGE", "300")) # Seconds clients may cache /.well-known/jwks.json
+
+# Outbound HTTP (Auth0 and the Redis microservice)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "50")) # Keep-alive connections per host
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3")) # Seconds
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10")) # Seconds
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2")) # Retries for idempotent calls only
+
+# Redis shared with the Redis microservice, e.g. redis://:password@localhost:6379/0, for the
+# revocation list and the cache invalidation bus
+# Unset: /verify-user doesn't check revocations (a logged out token stays valid until exp)
+# and this replica's verified token cache only learns about logouts through the revocation list
+SHARED_REDIS_URL = os.getenv("SHARED_REDIS_URL")
+# Same deployment as the Redis microservice's REDIS_MODE: "standalone", "cluster" (URL of any node)
+# or "sentinel" (the URL only supplies password/db, the master is found through SHARED_REDIS_SENTINELS)
+SHARED_REDIS_MODE = os.getenv("SHARED_REDIS_MODE", "standalone")
+SHARED_REDIS_SENTINELS = os.getenv("SHARED_REDIS_SENTINELS", "localhost:26379") # host:port,...
+SHARED_REDIS_SENTINEL_SERVICE = os.getenv("SHARED_REDIS_SENTINEL_SERVICE", "mymaster")
+if SHARED_REDIS_MODE not in ("standalone", "cluster", "sentinel"):
+    raise ValueError(f"SHARED_REDIS_MODE must be 'standalone', 'cluster' or 'sentinel', got {SHARED_REDIS_MODE!r}")
+REVOCATION_CAPACITY = int(os.getenv("REVOCATION_CAPACITY", "100000"))
+REVOCATION_ERROR_RATE = float(os.getenv("REVOCATION_ERROR_RATE", "0.001"))
+REVOCATION_REBUILD_INTERVAL = float(os.getenv("REVOCATION_REBUILD_INTERVAL", "300")) # Seconds
+
+# Internal channel, calls to the Redis microservice are HMAC signed so it can skip re-verifying our own JWTs
+INTERNAL_AUTH_SECRET = os.getenv("INTERNAL_AUTH_SECRET") # Unset sends plain calls
+
+# Write-behind session creation (redirect before the Redis microservice has stored the session)
+SESSION_WRITE_BEHIND = os.getenv("SESSION_WRITE_BEHIND", "false") == "true"
+SESSION_QUEUE_MAX_SIZE = int(os.getenv("SESSION_QUEUE_MAX_SIZE", "10000")) # Past this, logins create sessions synchronously
+SESSION_QUEUE_BATCH_SIZE = int(os.getenv("SESSION_QUEUE_BATCH_SIZE", "100"))
+SESSION_QUEUE_MAX_ATTEMPTS = int(os.getenv("SESSION_QUEUE_MAX_ATTEMPTS", "5"))
+
+DEFER_BACKGROUND_THREADS = os.getenv("DEFER_BACKGROUND_THREADS", "false") == "true" # Set by gunicorn.conf.py
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01")) # Fraction of routine request events logged, 0 disables
+METRICS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") # Directory the workers share metric snapshots in, set by gunicorn.conf.py
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5")) # Seconds between a worker's metric snapshots
+
+# Tracing, see common/tracing.py
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none") # none, file (JSON lines) or otlp (OpenTelemetry collector)
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl") # Appended to with TRACING_EXPORTER=file
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces") # With TRACING_EXPORTER=otlp
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0")) # Fraction of new traces recorded, incoming ones keep their caller's decision
+
+# Profiling, see common/profiling.py
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false") == "true" # POST /admin/profile and SIGUSR2 sampling profiles
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles") # Where SIGUSR2 and slow request profiles are written
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10")) # Length of a SIGUSR2 sampling profile
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "25")) # Longest /admin/profile run, keep under GUNICORN_TIMEOUT
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0")) # cProfile requests slower than this, 0 disables
+PROFILE_REQUEST_RATE = float(os.getenv("PROFILE_REQUEST_RATE", "0.01")) # Fraction of requests run under cProfile when enabled
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "100")) # Slow request profiles kept per process
+
+# Parsed once here, rotated in the background when private.pem changes
+jwt_signer = JWTSigner(PRIVATE_KEY_PATH, algorithm=JWT_ALGORITHM, poll_interval=PRIVATE_KEY_POLL_INTERVAL)
+
+# Claims of tokens that already passed verification, so repeat page views skip RS256
+verified_token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE)
+
+# Revoked jtis, checked in memory through a Bloom filter kept in sync over Redis pub/sub,
+# and the invalidation bus that keeps every replica's verified token cache in step
+revocation_list = None
+invalidation_bus = None
+def create_shared_redis():
+    """
+    Returns the client for SHARED_REDIS_URL in SHARED_REDIS_MODE
+    """
+    options = {"decode_responses": True, "socket_timeout": 2, "socket_connect_timeout": 2}
+    if SHARED_REDIS_MODE == "cluster":
+        return redis.cluster.RedisCluster.from_url(SHARED_REDIS_URL, **options)
+    if SHARED_REDIS_MODE == "sentinel":
+        url = redis.connection.parse_url(SHARED_REDIS_URL)
+        sentinels = [(host, int(port)) for host, port in (item.rsplit(":", 1) for item in SHARED_REDIS_SENTINELS.split(","))]
+        return redis.sentinel.Sentinel(sentinels, sentinel_kwargs=options).master_for(
+            SHARED_REDIS_SENTINEL_SERVICE,
+            password=url.get("password"),
+            db=url.get("db", 0),
+            **options
+        )
+    return redis.Redis.from_url(SHARED_REDIS_URL, **options)
+
+if SHARED_REDIS_URL:
+    shared_redis = create_shared_redis()
+    revocation_list = RevocationList(
+        shared_redis,
+        capacity=REVOCATION_CAPACITY,
+        error_rate=REVOCATION_ERROR_RATE,
+        rebuild_interval=REVOCATION_REBUILD_INTERVAL
+    )
+
+    invalidation_bus = InvalidationBus(shared_redis)
+    invalidation_bus.on("tokens", lambda keys: drop_cached_tokens(keys))
+    invalidation_bus.on("keys", lambda _: jwt_signer.rotate_if_changed()) # Pick up a rotation now, not at the next poll
+    invalidation_bus.on("clear", lambda _: verified_token_cache.clear())
+    invalidation_bus.on_resync(verified_token_cache.clear)
+    jwt_signer.on_change = lambda: invalidation_bus.publish("keys")
+
+# Keep-alive connections reused across logins instead of a new TCP/TLS handshake per call
+http_client = UpstreamClient(
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    connect_timeout=HTTP_CONNECT_TIMEOUT,
+    read_timeout=HTTP_READ_TIMEOUT,
+    retries=HTTP_RETRIES
+)
+
+# Exact counts go to /metrics, routine per-request events are only logged for a sample
+request_log = SampledLogger("auth0_microservice", LOG_SAMPLE_RATE)
+JWT_VERIFY_SECONDS = REGISTRY.histogram("jwt_verify_duration_seconds", "JWT signature verification latency", ("algorithm",), FAST_LATENCY_BUCKETS)
+JWT_VERIFICATIONS = REGISTRY.counter("jwt_verifications_total", "Tokens checked on a verified token cache miss", ("result",))
+
+# On-demand stack sampling, and cProfile captures of slow requests
+sampling_profiler = SamplingProfiler(max_seconds=PROFILE_MAX_SECONDS)
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_SLOW_REQUEST_MS, PROFILE_REQUEST_RATE, PROFILE_MAX_CAPTURES)
+
+# Spans for every request and upstream call, one trace per login across the frontend and both microservices
+TRACER.configure("auth0_microservice", create_exporter(TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT), TRACING_SAMPLE_RATE)
+
+def cache_hit_ratios():
+    """
+    Hit ratio per in-process cache, read on each /metrics scrape
+    - revocation_filter: lookups the Bloom filter answered without asking Redis
+    """
+    ratios = {("verified_token_cache",): verified_token_cache.stats()["hit_ratio"]}
+    revocation = revocation_list.stats() if revocation_list else None
+    if revocation and revocation["lookups"]:
+        ratios[("revocation_filter",)] = revocation["filter_negatives"] / revocation["lookups"]
+    return ratios
+
+REGISTRY.gauge("cache_hit_ratio", "Hits over lookups since the process started", ("cache",), cache_hit_ratios)
+
+# Under gunicorn /metrics sums every worker's snapshot, not only the worker the scrape reached
+if METRICS_MULTIPROC_DIR:
+    REGISTRY.share_across_processes(METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL)
+
+@app.before_request
+def start_request_timer():
+    bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.request_started = time.perf_counter()
+    if TRACER.enabled:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.request_span = TRACER.start_span(
+            f"{request.method} {route}", "server", incoming_traceparent(),
+            **{"http.method": request.method, "http.route": route}
+        )
+    if request_profiler.enabled:
+        g.request_profile = request_profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    record_request(route, request.method, response.status_code, time.perf_counter() - g.request_started)
+    if "request_span" in g:
+        g.request_span[0].set_attribute("http.status_code", response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_span(error):
+    if "request_span" in g:
+        TRACER.finish(*g.pop("request_span"), error=repr(error) if error else None)
+
+@app.teardown_request
+def finish_request_profile(error):
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_profiler.finish(profile, f"{request.method} {route}", time.perf_counter() - g.request_started)
+
+def incoming_traceparent():
+    """
+    The caller's trace context: the traceparent header, else a ?traceparent= link from a
+    frontend redirect, else the one /login folded into the Auth0 "state" (see split_state)
+    """
+    return (
+        request.headers.get(TRACEPARENT_HEADER)
+        or request.args.get(TRACEPARENT_HEADER)
+        or split_state(request.args.get("state"))[1]
+    )
+
 # -----------------------------
 # Routes
 # -----------------------------
@@ -37,6 +242,67 @@ FRONTEND_URL = os.getenv("FRONTEND_URL")
 def home():
     return "Auth0 Microservice Running"
 
+@app.route("/metrics")
+def metrics():
+    """
+    Prometheus text format: per-route requests and latency, JWT sign/verify, key loads,
+    upstream calls and cache hit ratios, for this process
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    """
+    Admin: samples every thread of this process and returns collapsed stacks (flamegraph.pl, speedscope)
+    - Body (optional): {"seconds": 10, "interval_ms": 5}, an empty body uses those defaults
+    - Headers: sign_request(INTERNAL_AUTH_SECRET, "/admin/profile", body) (common/internal_auth.py),
+      signed over the exact body, the empty string when there is none
+    - Only with PROFILING_ENABLED, 409 while another profile of this process is running
+    - Under gunicorn this profiles the worker that happened to take the request
+    """
+    if not PROFILING_ENABLED:
+        return jsonify({"success": False, "error": "Profiling is disabled"}), 404
+    if not is_admin_call(request.headers, request.path, request.get_data(as_text=True)):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+
+    options = request.get_json(silent=True) or {}
+    try:
+        stacks = sampling_profiler.profile(float(options.get("seconds", 10)), float(options.get("interval_ms", 5)) / 1000)
+    except ProfilerBusy:
+        return jsonify({"success": False, "error": "A profile is already running"}), 409
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "seconds and interval_ms must be numbers"}), 400
+    return Response(stacks, mimetype="text/plain")
+
+@app.route("/stats")
+def stats():
+    """
+    Returns internal timing metrics for the microservice
+    """
+    return jsonify({
+        "success": True,
+        "signer": jwt_signer.stats(),
+        "verified_token_cache": verified_token_cache.stats(),
+        "upstreams": http_client.stats(),
+        "revocation": revocation_list.stats() if revocation_list else None,
+        "invalidation_bus": invalidation_bus.stats() if invalidation_bus else None,
+        "session_queue": session_writer.stats() if SESSION_WRITE_BEHIND else None,
+        "profiler": {"sampling": sampling_profiler.stats(), "slow_requests": request_profiler.stats()}
+    })
+
+@app.route("/.well-known/jwks.json")
+def jwks():
+    """
+    Publishes the public keys tokens are signed with so clients can verify JWTs locally
+    - Each key has a "kid" matching the "kid" in the JWT header
+    - Cacheable for JWKS_MAX_AGE seconds, revalidate with If-None-Match (ETag)
+    """
+    response = jsonify(jwt_signer.jwks())
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = JWKS_MAX_AGE
+    return response.make_conditional(request)
+
 @app.route("/login")
 def login():
     """
@@ -55,21 +321,70 @@ def callback():
     Generates JWT token using user info & private key, sends to client
     """
     code = request.args.get("code", None)
-    client_app = request.args.get("state", None)  # defined in login request parameters
+    client_app, _ = split_state(request.args.get("state", None))  # defined in login request parameters
     if not code:
         return jsonify({"success": False, "error": "No code returned"}), 400
     
     token_object = exchange_code_for_token(code)
     if not token_object["success"]:
-        return token_object["error"]
+        return jsonify(token_object), 502
 
     user_info = exchange_token_for_user_info(token_object["access_token"])
     if not user_info["success"]:
-        return user_info["error"]
+        return jsonify(user_info), 502
 
     private_jwt = create_private_jwt(user_info)
     return handle_redis_based_on_app(client_app, private_jwt)
 
+@app.route("/verify-user", methods=["GET"])
+def verify_user():
+    """
+    Verifies a single JWT locally and returns the user info inside it
+    - Token comes from the "Authorization" header (CLI) or the
+      "jwt_calorie_counter_profile" cookie (Web)
+    - Signature is checked with the in-memory public key, no network hop
+    - With ?session=true the Redis microservice is also asked to confirm
+      and refresh the session, so a logged out user is rejected
+    """
+    token = request.headers.get("Authorization") or request.cookies.get("jwt_calorie_counter_profile")
+    if not token:
+        return jsonify({"success": False, "error": "Authorization header missing"}), 401
+
+    result = verify_token(token)
+    if not result["success"]:
+        return jsonify(result), 401
+
+    if request.args.get("session") == "true":
+        try:
+            res = send_redis_session_check(token)
+        except requests.RequestException:
+            return jsonify({"success": False, "error": "Redis microservice unreachable"}), 503
+        session = parse_json_response(res)
+        if session is None:
+            return jsonify({"success": False, "error": "Invalid response from Redis microservice"}), 502
+        if not session.get("success"):
+            return jsonify(session), res.status_code
+
+    return jsonify(result), 200
+
+@app.route("/verify-user", methods=["POST"])
+def verify_users_batch():
+    """
+    Verifies many JWTs in one request, for gateways checking several users at once
+    - Body: {"tokens": ["<jwt>", ...]}
+    - Returns a result per token in the same order, each shaped like GET /verify-user
+    - Batch verification is stateless, it never checks Redis sessions
+    """
+    body = request.get_json(silent=True) or {}
+    tokens = body.get("tokens")
+    if not isinstance(tokens, list) or not tokens:
+        return jsonify({"success": False, "error": "Body must contain a non-empty 'tokens' list"}), 400
+    if len(tokens) > MAX_BATCH_VERIFY:
+        return jsonify({"success": False, "error": f"At most {MAX_BATCH_VERIFY} tokens per request"}), 400
+
+    results = [verify_token(token) if isinstance(token, str) else {"success": False, "error": "Invalid JWT"} for token in tokens]
+    return jsonify({"success": True, "results": results}), 200
+
 # -----------------------------
 # HELPERS
 # -----------------------------
@@ -77,24 +392,48 @@ def callback():
 def create_authentication_request_for_target_app(client_app):
     """
     Sends request to Auth0 service to get the url for the user
+    - With tracing on, the /login span's traceparent rides along in "state" so
+      /callback joins the same trace after the user's time on the Auth0 page
     """
+    traceparent = TRACER.current_traceparent()
     params = {
         "response_type": "code",
         "client_id": CLIENT_ID,
         "redirect_uri": CALLBACK_URL, # Must match the callback URL client
         "scope": "openid profile email", # Tells what parameters we want back from Auth0
-        "state": client_app, # Sent directly back in callback
+        "state": f"{client_app}.{traceparent}" if traceparent else client_app, # Sent directly back in callback
         "prompt": "select_account"
     }
     auth_request = requests.Request("GET", AUTH_URL, params=params).prepare()
     return auth_request
 
+def is_admin_call(headers, path, body):
+    """
+    True if the request body is signed with INTERNAL_AUTH_SECRET, same check as the
+    Redis microservice's admin routes, disabled while no secret is configured
+    """
+    if not INTERNAL_AUTH_SECRET:
+        return False
+    return verify_request(INTERNAL_AUTH_SECRET, headers, path, body)
+
+def split_state(state):
+    """
+    Returns (client_app, traceparent or None) from the "state" Auth0 sends back to /callback
+    """
+    if not state:
+        return None, None
+    client_app, _, traceparent = state.partition(".")
+    return client_app, traceparent or None
+
 def exchange_code_for_token(code):
     """
     Exchanges an authorization code for an access token
     Returns Python Dictionary
     """
-    res = send_request_for_token_and_get_response(code)
+    try:
+        res = send_request_for_token_and_get_response(code)
+    except requests.RequestException:
+        return {"success": False, "error": "Token exchange failed, Auth0 unreachable"}
     if res.status_code not in (200, 201, 204):
         return {"success": False, "error": f"Token exchange failed, status code: {res.status_code}"}
     
@@ -108,7 +447,15 @@ def send_request_for_token_and_get_response(code):
     """
     Returns response after POST with code to get the user token
     """
-    data = {
+    data = token_request_data(code)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    return http_client.post("auth0_token", TOKEN_URL, data=data, headers=headers)
+
+def token_request_data(code):
+    """
+    Form body for exchanging the authorization code at Auth0's /oauth/token
+    """
+    return {
         "grant_type": "authorization_code",
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
@@ -116,15 +463,15 @@ def send_request_for_token_and_get_response(code):
         "redirect_uri": CALLBACK_URL,
         "scope": "openid profile email"
     }
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    return requests.post(TOKEN_URL, data=data, headers=headers)
 
 def get_access_token_from_response(response):
     """
     Takes response from code request for token and returns the token
     If the token isn't in the response, returns error json
     """
-    tokens = response.json()
+    tokens = parse_json_response(response)
+    if tokens is None:
+        return {"success": False, "error": "Invalid token response from Auth0"}
     access_token = tokens.get("access_token", None)
     if not access_token:
         return {"success": False, "error": "Invalid token response from Auth0"}
@@ -136,17 +483,23 @@ def exchange_token_for_user_info(access_token):
     Returns Python dictionary
     """
     headers = {"Authorization": f"Bearer {access_token}"} # Bearer is Auth 2.0 protocol standard
-    res = requests.get(USERINFO_URL, headers=headers)
+    try:
+        res = http_client.get("auth0_userinfo", USERINFO_URL, headers=headers)
+    except requests.RequestException:
+        return {"success": False, "error": "Failed to fetch user info, Auth0 unreachable"}
     if res.status_code not in (200, 201, 204):
         return {"success": False, "error": f"Failed to fetch user info, status code: {res.status_code}"}
     
-    response = res.json()
+    response = parse_json_response(res)
+    if response is None:
+        return {"success": False, "error": "Invalid user info response from Auth0"}
     response["success"] = True
     return response
 
 def handle_redis_based_on_app(client_app, jw_token):      
     """
     Depending on the client app, sends the JWT token to Redis microservice and then renders the appropriate response for the client
+     - With SESSION_WRITE_BEHIND the session is queued and created in the background instead
      - For CLI: Render JWT token in a webpage for user to copy and paste into CLI
      - For Flask: Set JWT token in cookie and redirect to frontend URL
      - For unknown client app: Return error JSON
@@ -154,9 +507,17 @@ def handle_redis_based_on_app(client_app, jw_token):
     if client_app not in ("CLI", "Flask"):
         return jsonify({"success": False, "error": "Unknown client app"}), 400
     
-    res = send_redis_token(jw_token)
-    if not res.json().get("success"):
-        return res
+    # Write-behind: queue the session and redirect now, unless the queue is full
+    if not (SESSION_WRITE_BEHIND and session_writer.submit(jw_token)):
+        try:
+            res = send_redis_token(jw_token)
+        except requests.RequestException:
+            return jsonify({"success": False, "error": "Redis microservice unreachable"}), 503
+        session = parse_json_response(res)
+        if session is None:
+            return jsonify({"success": False, "error": "Invalid response from Redis microservice"}), 502
+        if not session.get("success"):
+            return jsonify(session), res.status_code
     
     if client_app == "CLI":
         return handle_jwt_CLI(jw_token)
@@ -192,20 +553,97 @@ def handle_jwt_flask(token):
 
 def create_private_jwt(user_info, expires_minutes=10):
     """
-    Creates a signed JWT with user info using RS256 (private/public key)
+    Creates a signed JWT with user info using the signing key's algorithm (RS256, ES256 or EdDSA)
+    - Uses the in-memory signing key, no disk access per login
+    - Header carries the key's "kid" so clients can pick the key from /.well-known/jwks.json
+    - "jti" gives each login its own session, so logging in on a second device keeps the first
     """
-    with open("private.pem", "rb") as f:
-        private_key = serialization.load_pem_private_key(f.read(), password=None)
-
     payload = {
         "sub": user_info["sub"],
         "email": user_info.get("email", None),
         "name": user_info.get("name", None),
-        "exp": datetime.datetime.now(tz=timezone.utc) + datetime.timedelta(minutes=expires_minutes)
+        "exp": datetime.datetime.now(tz=timezone.utc) + datetime.timedelta(minutes=expires_minutes),
+        "jti": uuid.uuid4().hex # Unique per login, the Redis microservice keys the device's session on it
     }
-    token = jwt.encode(payload, private_key, algorithm="RS256")
+    with TRACER.span("jwt.sign", algorithm=jwt_signer.current.algorithm):
+        token = jwt_signer.sign(payload)
     return token
 
+def verify_token(token):
+    """
+    Verifies a JWT against the current and previous signing keys
+    - Uses the verified token cache when the same token was checked before
+    - With SHARED_REDIS_URL set, rejects tokens revoked at logout
+    - Returns the /verify-user response dictionary
+    """
+    user_info = verified_token_cache.get(token)
+    if user_info is None:
+        with TRACER.span("jwt.verify"):
+            user_info, error = decode_with_signing_keys(token)
+        if error:
+            JWT_VERIFICATIONS.labels(result="expired" if error == "JWT expired" else "invalid").inc()
+            request_log.event("jwt_rejected", reason=error)
+            return {"success": False, "error": error}
+        JWT_VERIFICATIONS.labels(result="valid").inc()
+        request_log.event("jwt_verified", jti=user_info.get("jti"))
+        verified_token_cache.put(token, user_info)
+
+    if revocation_list and revocation_list.is_revoked(user_info.get("jti")):
+        return {"success": False, "error": "JWT revoked"}
+
+    return {
+        "success": True,
+        "message": f"Hello, {user_info.get('name')}! You are authenticated.",
+        "user_info": user_info
+    }
+
+def drop_cached_tokens(keys):
+    """
+    A Redis microservice replica logged these tokens out (verified token cache keys)
+    """
+    for key in keys:
+        verified_token_cache.invalidate_key(key)
+
+def decode_with_signing_keys(token):
+    """
+    Decodes the JWT with the signing key named by its "kid" header
+    - Each key only accepts its own algorithm, so an RS256 and an EdDSA key
+      can both be live while the signer moves from one to the other
+    - Tokens without a kid try the current key, then the previous one,
+      so tokens from before a rotation keep working until they expire
+    - Returns (claims, None) on success or (None, error message)
+    """
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.InvalidTokenError:
+        return None, "Invalid JWT"
+
+    if kid is not None:
+        key = jwt_signer.key_for(kid)
+        candidates = [key] if key is not None else []
+    else:
+        candidates = jwt_signer.keys()
+
+    for key in candidates:
+        try:
+            with JWT_VERIFY_SECONDS.labels(algorithm=key.algorithm).time():
+                return jwt.decode(token, key.public_key, algorithms=[key.algorithm]), None
+        except jwt.InvalidSignatureError:
+            continue
+        except jwt.ExpiredSignatureError:
+            return None, "JWT expired"
+        except jwt.InvalidTokenError:
+            return None, "Invalid JWT"
+    return None, "Invalid JWT"
+
+def send_redis_session_check(token):
+    """
+    Asks the Redis microservice whether the token's session is still active and refreshes it
+    - Sends GET request to REDIS_MICROSERVICE_DOMAIN/update_session with the JWT in "Authorization"
+    """
+    headers = redis_request_headers('/update_session', token)
+    return http_client.get("redis_service", REDIS_MICROSERVICE_DOMAIN + '/update_session', headers=headers)
+
 def send_redis_token(token):
     """
     Receives token, sends Redis_Microservice the token to add to database
@@ -213,10 +651,91 @@ def send_redis_token(token):
         - Request header should have an "Authorization": JWT str
     - Response should be a success 200 if it worked, error 400 if it failed
     """
-    headers = {"Authorization": token}
-    res = requests.get(REDIS_MICROSERVICE_DOMAIN + '/create_session', headers=headers)
+    headers = redis_request_headers('/create_session', token)
+    res = http_client.get("redis_service", REDIS_MICROSERVICE_DOMAIN + '/create_session', headers=headers)
     return res
+
+def redis_request_headers(path, token):
+    """
+    Headers for a Redis microservice call carrying a JWT this service signed or verified
+    - With INTERNAL_AUTH_SECRET set, adds the internal HMAC signature (common/internal_auth.py)
+    - Passes this request's id on, so both services log the login under one X-Request-ID
+    """
+    headers = {"Authorization": token}
+    if current_request_id():
+        headers[REQUEST_ID_HEADER] = current_request_id()
+    if INTERNAL_AUTH_SECRET:
+        headers.update(sign_request(INTERNAL_AUTH_SECRET, path, token))
+    return headers
+
+def parse_json_response(res):
+    """
+    Returns an upstream response's JSON object, parsed once
+    - Returns None if the body isn't a JSON object (HTML error page, proxy timeout, ...)
+    """
+    try:
+        body = res.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
     
+def send_redis_tokens(tokens):
+    """
+    Creates a batch of sessions on the Redis microservice for the write-behind queue
+    - One POST to REDIS_MICROSERVICE_DOMAIN/create_sessions, stored with one pipeline
+    - Returns the tokens worth retrying (unreachable or 5xx), a token rejected
+      on its own (e.g. expired) would fail again so it is not retried
+    """
+    body = json.dumps({"tokens": tokens})
+    headers = {"Content-Type": "application/json"}
+    if INTERNAL_AUTH_SECRET:
+        headers.update(sign_request(INTERNAL_AUTH_SECRET, '/create_sessions', body))
+    try:
+        res = http_client.post("redis_service", REDIS_MICROSERVICE_DOMAIN + '/create_sessions', data=body, headers=headers)
+    except requests.RequestException:
+        return tokens
+    if res.status_code >= 500:
+        return tokens
+    if res.status_code != 200:
+        request_log.warning("session_batch_rejected", status_code=res.status_code, tokens=len(tokens))
+    return []
+
+# Sessions queued by /callback when SESSION_WRITE_BEHIND is on
+session_writer = SessionWriteBehind(
+    send_redis_tokens,
+    max_size=SESSION_QUEUE_MAX_SIZE,
+    batch_size=SESSION_QUEUE_BATCH_SIZE,
+    max_attempts=SESSION_QUEUE_MAX_ATTEMPTS
+)
+
+def start_background_threads():
+    """
+    Starts this process' signing key watcher, span exporter and metrics snapshot writer, and with SHARED_REDIS_URL
+    its revocation list and invalidation bus threads (the session write-behind thread starts on first use)
+    - Safe to call more than once, a forked worker gets its own threads
+    """
+    jwt_signer.start_watcher()
+    TRACER.start()
+    REGISTRY.start()
+    if SHARED_REDIS_URL:
+        revocation_list.start()
+        invalidation_bus.start()
+
+# Threads don't survive a fork: under gunicorn (gunicorn.conf.py) the app is loaded once in
+# the master and each worker starts its own threads after the fork
+def install_signal_handlers():
+    """
+    With PROFILING_ENABLED, SIGUSR2 writes a PROFILE_SIGNAL_SECONDS sampling profile to PROFILE_DIR
+    - Must run in the main thread after the server has set up its own handlers
+      (gunicorn.conf.py's post_worker_init, gunicorn resets USR2 in workers)
+    """
+    if PROFILING_ENABLED:
+        sampling_profiler.install_signal_handler(signal.SIGUSR2, PROFILE_SIGNAL_SECONDS, PROFILE_DIR)
+
+if not DEFER_BACKGROUND_THREADS:
+    start_background_threads()
+    install_signal_handlers()
+
 # Initialize application
 if __name__ == "__main__":
     app.run(port=PORT, debug=DEBUG_MODE)
@@ -0,0 +1,221 @@
+from quart import Quart, g, jsonify, redirect, request, make_response
+from asgiref.wsgi import WsgiToAsgi
+from concurrent.futures import ThreadPoolExecutor
+from common.metrics import record_request
+from common.request_log import REQUEST_ID_HEADER, bind_request_id
+from common.tracing import TRACEPARENT_HEADER, TRACER
+import asyncio
+import contextvars
+import os
+import time
+import httpx
+import app as sync_app
+
+# -----------------------------
+# Async (ASGI) serving mode for the Auth0 microservice.
+# /callback spends nearly all of its time waiting on Auth0 and the Redis
+# microservice, so here it runs as an async view on one event loop with
+# httpx.AsyncClient: a single process can hold thousands of logins in flight
+# instead of one per blocked Flask worker. RSA signing is CPU bound and runs
+# on a thread pool so it never stalls the loop. Every other route is the
+# regular Flask app, served through asgiref's WSGI adapter.
+#
+# Run with: hypercorn asgi_app:application --bind 0.0.0.0:7001
+# -----------------------------
+
+SIGNING_THREADS = int(os.getenv("SIGNING_THREADS", str(os.cpu_count() or 1)))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "1000")) # In-flight upstream calls per process
+ASYNC_PATHS = {"/callback"} # Served by the async app, everything else by the Flask app
+
+quart_app = Quart(__name__)
+flask_asgi = WsgiToAsgi(sync_app.app)
+signing_executor = ThreadPoolExecutor(max_workers=SIGNING_THREADS, thread_name_prefix="jwt-signer")
+async_client = None # Created at startup so it belongs to the server's event loop
+
+async def application(scope, receive, send):
+    """
+    ASGI entry point, sends /callback (and lifespan events) to the async app
+    """
+    if scope["type"] == "lifespan" or scope.get("path") in ASYNC_PATHS:
+        await quart_app(scope, receive, send)
+    else:
+        await flask_asgi(scope, receive, send)
+
+@quart_app.before_serving
+async def open_http_client():
+    """
+    One pooled keep-alive client per process, same timeouts as the sync client
+    - httpx only retries failed connection attempts, which is safe for the code exchange POST
+    """
+    global async_client
+    transport = httpx.AsyncHTTPTransport(
+        retries=sync_app.HTTP_RETRIES,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=sync_app.HTTP_POOL_MAXSIZE)
+    )
+    async_client = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(sync_app.HTTP_READ_TIMEOUT, connect=sync_app.HTTP_CONNECT_TIMEOUT)
+    )
+
+@quart_app.after_serving
+async def close_http_client():
+    await async_client.aclose()
+    signing_executor.shutdown(wait=False)
+
+@quart_app.before_request
+async def start_request_timer():
+    bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.request_started = time.perf_counter()
+    if TRACER.enabled:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        traceparent = request.headers.get(TRACEPARENT_HEADER) or sync_app.split_state(request.args.get("state"))[1]
+        g.request_span = TRACER.start_span(
+            f"{request.method} {route}", "server", traceparent,
+            **{"http.method": request.method, "http.route": route}
+        )
+
+@quart_app.after_request
+async def record_request_metrics(response):
+    """
+    Same /metrics series and spans as the Flask routes (app.record_request_metrics)
+    """
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    record_request(route, request.method, response.status_code, time.perf_counter() - g.request_started)
+    if "request_span" in g:
+        g.request_span[0].set_attribute("http.status_code", response.status_code)
+    return response
+
+@quart_app.teardown_request
+async def end_request_span(error):
+    if "request_span" in g:
+        TRACER.finish(*g.pop("request_span"), error=repr(error) if error else None)
+
+# -----------------------------
+# Routes
+# -----------------------------
+@quart_app.route("/callback")
+async def callback():
+    """
+    Async version of app.callback, same steps and responses
+    - Token exchange, userinfo and create_session await on the event loop
+    - JWT signing runs on signing_executor, in a copy of this task's context so its span joins the trace
+    """
+    code = request.args.get("code", None)
+    client_app, _ = sync_app.split_state(request.args.get("state", None))  # defined in login request parameters
+    if not code:
+        return jsonify({"success": False, "error": "No code returned"}), 400
+
+    token_object = await exchange_code_for_token(code)
+    if not token_object["success"]:
+        return jsonify(token_object), 502
+
+    user_info = await exchange_token_for_user_info(token_object["access_token"])
+    if not user_info["success"]:
+        return jsonify(user_info), 502
+
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    private_jwt = await loop.run_in_executor(signing_executor, context.run, sync_app.create_private_jwt, user_info)
+    return await handle_redis_based_on_app(client_app, private_jwt)
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+async def send_upstream(upstream, method, url, **kwargs):
+    """
+    Sends a request with the shared async client, latency is recorded in the same
+    per-upstream histograms as the sync client (GET /stats)
+    - Traced as a client span like the sync client's calls
+    - Raises httpx.HTTPError on connection errors and timeouts
+    """
+    start = time.perf_counter()
+    failed = False
+    with TRACER.span(f"{method} {upstream}", "client", upstream=upstream, **{"http.method": method, "http.url": url}) as span:
+        if span is not None:
+            kwargs["headers"] = TRACER.inject(kwargs.get("headers"))
+        try:
+            response = await async_client.request(method, url, **kwargs)
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+            return response
+        except httpx.HTTPError:
+            failed = True
+            raise
+        finally:
+            sync_app.http_client.record(upstream, time.perf_counter() - start, failed)
+
+async def exchange_code_for_token(code):
+    """
+    Exchanges an authorization code for an access token
+    Returns Python Dictionary
+    """
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    try:
+        res = await send_upstream("auth0_token", "POST", sync_app.TOKEN_URL, data=sync_app.token_request_data(code), headers=headers)
+    except httpx.HTTPError:
+        return {"success": False, "error": "Token exchange failed, Auth0 unreachable"}
+    if res.status_code not in (200, 201, 204):
+        return {"success": False, "error": f"Token exchange failed, status code: {res.status_code}"}
+
+    access_token = sync_app.get_access_token_from_response(res)
+    if not isinstance(access_token, str): # looks if the token isn't a string, which means it's an error json
+        return access_token
+
+    return {"success": True, "access_token": access_token}
+
+async def exchange_token_for_user_info(access_token):
+    """
+    Exchanges an access token for user info from Auth0 using /userinfo
+    Returns Python dictionary
+    """
+    headers = {"Authorization": f"Bearer {access_token}"} # Bearer is Auth 2.0 protocol standard
+    try:
+        res = await send_upstream("auth0_userinfo", "GET", sync_app.USERINFO_URL, headers=headers)
+    except httpx.HTTPError:
+        return {"success": False, "error": "Failed to fetch user info, Auth0 unreachable"}
+    if res.status_code not in (200, 201, 204):
+        return {"success": False, "error": f"Failed to fetch user info, status code: {res.status_code}"}
+
+    response = sync_app.parse_json_response(res)
+    if response is None:
+        return {"success": False, "error": "Invalid user info response from Auth0"}
+    response["success"] = True
+    return response
+
+async def handle_redis_based_on_app(client_app, jw_token):
+    """
+    Async version of app.handle_redis_based_on_app
+    """
+    if client_app not in ("CLI", "Flask"):
+        return jsonify({"success": False, "error": "Unknown client app"}), 400
+
+    # Write-behind: queue the session and redirect now, unless the queue is full
+    if not (sync_app.SESSION_WRITE_BEHIND and sync_app.session_writer.submit(jw_token)):
+        headers = sync_app.redis_request_headers('/create_session', jw_token)
+        try:
+            res = await send_upstream("redis_service", "GET", sync_app.REDIS_MICROSERVICE_DOMAIN + '/create_session', headers=headers)
+        except httpx.HTTPError:
+            return jsonify({"success": False, "error": "Redis microservice unreachable"}), 503
+        session = sync_app.parse_json_response(res)
+        if session is None:
+            return jsonify({"success": False, "error": "Invalid response from Redis microservice"}), 502
+        if not session.get("success"):
+            return jsonify(session), res.status_code
+
+    if client_app == "CLI":
+        return sync_app.handle_jwt_CLI(jw_token)
+    elif client_app == "Flask":
+        return await handle_jwt_flask(jw_token)
+
+async def handle_jwt_flask(token):
+    """
+    Render front end URL page with JWT token inside cookie
+    """
+    response = await make_response(redirect(sync_app.FRONTEND_URL))
+    response.set_cookie(
+        "jwt_calorie_counter_profile",
+        token,
+        httponly=True,
+        secure=False  # secure=True in production (HTTPS)
+    )
+    return response
@@ -0,0 +1,107 @@
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from common.metrics import REGISTRY
+from common.tracing import TRACER
+import threading
+import time
+import requests
+
+# -----------------------------
+# Shared HTTP client for every outbound call the microservice makes
+# (Auth0 token/userinfo endpoints and the Redis microservice).
+# One requests.Session keeps a keep-alive connection pool per host, so logins
+# reuse TCP/TLS connections instead of handshaking on every call. Every call
+# gets connect/read timeouts, idempotent calls are retried with jittered
+# backoff, each upstream gets its own latency histogram, and with tracing on
+# each call is a client span that passes its traceparent on.
+# -----------------------------
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUS_CODES = (502, 503, 504)
+
+UPSTREAM_SECONDS = REGISTRY.histogram("upstream_request_duration_seconds", "Outbound HTTP call latency, retries included", ("upstream",))
+UPSTREAM_ERRORS = REGISTRY.counter("upstream_request_errors_total", "Outbound HTTP calls that raised (connection errors, timeouts)", ("upstream",))
+
+
+class UpstreamClient:
+    """
+    Pooled HTTP client with per-upstream latency tracking
+     - get()/post() take an upstream name used to label metrics
+     - Only IDEMPOTENT_METHODS are retried, a POST (e.g. the one-time
+       authorization code exchange) is never sent twice
+     - stats() returns a latency histogram and error count per upstream
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=50, connect_timeout=3.0, read_timeout=10.0,
+                 retries=2, backoff_factor=0.1, backoff_jitter=0.1):
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            allowed_methods=IDEMPOTENT_METHODS,
+            status_forcelist=RETRY_STATUS_CODES,
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._latency = {} # upstream name -> Histogram, also exported on /metrics
+        self._errors = {} # upstream name -> count of requests that raised
+        self._lock = threading.Lock()
+
+    def get(self, upstream, url, **kwargs):
+        return self.request(upstream, "GET", url, **kwargs)
+
+    def post(self, upstream, url, **kwargs):
+        return self.request(upstream, "POST", url, **kwargs)
+
+    def request(self, upstream, method, url, **kwargs):
+        """
+        Sends the request through the shared session and records its latency
+        - Traced as a client span, the traceparent header names it as the callee's parent
+        - Uses the client's (connect, read) timeout unless one is passed
+        - Raises requests.RequestException on connection errors and timeouts
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        start = time.perf_counter()
+        failed = False
+        with TRACER.span(f"{method} {upstream}", "client", upstream=upstream, **{"http.method": method, "http.url": url}) as span:
+            if span is not None:
+                kwargs["headers"] = TRACER.inject(kwargs.get("headers"))
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if span is not None:
+                    span.set_attribute("http.status_code", response.status_code)
+                return response
+            except requests.RequestException:
+                failed = True
+                raise
+            finally:
+                self.record(upstream, time.perf_counter() - start, failed)
+
+    def record(self, upstream, seconds, failed=False):
+        """
+        Records one call's latency, also used by the async client so both show up in stats()
+        """
+        self._histogram(upstream).observe(seconds)
+        if failed:
+            UPSTREAM_ERRORS.labels(upstream=upstream).inc()
+            with self._lock:
+                self._errors[upstream] = self._errors.get(upstream, 0) + 1
+
+    def stats(self):
+        """
+        Returns {upstream: {latency histogram..., "errors": n}}
+        """
+        with self._lock:
+            upstreams = dict(self._latency)
+            errors = dict(self._errors)
+        return {name: {**histogram.stats(), "errors": errors.get(name, 0)} for name, histogram in upstreams.items()}
+
+    def _histogram(self, upstream):
+        histogram = self._latency.get(upstream)
+        if histogram is None:
+            with self._lock:
+                histogram = self._latency.setdefault(upstream, UPSTREAM_SECONDS.labels(upstream=upstream))
+        return histogram
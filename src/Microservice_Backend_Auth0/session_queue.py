@@ -0,0 +1,148 @@
+from common.request_log import SampledLogger
+import atexit
+import os
+import queue
+import threading
+import time
+
+# -----------------------------
+# Write-behind session creation.
+# /callback puts the new JWT on a bounded in-process queue and redirects the
+# user right away, a background worker drains the queue in batches and
+# creates the sessions on the Redis microservice.
+#
+# Delivery: at-least-once while the process is alive. Failed sends are
+# retried with backoff up to max_attempts, then dropped and counted. Items
+# still queued at normal interpreter exit are flushed for up to
+# flush_timeout seconds; a crash loses whatever is still queued.
+# Backpressure: submit() never blocks, it returns False when the queue is
+# full and the caller creates the session synchronously instead.
+# -----------------------------
+
+log = SampledLogger(__name__)
+
+
+class SessionWriteBehind:
+    """
+    Bounded queue + worker thread that creates sessions in batches
+     - sender(tokens) sends a batch and returns the tokens that should be retried
+     - submit(token) enqueues without blocking, False if the queue is full
+     - stats() reports queue depth and delivery counters
+    """
+    def __init__(self, sender, max_size=10000, batch_size=100, max_attempts=5,
+                 retry_backoff=0.5, flush_timeout=5.0):
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.flush_timeout = flush_timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self._max_depth = 0
+        self._enqueued = 0
+        self._rejected = 0
+        self._sent = 0
+        self._retried = 0
+        self._dropped = 0
+        self._batches = 0
+        self._last_batch_seconds = 0.0
+
+    def submit(self, token):
+        """
+        Queues a session for creation, returns False if the queue is full
+        """
+        self.start()
+        try:
+            self._queue.put_nowait((token, 1))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            return False
+        with self._lock:
+            self._enqueued += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+        return True
+
+    def start(self):
+        """
+        Starts the worker thread for this process
+        - Safe to call more than once, a forked worker gets its own thread
+        """
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="session-write-behind", daemon=True)
+        thread.start()
+        atexit.register(self.flush)
+
+    def flush(self):
+        """
+        Waits up to flush_timeout seconds for the queue to drain
+        """
+        deadline = time.time() + self.flush_timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+
+    def stats(self):
+        """
+        Returns queue metrics as a dictionary
+        """
+        with self._lock:
+            return {
+                "depth": self._queue.qsize(),
+                "max_depth": self._max_depth,
+                "capacity": self._queue.maxsize,
+                "enqueued": self._enqueued,
+                "rejected_full": self._rejected,
+                "sent": self._sent,
+                "retried": self._retried,
+                "dropped": self._dropped,
+                "batches": self._batches,
+                "last_batch_ms": self._last_batch_seconds * 1000,
+            }
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()] # Block until there is work
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        """
+        Sends one batch, then re-queues or drops the tokens the sender says failed
+        """
+        start = time.perf_counter()
+        try:
+            failed = set(self.sender([token for token, _ in batch]))
+        except Exception as e:
+            log.warning("session_batch_failed", tokens=len(batch), error=str(e))
+            failed = {token for token, _ in batch}
+
+        retry = []
+        with self._lock:
+            self._batches += 1
+            self._last_batch_seconds = time.perf_counter() - start
+            for token, attempts in batch:
+                if token not in failed:
+                    self._sent += 1
+                elif attempts < self.max_attempts:
+                    self._retried += 1
+                    retry.append((token, attempts + 1))
+                else:
+                    self._dropped += 1
+
+        if retry:
+            time.sleep(self.retry_backoff * min(attempts for _, attempts in retry))
+            for item in retry:
+                try:
+                    self._queue.put_nowait(item)
+                except queue.Full:
+                    with self._lock:
+                        self._dropped += 1
+        for _ in batch:
+            self._queue.task_done()
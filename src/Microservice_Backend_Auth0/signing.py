@@ -0,0 +1,198 @@
+from cryptography.hazmat.primitives import serialization
+from collections import deque
+from common.jwk import algorithm_for_key, jwk_thumbprint
+from common.metrics import FAST_LATENCY_BUCKETS, REGISTRY
+from common.request_log import SampledLogger
+import os
+import threading
+import time
+import jwt
+
+# -----------------------------
+# Holds the JWT signing key in memory for the life of the process.
+# The private key is parsed once, swapped out when private.pem changes,
+# and the previous key is kept around so tokens it signed stay verifiable
+# while clients move over to the new one.
+# The algorithm follows the key type (RSA -> RS256, P-256 -> ES256,
+# Ed25519 -> EdDSA), so switching algorithms is a key rotation.
+# -----------------------------
+
+DEFAULT_POLL_INTERVAL = 5 # Seconds between checks of the PEM file
+LATENCY_WINDOW = 1024 # Recent sign latencies kept for percentiles
+log = SampledLogger(__name__)
+
+SIGN_SECONDS = REGISTRY.histogram("jwt_sign_duration_seconds", "JWT signing latency", ("algorithm",), FAST_LATENCY_BUCKETS)
+KEY_LOAD_SECONDS = REGISTRY.histogram("key_load_duration_seconds", "Time to read and parse a PEM key file", ("key",), FAST_LATENCY_BUCKETS)
+
+
+class SigningKey:
+    """
+    A parsed private key, its public half, and where and when it was loaded from
+    - jwk is the public key as a JSON Web Key, published on /.well-known/jwks.json
+    - kid is the RFC 7638 thumbprint of that JWK, stamped into each token header
+    """
+    def __init__(self, private_key, path):
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.path = path
+        self.algorithm = algorithm_for_key(private_key)
+        self.loaded_at = time.time()
+        self.jwk = jwt.algorithms.get_default_algorithms()[self.algorithm].to_jwk(self.public_key, as_dict=True)
+        self.jwk.pop("key_ops", None)
+        self.kid = jwk_thumbprint(self.jwk)
+        self.jwk.update({"kid": self.kid, "use": "sig", "alg": self.algorithm})
+
+
+class JWTSigner:
+    """
+    Signs JWTs with a private key that is loaded once per process
+     - sign() never touches disk and stamps the key's "kid" into the header
+     - algorithm, if set, pins the algorithm: a key of another type is refused
+     - rotate() loads a new key and demotes the current one to previous
+     - start_watcher() rotates automatically when the PEM file changes
+     - rotate_if_changed() does one such check now
+     - on_change, if set, is called after the watcher rotates to a changed key
+     - stats() reports sign/load counts and latencies
+    """
+    def __init__(self, path, algorithm=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.algorithm = algorithm
+        self.poll_interval = poll_interval
+        self.current = None
+        self.previous = None
+        self._file_signature = None
+        self._lock = threading.RLock() # Reentrant, held across check-and-load
+        self._watcher_pid = None
+        self.on_change = None
+        self._sign_latencies = deque(maxlen=LATENCY_WINDOW)
+        self._sign_count = 0
+        self._load_count = 0
+        self._last_load_seconds = 0.0
+        self.rotate()
+
+    def sign(self, payload, headers=None):
+        """
+        Returns the payload signed with the current key
+        """
+        key = self.current
+        headers = {**(headers or {}), "kid": key.kid}
+        start = time.perf_counter()
+        token = jwt.encode(payload, key.private_key, algorithm=key.algorithm, headers=headers)
+        seconds = time.perf_counter() - start
+        self._sign_latencies.append(seconds)
+        SIGN_SECONDS.labels(algorithm=key.algorithm).observe(seconds)
+        self._sign_count += 1
+        return token
+
+    def key_for(self, kid):
+        """
+        Returns the SigningKey with this kid, or None if it isn't current or previous
+        """
+        for key in (self.current, self.previous):
+            if key is not None and key.kid == kid:
+                return key
+        return None
+
+    def keys(self):
+        """
+        Returns the current and previous SigningKeys, newest first
+        """
+        return [key for key in (self.current, self.previous) if key is not None]
+
+    def jwks(self):
+        """
+        Returns the JSON Web Key Set of the current and previous public keys
+        """
+        keys = [self.current, self.previous]
+        return {"keys": [key.jwk for key in keys if key is not None]}
+
+    def rotate(self, path=None):
+        """
+        Loads the private key at path (default: the configured path) and makes it current
+        - The old current key becomes previous, older keys are dropped
+        - Raises if the file is missing, not a valid private key, or not of the pinned algorithm,
+          leaving the keys unchanged
+        """
+        with self._lock:
+            path = path or self.path
+            start = time.perf_counter()
+            signature = self._read_file_signature(path)
+            with open(path, "rb") as f:
+                private_key = serialization.load_pem_private_key(f.read(), password=None)
+            key = SigningKey(private_key, path)
+            if self.algorithm and key.algorithm != self.algorithm:
+                raise ValueError(f"{path} is a {key.algorithm} key, expected {self.algorithm}")
+            self._last_load_seconds = time.perf_counter() - start
+            KEY_LOAD_SECONDS.labels(key="signing").observe(self._last_load_seconds)
+            self._load_count += 1
+
+            self.previous = self.current
+            self.current = key
+            self.path = path
+            self._file_signature = signature
+        return self.current
+
+    def start_watcher(self):
+        """
+        Starts the rotation thread for this process
+        - Safe to call more than once, a forked worker gets its own thread
+        """
+        if self.poll_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        thread = threading.Thread(target=self._watch, name="signing-key-watcher", daemon=True)
+        thread.start()
+
+    def stats(self):
+        """
+        Returns signing metrics as a dictionary, latencies in milliseconds
+        """
+        latencies = sorted(self._sign_latencies)
+        return {
+            "algorithm": self.current.algorithm,
+            "sign_count": self._sign_count,
+            "sign_p50_ms": _percentile(latencies, 0.50) * 1000,
+            "sign_p99_ms": _percentile(latencies, 0.99) * 1000,
+            "sign_max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+            "key_load_count": self._load_count,
+            "last_key_load_ms": self._last_load_seconds * 1000,
+            "current_kid": self.current.kid,
+            "current_key_loaded_at": self.current.loaded_at,
+            "has_previous_key": self.previous is not None,
+            "previous_algorithm": self.previous.algorithm if self.previous else None,
+        }
+
+    def _watch(self):
+        """
+        Rotates to the new key whenever the file changes
+        - A failed load (file mid-write, bad PEM) keeps the current key
+        """
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self.rotate_if_changed() and self.on_change:
+                    self.on_change()
+            except (OSError, ValueError) as e:
+                log.warning("signing_key_rotation_failed", detail="keeping current key", error=str(e))
+
+    def rotate_if_changed(self):
+        """
+        Rotates if the file changed since the last load, returns True if it did
+        """
+        with self._lock: # Watcher and invalidation bus may both check
+            if self._read_file_signature(self.path) == self._file_signature:
+                return False
+            self.rotate()
+        log.info("signing_key_rotated", path=self.path)
+        return True
+
+    def _read_file_signature(self, path):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
@@ -0,0 +1,61 @@
+import importlib.util
+import os
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+import pytest
+
+# The service's modules are imported by name, as app.py does. Appended rather
+# than prepended: app.py is loaded under its own name (auth0_app) so it can't
+# clash with the Redis microservice's app.py in the same pytest run.
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVICE_DIR = os.path.abspath(os.path.join(TESTS_DIR, ".."))
+sys.path.append(SERVICE_DIR)
+
+
+def write_private_key(directory):
+    """
+    Writes a fresh RSA private key as PEM, returns its path
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = os.path.join(directory, "private.pem")
+    with open(path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return path
+
+@pytest.fixture(scope="session")
+def auth0_app():
+    """
+    The Auth0 microservice's app.py, imported once with a throwaway signing key
+    """
+    key_dir = tempfile.mkdtemp()
+    os.environ["PRIVATE_KEY_PATH"] = write_private_key(key_dir)
+    os.environ["PRIVATE_KEY_POLL_INTERVAL"] = "0"
+    os.environ["REDIS_MICROSERVICE_DOMAIN"] = "http://redis-microservice.test"
+    spec = importlib.util.spec_from_file_location("auth0_app", os.path.join(SERVICE_DIR, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["auth0_app"] = module
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(scope="session")
+def auth0_asgi_app(auth0_app):
+    """
+    The Auth0 microservice's asgi_app.py, loaded against the auth0_app fixture
+    - asgi_app.py imports "app", which is pointed at auth0_app while it loads
+    """
+    previous = sys.modules.get("app")
+    sys.modules["app"] = auth0_app
+    try:
+        spec = importlib.util.spec_from_file_location("auth0_asgi_app", os.path.join(SERVICE_DIR, "asgi_app.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["auth0_asgi_app"] = module
+        spec.loader.exec_module(module)
+    finally:
+        if previous is None:
+            del sys.modules["app"]
+        else:
+            sys.modules["app"] = previous
+    return module
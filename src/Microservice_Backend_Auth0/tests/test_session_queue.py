@@ -0,0 +1,164 @@
+"""
+SessionWriteBehind: queued sessions are sent in batches by the worker thread,
+failed sends are retried up to max_attempts, a full queue pushes back on the
+caller and flush() waits for the queue to drain.
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from session_queue import SessionWriteBehind
+
+
+class RecordingSender:
+    """
+    Sender that records every batch and fails each token failures[token] times
+    - With a gate, every call waits until the gate is set
+    """
+    def __init__(self, failures=None, gate=None):
+        self.failures = dict(failures or {})
+        self.gate = gate
+        self.batches = []
+        self.started = threading.Event()
+
+    def __call__(self, tokens):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batches.append(list(tokens))
+        failed = []
+        for token in tokens:
+            if self.failures.get(token, 0) > 0:
+                self.failures[token] -= 1
+                failed.append(token)
+        return failed
+
+    def calls_for(self, token):
+        return sum(batch.count(token) for batch in self.batches)
+
+def writer(sender, **kwargs):
+    kwargs.setdefault("retry_backoff", 0)
+    kwargs.setdefault("flush_timeout", 5)
+    return SessionWriteBehind(sender, **kwargs)
+
+def test_submitted_sessions_are_sent():
+    sender = RecordingSender()
+    queue = writer(sender)
+
+    for token in ("a", "b", "c"):
+        assert queue.submit(token)
+    queue.flush()
+
+    assert sorted(token for batch in sender.batches for token in batch) == ["a", "b", "c"]
+    stats = queue.stats()
+    assert stats["enqueued"] == 3
+    assert stats["sent"] == 3
+    assert stats["depth"] == 0
+
+def test_batches_never_exceed_batch_size():
+    gate = threading.Event()
+    sender = RecordingSender(gate=gate)
+    queue = writer(sender, batch_size=2)
+
+    queue.submit("first")
+    assert sender.started.wait(5) # The worker holds "first" while the rest queue up
+    for i in range(5):
+        queue.submit(f"token{i}")
+    gate.set()
+    queue.flush()
+
+    assert all(len(batch) <= 2 for batch in sender.batches)
+    assert queue.stats()["sent"] == 6
+
+def test_failed_send_is_retried_until_it_succeeds():
+    sender = RecordingSender(failures={"flaky": 2})
+    queue = writer(sender, max_attempts=5)
+
+    queue.submit("flaky")
+    queue.flush()
+
+    assert sender.calls_for("flaky") == 3
+    stats = queue.stats()
+    assert stats["retried"] == 2
+    assert stats["sent"] == 1
+    assert stats["dropped"] == 0
+
+def test_send_is_dropped_after_max_attempts():
+    sender = RecordingSender(failures={"broken": 100})
+    queue = writer(sender, max_attempts=3)
+
+    queue.submit("broken")
+    queue.flush()
+
+    assert sender.calls_for("broken") == 3
+    stats = queue.stats()
+    assert stats["retried"] == 2
+    assert stats["dropped"] == 1
+    assert stats["sent"] == 0
+
+def test_sender_exception_fails_the_whole_batch():
+    calls = []
+    def sender(tokens):
+        calls.append(list(tokens))
+        if len(calls) == 1:
+            raise RuntimeError("Redis microservice down")
+        return []
+    queue = writer(sender, max_attempts=2)
+
+    queue.submit("token")
+    queue.flush()
+
+    assert calls == [["token"], ["token"]]
+    assert queue.stats()["sent"] == 1
+
+def test_full_queue_rejects_without_blocking():
+    gate = threading.Event()
+    sender = RecordingSender(gate=gate)
+    queue = writer(sender, max_size=1)
+
+    assert queue.submit("in-flight")
+    assert sender.started.wait(5)
+    assert queue.submit("queued")
+    assert not queue.submit("rejected")
+    assert queue.stats()["rejected_full"] == 1
+
+    gate.set()
+    queue.flush()
+    assert queue.stats()["sent"] == 2
+
+def test_flush_gives_up_after_flush_timeout():
+    gate = threading.Event()
+    sender = RecordingSender(gate=gate)
+    queue = writer(sender, flush_timeout=0.2)
+
+    queue.submit("stuck")
+    assert sender.started.wait(5)
+    start = time.time()
+    queue.flush()
+    elapsed = time.time() - start
+
+    assert 0.15 <= elapsed < 2
+    assert queue.stats()["sent"] == 0
+    gate.set()
+    queue.flush()
+    assert queue.stats()["sent"] == 1
+
+@pytest.mark.parametrize("outcome, retried", [
+    (200, []),
+    (400, []), # A rejected batch would be rejected again
+    (503, ["a", "b"]),
+    (requests.ConnectionError("refused"), ["a", "b"]),
+])
+def test_app_sender_retries_only_unreachable_and_5xx(auth0_app, monkeypatch, outcome, retried):
+    def post(*args, **kwargs):
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = requests.Response()
+        response.status_code = outcome
+        return response
+    monkeypatch.setattr(auth0_app.http_client, "post", post)
+
+    assert auth0_app.send_redis_tokens(["a", "b"]) == retried
@@ -0,0 +1,136 @@
+"""
+Upstream responses that aren't JSON (an HTML error page from a proxy, a
+truncated body) are parsed once and answered with a 502 JSON error instead
+of raising inside the route.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+
+def upstream_response(status_code, body):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body.encode()
+    return response
+
+@pytest.fixture
+def client(auth0_app):
+    return auth0_app.app.test_client()
+
+@pytest.fixture
+def token(auth0_app):
+    return auth0_app.create_private_jwt({"sub": "auth0|user", "name": "User"})
+
+def test_verify_user_session_check_with_html_response_is_502(auth0_app, client, token, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "get", lambda *args, **kwargs: upstream_response(502, "<html>Bad Gateway</html>"))
+
+    res = client.get("/verify-user?session=true", headers={"Authorization": token})
+
+    assert res.status_code == 502
+    assert res.get_json() == {"success": False, "error": "Invalid response from Redis microservice"}
+
+def test_verify_user_session_check_passes_redis_errors_through(auth0_app, client, token, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "get", lambda *args, **kwargs: upstream_response(401, '{"success": false, "error": "Session expired"}'))
+
+    res = client.get("/verify-user?session=true", headers={"Authorization": token})
+
+    assert res.status_code == 401
+    assert res.get_json()["error"] == "Session expired"
+
+def test_verify_user_without_session_check_never_calls_redis(auth0_app, client, token, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Redis microservice called")
+    monkeypatch.setattr(auth0_app.http_client, "get", fail)
+
+    res = client.get("/verify-user", headers={"Authorization": token})
+
+    assert res.status_code == 200
+    assert res.get_json()["user_info"]["sub"] == "auth0|user"
+
+def test_callback_with_html_token_response_is_502(auth0_app, client, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "post", lambda *args, **kwargs: upstream_response(200, "<html></html>"))
+
+    res = client.get("/callback?code=abc&state=Flask")
+
+    assert res.status_code == 502
+    assert res.get_json() == {"success": False, "error": "Invalid token response from Auth0"}
+
+def test_callback_with_html_user_info_is_502(auth0_app, client, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "post", lambda *args, **kwargs: upstream_response(200, '{"access_token": "at"}'))
+    monkeypatch.setattr(auth0_app.http_client, "get", lambda *args, **kwargs: upstream_response(200, "<html></html>"))
+
+    res = client.get("/callback?code=abc&state=Flask")
+
+    assert res.status_code == 502
+    assert res.get_json() == {"success": False, "error": "Invalid user info response from Auth0"}
+
+def test_session_creation_with_html_response_is_502(auth0_app, token, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "get", lambda *args, **kwargs: upstream_response(500, "Internal Server Error"))
+
+    with auth0_app.app.test_request_context():
+        response, status = auth0_app.handle_redis_based_on_app("CLI", token)
+
+    assert status == 502
+    assert response.get_json() == {"success": False, "error": "Invalid response from Redis microservice"}
+
+def test_session_creation_failure_keeps_redis_status(auth0_app, token, monkeypatch):
+    monkeypatch.setattr(auth0_app.http_client, "get", lambda *args, **kwargs: upstream_response(400, '{"success": false, "error": "Invalid JWT"}'))
+
+    with auth0_app.app.test_request_context():
+        response, status = auth0_app.handle_redis_based_on_app("Flask", token)
+
+    assert status == 400
+    assert response.get_json()["error"] == "Invalid JWT"
+
+def test_unreachable_redis_microservice_is_503(auth0_app, client, token, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(auth0_app.http_client, "get", unreachable)
+
+    res = client.get("/verify-user?session=true", headers={"Authorization": token})
+
+    assert res.status_code == 503
+    assert res.get_json() == {"success": False, "error": "Redis microservice unreachable"}
+
+def run_with_upstream(auth0_asgi_app, monkeypatch, response, coroutine_function, *args):
+    """
+    Runs an asgi_app helper inside a Quart app context, every upstream call answering with response
+    """
+    async def send_upstream(*_args, **_kwargs):
+        return response
+    monkeypatch.setattr(auth0_asgi_app, "send_upstream", send_upstream)
+
+    async def run():
+        async with auth0_asgi_app.quart_app.app_context():
+            result = await coroutine_function(*args)
+            if isinstance(result, tuple):
+                return await result[0].get_json(), result[1]
+            return result
+    return asyncio.run(run())
+
+def test_async_session_creation_with_html_response_is_502(auth0_asgi_app, token, monkeypatch):
+    response = httpx.Response(502, text="<html>Bad Gateway</html>")
+
+    body, status = run_with_upstream(auth0_asgi_app, monkeypatch, response, auth0_asgi_app.handle_redis_based_on_app, "CLI", token)
+
+    assert status == 502
+    assert body == {"success": False, "error": "Invalid response from Redis microservice"}
+
+def test_async_session_creation_failure_keeps_redis_status(auth0_asgi_app, token, monkeypatch):
+    response = httpx.Response(400, json={"success": False, "error": "Invalid JWT"})
+
+    body, status = run_with_upstream(auth0_asgi_app, monkeypatch, response, auth0_asgi_app.handle_redis_based_on_app, "Flask", token)
+
+    assert status == 400
+    assert body["error"] == "Invalid JWT"
+
+def test_async_user_info_with_html_response_fails(auth0_asgi_app, monkeypatch):
+    response = httpx.Response(200, text="<html></html>")
+
+    result = run_with_upstream(auth0_asgi_app, monkeypatch, response, auth0_asgi_app.exchange_token_for_user_info, "access-token")
+
+    assert result == {"success": False, "error": "Invalid user info response from Auth0"}
@@ -1,47 +1,249 @@
-from flask import Flask, jsonify, request
-from cryptography.hazmat.primitives import serialization
+from flask import Flask, Response, g, jsonify, request
+from key_store import PublicKeyStore
+from common.token_cache import VerifiedTokenCache
+from session_store import DEFAULT_TTL_SECONDS, SessionStore, session_id_for
+from redis_client import REDIS_CLIENT_CACHE, create_redis_client, pool_stats
+from common.internal_auth import verify_request
+from common.revocation import RevocationList
+from common.invalidation import InvalidationBus
+from common.metrics import REGISTRY, record_request
+from common.request_log import REQUEST_ID_HEADER, SampledLogger, bind_request_id
+from common.tracing import TRACEPARENT_HEADER, TRACER, create_exporter
+from common.profiling import ProfilerBusy, RequestProfiler, SamplingProfiler
 import jwt
-import redis
 import os
+import signal
+import time
 from dotenv import load_dotenv
-import datetime
 
 # -----------------------------
 # A backend microservice to update the Redis database.
 # It also verifies the JWT token before retrieving information. 
 # -----------------------------
 PORT = 7002
-REDIS_PORT = 6379
 DEBUG_MODE = True
-TIME_UNTIL_EXPIRED = 30 * 60 # Seconds until token is considered expired 30 minutes
+TIME_UNTIL_EXPIRED = DEFAULT_TTL_SECONDS # Seconds of inactivity until the session expires (Redis key TTL) 30 minutes
 
 load_dotenv()
 PASSWORD = os.getenv("REDIS_DATABASE_PASSWORD")
+PUBLIC_KEY_PATH = os.getenv("PUBLIC_KEY_PATH", "public.pem") # Comma separated to accept several keys (e.g. RS256 + EdDSA) by kid
+PUBLIC_KEY_POLL_INTERVAL = float(os.getenv("PUBLIC_KEY_POLL_INTERVAL", "5")) # 0 disables reloading
+PREVIOUS_KEY_TTL = float(os.getenv("PREVIOUS_KEY_TTL", "600")) # Seconds a replaced key still verifies its tokens, at least the token lifetime
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000")) # 0 disables the verified token cache
+MAX_BATCH_SESSIONS = int(os.getenv("MAX_BATCH_SESSIONS", "1000")) # Most tokens/user IDs accepted by one bulk call
+DEFER_BACKGROUND_THREADS = os.getenv("DEFER_BACKGROUND_THREADS", "false") == "true" # Set by gunicorn.conf.py
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01")) # Fraction of routine request events logged, 0 disables
+METRICS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") # Directory the workers share metric snapshots in, set by gunicorn.conf.py
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5")) # Seconds between a worker's metric snapshots
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none") # none, file (JSON lines) or otlp (OpenTelemetry collector), see common/tracing.py
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl") # Appended to with TRACING_EXPORTER=file
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces") # With TRACING_EXPORTER=otlp
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0")) # Fraction of new traces recorded, incoming ones keep their caller's decision
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false") == "true" # POST /admin/profile and SIGUSR2 sampling profiles, see common/profiling.py
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles") # Where SIGUSR2 and slow request profiles are written
+PROFILE_SIGNAL_SECONDS = float(os.getenv("PROFILE_SIGNAL_SECONDS", "10")) # Length of a SIGUSR2 sampling profile
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "25")) # Longest /admin/profile run, keep under GUNICORN_TIMEOUT
+PROFILE_SLOW_REQUEST_MS = float(os.getenv("PROFILE_SLOW_REQUEST_MS", "0")) # cProfile requests slower than this, 0 disables
+PROFILE_REQUEST_RATE = float(os.getenv("PROFILE_REQUEST_RATE", "0.01")) # Fraction of requests run under cProfile when enabled
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "100")) # Slow request profiles kept per process
+# With REDIS_CLIENT_CACHE on, /update_session only writes a session's TTL once per interval,
+# reads in between are answered from the client-side cache
+SESSION_REFRESH_INTERVAL = float(os.getenv("SESSION_REFRESH_INTERVAL", "60")) # Seconds
+
+# Revocation list (common/revocation.py), Bloom filter sizing and how often it is rebuilt from Redis
+REVOCATION_CAPACITY = int(os.getenv("REVOCATION_CAPACITY", "100000"))
+REVOCATION_ERROR_RATE = float(os.getenv("REVOCATION_ERROR_RATE", "0.001"))
+REVOCATION_REBUILD_INTERVAL = float(os.getenv("REVOCATION_REBUILD_INTERVAL", "300")) # Seconds
+
+# Trust policy for calls from the Auth0 microservice (common/internal_auth.py)
+# - "rs256": every token is verified with the public key (default)
+# - "hmac": tokens on requests signed with INTERNAL_AUTH_SECRET skip the RS256 verify
+INTERNAL_TRUST = os.getenv("INTERNAL_TRUST", "rs256")
+INTERNAL_AUTH_SECRET = os.getenv("INTERNAL_AUTH_SECRET")
+INTERNAL_AUTH_MAX_SKEW = int(os.getenv("INTERNAL_AUTH_MAX_SKEW", "30")) # Seconds a signed request stays valid
+if INTERNAL_TRUST not in ("rs256", "hmac"):
+    raise ValueError(f"INTERNAL_TRUST must be 'rs256' or 'hmac', got {INTERNAL_TRUST!r}")
+if INTERNAL_TRUST == "hmac" and not INTERNAL_AUTH_SECRET:
+    raise ValueError("INTERNAL_TRUST=hmac requires INTERNAL_AUTH_SECRET")
 
 app = Flask(__name__)
-redis_app = redis.Redis(
-    host="localhost", 
-    port=REDIS_PORT, 
-    password=PASSWORD,
-    db=0,
-    decode_responses=True
-    )
+# Shared connection pool, mode (standalone/cluster/sentinel), addresses, pool limits and timeouts come from the environment (redis_client.py)
+redis_app = create_redis_client(password=PASSWORD)
+session_store = SessionStore(
+    redis_app,
+    TIME_UNTIL_EXPIRED,
+    refresh_interval=SESSION_REFRESH_INTERVAL if REDIS_CLIENT_CACHE else 0
+)
+
+# Parsed once here, reloaded in the background when public.pem changes
+public_key_store = PublicKeyStore(
+    [path.strip() for path in PUBLIC_KEY_PATH.split(",") if path.strip()],
+    poll_interval=PUBLIC_KEY_POLL_INTERVAL,
+    previous_key_ttl=PREVIOUS_KEY_TTL
+)
+
+# Claims of tokens that already passed verification, so repeat page views skip RS256
+verified_token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE)
+
+# Logged out tokens (by jti) until they expire, checked in memory through a Bloom filter
+revocation_list = RevocationList(
+    redis_app,
+    capacity=REVOCATION_CAPACITY,
+    error_rate=REVOCATION_ERROR_RATE,
+    rebuild_interval=REVOCATION_REBUILD_INTERVAL
+)
+
+# Keeps every replica's verified token cache in step: logouts and key rotations are
+# published, other replicas drop the same entries, and a replica that lost the
+# connection clears its cache when it resubscribes
+invalidation_bus = InvalidationBus(redis_app)
+
+def drop_cached_tokens(keys):
+    """
+    Another replica logged these tokens out (verified token cache keys)
+    """
+    for key in keys:
+        verified_token_cache.invalidate_key(key)
+
+def check_public_key(_):
+    """
+    Another replica rotated keys, pick up a new public.pem now instead of at the next poll
+    """
+    if public_key_store.reload_if_changed():
+        verified_token_cache.clear()
+
+def on_public_key_change():
+    """
+    The public key changed on disk: tokens cached under the old key must be verified again
+    """
+    verified_token_cache.clear()
+    invalidation_bus.publish("keys")
+
+invalidation_bus.on("tokens", drop_cached_tokens)
+invalidation_bus.on("keys", check_public_key)
+invalidation_bus.on("clear", lambda _: verified_token_cache.clear())
+invalidation_bus.on_resync(verified_token_cache.clear)
+public_key_store.on_change = on_public_key_change
+
+# Exact counts go to /metrics, routine per-request events are only logged for a sample
+request_log = SampledLogger("redis_microservice", LOG_SAMPLE_RATE)
+JWT_VERIFICATIONS = REGISTRY.counter("jwt_verifications_total", "Tokens checked on a verified token cache miss", ("result",))
+
+# On-demand stack sampling, and cProfile captures of slow requests (Flask app only,
+# under asgi_app.py one event loop thread runs every request so cProfile can't isolate one)
+sampling_profiler = SamplingProfiler(max_seconds=PROFILE_MAX_SECONDS)
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_SLOW_REQUEST_MS, PROFILE_REQUEST_RATE, PROFILE_MAX_CAPTURES)
+
+# Requests join the caller's trace (the Auth0 microservice or a frontend) through the traceparent header
+TRACER.configure("redis_microservice", create_exporter(TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT), TRACING_SAMPLE_RATE)
+
+def cache_hit_ratios():
+    """
+    Hit ratio per in-process cache, read on each /metrics scrape
+    - revocation_filter: lookups the Bloom filter answered without asking Redis
+    """
+    ratios = {("verified_token_cache",): verified_token_cache.stats()["hit_ratio"]}
+    revocation = revocation_list.stats()
+    if revocation["lookups"]:
+        ratios[("revocation_filter",)] = revocation["filter_negatives"] / revocation["lookups"]
+    if REDIS_CLIENT_CACHE:
+        ratios[("session_client_cache",)] = session_store.stats()["hit_rate"]
+    return ratios
+
+REGISTRY.gauge("cache_hit_ratio", "Hits over lookups since the process started", ("cache",), cache_hit_ratios)
+
+# Under gunicorn /metrics sums every worker's snapshot, not only the worker the scrape reached
+if METRICS_MULTIPROC_DIR:
+    REGISTRY.share_across_processes(METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL)
+
+@app.before_request
+def start_request_timer():
+    bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.request_started = time.perf_counter()
+    if TRACER.enabled:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.request_span = TRACER.start_span(
+            f"{request.method} {route}", "server", request.headers.get(TRACEPARENT_HEADER),
+            **{"http.method": request.method, "http.route": route}
+        )
+    if request_profiler.enabled:
+        g.request_profile = request_profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    record_request(route, request.method, response.status_code, time.perf_counter() - g.request_started)
+    if "request_span" in g:
+        g.request_span[0].set_attribute("http.status_code", response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_span(error):
+    if "request_span" in g:
+        TRACER.finish(*g.pop("request_span"), error=repr(error) if error else None)
+
+@app.teardown_request
+def finish_request_profile(error):
+    profile = g.pop("request_profile", None)
+    if profile is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        request_profiler.finish(profile, f"{request.method} {route}", time.perf_counter() - g.request_started)
 
 # -----------------------------
 # Routes
 # -----------------------------
+@app.route("/metrics")
+def metrics():
+    """
+    Prometheus text format: per-route requests and latency, JWT verify, key loads,
+    Redis commands and cache hit ratios, for this process
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats")
+def stats():
+    """
+    Returns internal cache metrics for the microservice
+    """
+    return jsonify({
+        "success": True,
+        "public_keys": public_key_store.stats(),
+        "verified_token_cache": verified_token_cache.stats(),
+        "revocation": revocation_list.stats(),
+        "invalidation_bus": invalidation_bus.stats(),
+        "session_store": session_store.stats(),
+        "redis_pool": pool_stats(redis_app),
+        "profiler": {"sampling": sampling_profiler.stats(), "slow_requests": request_profiler.stats()}
+    })
+
+@app.route("/admin/profile", methods=["POST"])
+def admin_profile():
+    """
+    Admin: samples every thread of this process and returns collapsed stacks (flamegraph.pl, speedscope)
+    - Body (optional): {"seconds": 10, "interval_ms": 5}, an empty body uses those defaults
+    - Signed like /delete_sessions, over the exact body, the empty string when there is none
+    - Only with PROFILING_ENABLED, 409 while another profile of this process is running
+    - Under gunicorn this profiles the worker that happened to take the request
+    """
+    body = request.get_data(as_text=True)
+    if PROFILING_ENABLED and not is_admin_call(request.headers, request.path, body):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+    stacks, error = sample_profile(request.get_json(silent=True))
+    if error:
+        return jsonify(error[0]), error[1]
+    return Response(stacks, mimetype="text/plain")
+
 @app.route("/create_session")
 def create_session():
     """
     Given the user logs in from Auth0 microservice, when the JWT token is received by the microservice:
      - Verify the JWT is a valid JWT token
-        - If the user ID already exists:
-            - Value 1 as the new JWT
-            - Value 2 as the new expiration date
-        - If it does not exist, create a record in the Redis JWT database that contains:
-            - Key as the user ID
+        - Create a session for this device (the JWT's "jti") in the Redis JWT database that contains:
+            - Key as the user ID + session ID
             - Value 1 as the JWT 
-            - Value 2 as the session expiration date
+            - Key TTL as the session expiration (TIME_UNTIL_EXPIRED)
+        - Add the session ID to the user's session index
+        - Sessions on the user's other devices are left alone
     """
     # Grab token from request header
     token = request.headers.get("Authorization", None)
@@ -57,10 +259,8 @@ def create_session():
     user_info = response_dict.get("user_info")
     user_id = user_info.get("sub")
 
-    # Check if user id exists in the REDIS database
-    # - If it does, update the record
-    # - Else, create a new record
-    redis_app.hset(user_id, mapping={"JWT": token, "last_updated": datetime.datetime.now().isoformat()})
+    # Create (or overwrite) this device's session
+    session_store.create(user_id, session_id_for(user_info, token), token)
     res = jsonify(response_dict), 201
     return res
 
@@ -91,14 +291,11 @@ def update_session():
     user_info = response_dict.get("user_info")
     user_id = user_info.get("sub")
 
-    # Verify session hasn't expired, sends error if session expired
-    if is_session_expired(user_id):
+    # Verify this device's session hasn't expired and push its TTL out in one round trip,
+    # sends error if session expired (Redis already removed the key)
+    if not session_store.refresh(user_id, session_id_for(user_info, token)):
         return jsonify({"success": False, "error": "Session expired"}), 401
 
-    # Invalidates old device if new device is signed in
-    # Adds to Redis database as refreshed
-    redis_app.hset(user_id, mapping={"JWT": token, "last_updated": datetime.datetime.now().isoformat()})
-
     # Because the JWT is valid and the session is updated, 
     # return the user ID associated with the JWT in the response, 200
     return jsonify({
@@ -112,10 +309,13 @@ def delete_session():
     """
     When the user logs out
         - Verify the JWT is a valid JWT token
-        - If userId is in database:
-            - Invalidate the user ID by removing the user ID from the database
+        - If this device's session is in the database:
+            - Remove it and its entry in the user's session index
+            - Revoke the token (by jti) until it expires, so /verify-user rejects it too
         - Else:
             - Send error saying user already logged out
+        - ?session_id=<id> logs out another of the user's devices instead (IDs from /list_sessions)
+        - ?all=true logs out every device
     """
     # Grab token from request header
     token = request.headers.get("Authorization", None)
@@ -131,58 +331,349 @@ def delete_session():
     user_info = response_dict.get("user_info")
     user_id = user_info.get("sub")
 
-    # Check if user id exists in the REDIS database
-    if redis_app.exists(user_id):
-        redis_app.delete(user_id)
+    # Delete the session(s) from the REDIS database if they exist, no keyspace scans
+    current = session_id_for(user_info, token)
+    session_id = request.args.get("session_id") or current
+    every_device = request.args.get("all") == "true"
+    if every_device:
+        revoke_tokens([token] + session_store.tokens([(user_id, sid) for sid, _ in session_store.list(user_id)]))
+        deleted = session_store.delete_user(user_id) > 0
+    else:
+        revoke_tokens([token] if session_id == current else session_store.tokens([(user_id, session_id)]))
+        deleted = session_store.delete(user_id, session_id)
+
+    if deleted:
         return jsonify({"success": True, "message": "Session deleted successfully"}), 200
     else:
         return jsonify({"success": False, "error": "User already logged out"}), 400
 
+@app.route("/list_sessions")
+def list_sessions():
+    """
+    Lists the devices the user is logged in on, read from the user's session index
+    - Each session has its ID, seconds until it expires and whether it is this device
+    """
+    token = request.headers.get("Authorization", None)
+    verify_jwt_status = verify_user(token)
+    response_dict = verify_jwt_status[0].get_json()
+    if not response_dict.get("success"):
+        return verify_jwt_status
+
+    user_id = response_dict["user_info"].get("sub")
+    current = session_id_for(response_dict["user_info"], token)
+    return jsonify({
+        "success": True,
+        "user_id": user_id,
+        "sessions": [
+            {"session_id": session_id, "ttl_seconds": ttl, "current": session_id == current}
+            for session_id, ttl in session_store.list(user_id)
+        ]
+    }), 200
+
+# -----------------------------
+# Bulk routes, each runs as one pipelined Redis round trip
+# -----------------------------
+@app.route("/create_sessions", methods=["POST"])
+def create_sessions():
+    """
+    Creates sessions for many tokens at once, e.g. warming sessions for a migration
+    - Body: {"tokens": ["<jwt>", ...]}
+    - Each token is verified like /create_session, invalid ones are reported and skipped
+    - Returns {"success": true, "results": [...]} with one result per token, in order
+    """
+    tokens, error = parse_batch(request.get_json(silent=True), "tokens")
+    if error:
+        return jsonify(error), 400
+
+    trusted = is_trusted_internal_call(request.headers, request.path, request.get_data(as_text=True))
+    results, valid = verify_tokens(tokens, trusted)
+    session_store.create_many([(user_id, session_id, token) for _, user_id, session_id, token in valid])
+    return jsonify({"success": True, "results": results}), 200
+
+@app.route("/update_sessions", methods=["POST"])
+def update_sessions():
+    """
+    Refreshes the sessions of many tokens at once
+    - Body: {"tokens": ["<jwt>", ...]}
+    - Per token result like /update_session: success, or "Session expired"
+    """
+    tokens, error = parse_batch(request.get_json(silent=True), "tokens")
+    if error:
+        return jsonify(error), 400
+
+    trusted = is_trusted_internal_call(request.headers, request.path, request.get_data(as_text=True))
+    results, valid = verify_tokens(tokens, trusted)
+    refreshed = session_store.refresh_many([(user_id, session_id) for _, user_id, session_id, _ in valid])
+    for (i, _, _, _), ok in zip(valid, refreshed):
+        if not ok:
+            results[i] = {"success": False, "error": "Session expired"}
+    return jsonify({"success": True, "results": results}), 200
+
+@app.route("/delete_sessions", methods=["POST"])
+def delete_sessions():
+    """
+    Admin: revokes sessions by user ID, or every session (e.g. after a key compromise)
+    - Body: {"user_ids": ["<sub>", ...]} (every device of each user) or {"all": true}
+    - Must be signed with INTERNAL_AUTH_SECRET (common/internal_auth.py, signed over the body)
+    - Revokes the deleted sessions' tokens, except for "all" (rotate the signing key instead)
+    - "all" SCANs the keyspace in batches, it never blocks Redis with KEYS
+    """
+    if not is_admin_call(request.headers, request.path, request.get_data(as_text=True)):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and body.get("all") is True:
+        deleted = session_store.revoke_all()
+        verified_token_cache.clear()
+        invalidation_bus.publish("clear")
+        return jsonify({"success": True, "deleted": deleted}), 200
+
+    user_ids, error = parse_batch(body, "user_ids")
+    if error:
+        return jsonify(error), 400
+    user_sessions = session_store.list_many(user_ids)
+    revoke_tokens(session_store.tokens([(user_id, sid) for user_id, sessions in zip(user_ids, user_sessions) for sid, _ in sessions]))
+    deleted = session_store.delete_users(user_ids)
+    return jsonify({
+        "success": True,
+        "results": [{"user_id": user_id, "deleted": ok} for user_id, ok in zip(user_ids, deleted)]
+    }), 200
+
+@app.route("/lookup_sessions", methods=["POST"])
+def lookup_sessions():
+    """
+    Admin: lists each user's live sessions (devices) and how long they have left
+    - Body: {"user_ids": ["<sub>", ...]}, signed like /delete_sessions
+    """
+    if not is_admin_call(request.headers, request.path, request.get_data(as_text=True)):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+
+    user_ids, error = parse_batch(request.get_json(silent=True), "user_ids")
+    if error:
+        return jsonify(error), 400
+    sessions = session_store.list_many(user_ids)
+    return jsonify({
+        "success": True,
+        "results": [lookup_result(user_id, user_sessions) for user_id, user_sessions in zip(user_ids, sessions)]
+    }), 200
+
 # -----------------------------
 # HELPERS
 # -----------------------------
 def verify_user(token):
     """
     Verifies the user's JWT and expiration
+    - Uses the verified token cache when the same token was checked before
+    - Skips the signature check for signed calls from the Auth0 microservice (INTERNAL_TRUST=hmac)
     """
-    if not token:
-        return jsonify({"success": False, "error": "Authorization header missing"}), 401
+    trusted = is_trusted_internal_call(request.headers, request.path, token)
+    result, status = verify_token(token, trusted)
+    return jsonify(result), status
+
+def is_trusted_internal_call(headers, path, token):
+    """
+    True if the trust policy allows it and the request carries a valid
+    internal signature for this route and token
+    """
+    if INTERNAL_TRUST != "hmac":
+        return False
+    return verify_request(INTERNAL_AUTH_SECRET, headers, path, token, max_skew=INTERNAL_AUTH_MAX_SKEW)
 
-    with open("public.pem", "rb") as f:
-        public_key = serialization.load_pem_public_key(f.read())
+def is_admin_call(headers, path, body):
+    """
+    True if the request body is signed with INTERNAL_AUTH_SECRET, admin routes
+    are disabled while no secret is configured
+    """
+    if not INTERNAL_AUTH_SECRET:
+        return False
+    return verify_request(INTERNAL_AUTH_SECRET, headers, path, body, max_skew=INTERNAL_AUTH_MAX_SKEW)
 
-    # decode JWT
+def sample_profile(options):
+    """
+    Runs a sampling profile for admin_profile, shared with asgi_app.py
+    - Returns (collapsed stacks, None) or (None, (error dictionary, status code))
+    """
+    if not PROFILING_ENABLED:
+        return None, ({"success": False, "error": "Profiling is disabled"}, 404)
+    options = options if isinstance(options, dict) else {}
     try:
-        user_info = jwt.decode(token, public_key, algorithms=["RS256"])
-        print("User info success")
-    except jwt.ExpiredSignatureError:
-        print("Expired JWT")
-        return jsonify({"success": False, "error": "JWT expired"}), 401
-    except jwt.InvalidTokenError:
-        print("Invalid JWT")
-        return jsonify({"success": False, "error": "Invalid JWT"}), 401
+        return sampling_profiler.profile(float(options.get("seconds", 10)), float(options.get("interval_ms", 5)) / 1000), None
+    except ProfilerBusy:
+        return None, ({"success": False, "error": "A profile is already running"}, 409)
+    except (TypeError, ValueError):
+        return None, ({"success": False, "error": "seconds and interval_ms must be numbers"}, 400)
+
+def parse_batch(body, field):
+    """
+    Reads a bulk request's list of strings, shared with asgi_app.py
+    - Returns (items, None) or (None, error dictionary)
+    """
+    items = body.get(field) if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items or not all(isinstance(item, str) for item in items):
+        return None, {"success": False, "error": f"Body must contain a non-empty '{field}' list of strings"}
+    if len(items) > MAX_BATCH_SESSIONS:
+        return None, {"success": False, "error": f"At most {MAX_BATCH_SESSIONS} {field} per request"}
+    return items, None
+
+def lookup_result(user_id, sessions):
+    """
+    /lookup_sessions result for one user, shared with asgi_app.py
+    """
+    return {
+        "user_id": user_id,
+        "active": bool(sessions),
+        "sessions": [{"session_id": session_id, "ttl_seconds": ttl} for session_id, ttl in sessions]
+    }
+
+def verify_tokens(tokens, trusted=False):
+    """
+    Verifies a bulk request's tokens
+    - Returns (a result per token, [(index, user_id, session_id, token) for the valid ones])
+    """
+    return collect_verified(tokens, [verify_token(token, trusted)[0] for token in tokens])
+
+def collect_verified(tokens, verified):
+    """
+    Pairs each token with its verify_token() result, shared with asgi_app.py
+    - Returns (a result per token, [(index, user_id, session_id, token) for the valid ones])
+    """
+    results = []
+    valid = []
+    for i, (token, result) in enumerate(zip(tokens, verified)):
+        if result.get("success"):
+            user_id = result["user_info"].get("sub")
+            results.append({"success": True, "user_id": user_id})
+            valid.append((i, user_id, session_id_for(result["user_info"], token), token))
+        else:
+            results.append(result)
+    return results, valid
+
+def revoke_tokens(tokens):
+    """
+    Adds tokens to the revocation list until they expire
+    - Drops them from this and every other replica's verified token cache
+    """
+    keys, revocations = drop_revoked_tokens(tokens)
+    if keys:
+        invalidation_bus.publish("tokens", keys)
+    for jti, exp in revocations:
+        revocation_list.revoke(jti, exp)
+
+def drop_revoked_tokens(tokens):
+    """
+    The in-process part of revoke_tokens, shared with asgi_app.py which publishes and revokes asynchronously
+    - Drops the tokens from this process' verified token cache
+    - Returns (cache keys for the other replicas, [(jti, exp)] for the revocation list)
+    """
+    tokens = [token for token in tokens if token is not None]
+    keys = [verified_token_cache.key_for(token) for token in tokens]
+    for key in keys:
+        verified_token_cache.invalidate_key(key)
+    return keys, revocations_for(tokens)
+
+def revocations_for(tokens):
+    """
+    Returns [(jti, exp)] to revoke for tokens
+    - Skips missing (None) tokens and tokens without a jti
+    - The tokens come from this service's own session store, so they are read without verifying
+    """
+    revocations = []
+    for token in tokens:
+        if token is None:
+            continue
+        try:
+            claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            continue
+        if claims.get("jti") is not None:
+            revocations.append((claims["jti"], claims.get("exp")))
+    return revocations
+
+def verify_token(token, trusted=False):
+    """
+    Framework-independent body of verify_user
+    - trusted: the token arrived over the signed internal channel, so only
+      its expiration is checked and the signature verify is skipped
+    - Returns (response dictionary, status code)
+    - asgi_app.py runs decode_token() and verified_response() around an async revocation check
+    """
+    user_info, error = decode_token(token, trusted)
+    if error:
+        return error
+    # Logged out tokens stay revoked until they expire, usually answered by the in-memory filter
+    return verified_response(user_info, revocation_list.is_revoked(user_info.get("jti")))
+
+def decode_token(token, trusted=False):
+    """
+    Verifies the JWT's signature (unless trusted) and expiration, no network hop
+    - Returns (claims, None) or (None, (error dictionary, status code))
+    """
+    if not token:
+        return None, ({"success": False, "error": "Authorization header missing"}, 401)
+
+    # Tokens verified before skip the signature check until they expire
+    user_info = verified_token_cache.get(token)
+    if user_info is None:
+        # decode JWT with the in-memory key, or only read it if the Auth0 microservice vouched for it
+        try:
+            with TRACER.span("jwt.verify", trusted=trusted):
+                if trusted:
+                    user_info = jwt.decode(token, options={"verify_signature": False, "verify_exp": True})
+                else:
+                    user_info = public_key_store.decode(token)
+        except jwt.ExpiredSignatureError:
+            JWT_VERIFICATIONS.labels(result="expired").inc()
+            request_log.event("jwt_rejected", reason="expired", trusted=trusted)
+            return None, ({"success": False, "error": "JWT expired"}, 401)
+        except jwt.InvalidTokenError as e:
+            JWT_VERIFICATIONS.labels(result="invalid").inc()
+            request_log.event("jwt_rejected", reason="invalid", detail=str(e), trusted=trusted)
+            return None, ({"success": False, "error": "Invalid JWT"}, 401)
+        JWT_VERIFICATIONS.labels(result="valid").inc()
+        request_log.event("jwt_verified", trusted=trusted, jti=user_info.get("jti"))
+        verified_token_cache.put(token, user_info)
+    return user_info, None
+
+def verified_response(user_info, revoked):
+    """
+    Returns (response dictionary, status code) for a token that decoded
+    """
+    if revoked:
+        return {"success": False, "error": "JWT revoked"}, 401
 
     # returns successful message
-    return jsonify({
+    return {
         "success": True,
         "message": f"Hello, {user_info.get('name')}! You are authenticated.",
         "user_info": user_info
-    }), 200
+    }, 200
 
-def is_session_expired(user_id: str) -> bool:
+# Initialize application
+def start_background_threads():
     """
-    Given the user_id exists in the database:
-    - Checks if now - user_id.last_updated is > TIME_UNTIL_EXPIRED
+    Starts this process' public key watcher, revocation list, invalidation bus, span exporter and metrics snapshot writer threads
+    - Safe to call more than once, a forked worker gets its own threads
     """
-    last_updated_str = redis_app.hget(user_id, "last_updated")
-    if not last_updated_str:
-        return True
-    
-    last_updated = datetime.datetime.fromisoformat(last_updated_str)
-    now = datetime.datetime.now()
-    elapsed_time = (now - last_updated).total_seconds()
-    return elapsed_time > TIME_UNTIL_EXPIRED
+    public_key_store.start_watcher()
+    revocation_list.start()
+    invalidation_bus.start()
+    TRACER.start()
+    REGISTRY.start()
+
+# Threads don't survive a fork: under gunicorn (gunicorn.conf.py) the app is loaded once in
+# the master and each worker starts its own threads after the fork
+def install_signal_handlers():
+    """
+    With PROFILING_ENABLED, SIGUSR2 writes a PROFILE_SIGNAL_SECONDS sampling profile to PROFILE_DIR
+    - Must run in the main thread after the server has set up its own handlers
+      (gunicorn.conf.py's post_worker_init, gunicorn resets USR2 in workers)
+    """
+    if PROFILING_ENABLED:
+        sampling_profiler.install_signal_handler(signal.SIGUSR2, PROFILE_SIGNAL_SECONDS, PROFILE_DIR)
+
+if not DEFER_BACKGROUND_THREADS:
+    start_background_threads()
+    install_signal_handlers()
 
-# Initialize application
 if __name__ == "__main__":
     app.run(port=PORT, debug=DEBUG_MODE)
\ No newline at end of file
@@ -0,0 +1,291 @@
+from quart import Quart, Response, g, jsonify, request
+from redis_client import create_async_redis_client, pool_stats
+from session_store import AsyncSessionStore, session_id_for
+from common.metrics import REGISTRY, record_request
+from common.request_log import REQUEST_ID_HEADER, bind_request_id
+from common.tracing import TRACEPARENT_HEADER, TRACER
+import asyncio
+import time
+import app as sync_app
+
+# -----------------------------
+# Async (ASGI) version of the Redis microservice.
+# Same routes and responses as app.py, but every Redis command awaits on a
+# redis.asyncio connection pool, so one process serves many concurrent
+# session refreshes instead of one per blocked Flask worker.
+# JWT verification reuses the sync app's in-memory key and verified token
+# cache: a cache hit is a dictionary lookup and a miss is a ~0.1 ms RS256
+# verify, cheaper to run inline than to hand off to a thread. The revocation
+# list's in-memory filter is shared the same way, its Redis calls (the rare
+# "maybe" check, logouts) and invalidation publishes await on this app's
+# redis.asyncio client, so nothing blocks the event loop on the network.
+#
+# Run with: uvicorn asgi_app:application --port 7002
+#       or: hypercorn asgi_app:application --bind 0.0.0.0:7002
+# -----------------------------
+
+app = Quart(__name__)
+application = app
+session_store = None # Created at startup so the pool belongs to the server's event loop
+
+@app.before_serving
+async def open_redis_client():
+    global session_store
+    session_store = AsyncSessionStore(create_async_redis_client(password=sync_app.PASSWORD), sync_app.TIME_UNTIL_EXPIRED)
+
+@app.after_serving
+async def close_redis_client():
+    await session_store.client.aclose()
+
+@app.before_request
+async def start_request_timer():
+    bind_request_id(request.headers.get(REQUEST_ID_HEADER))
+    g.request_started = time.perf_counter()
+    if TRACER.enabled:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.request_span = TRACER.start_span(
+            f"{request.method} {route}", "server", request.headers.get(TRACEPARENT_HEADER),
+            **{"http.method": request.method, "http.route": route}
+        )
+
+@app.after_request
+async def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    record_request(route, request.method, response.status_code, time.perf_counter() - g.request_started)
+    if "request_span" in g:
+        g.request_span[0].set_attribute("http.status_code", response.status_code)
+    return response
+
+@app.teardown_request
+async def end_request_span(error):
+    if "request_span" in g:
+        TRACER.finish(*g.pop("request_span"), error=repr(error) if error else None)
+
+# -----------------------------
+# Routes
+# -----------------------------
+@app.route("/metrics")
+async def metrics():
+    """
+    Same as app.metrics, the registry is shared with the sync app's modules
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats")
+async def stats():
+    """
+    Returns internal cache metrics for the microservice
+    """
+    return jsonify({
+        "success": True,
+        "public_keys": sync_app.public_key_store.stats(),
+        "verified_token_cache": sync_app.verified_token_cache.stats(),
+        "revocation": sync_app.revocation_list.stats(),
+        "invalidation_bus": sync_app.invalidation_bus.stats(),
+        "redis_pool": pool_stats(session_store.client),
+        "profiler": {"sampling": sync_app.sampling_profiler.stats(), "slow_requests": None}
+    })
+
+@app.route("/admin/profile", methods=["POST"])
+async def admin_profile():
+    """
+    Async version of app.admin_profile, samples on a thread so the event loop keeps serving
+    - The event loop thread's stacks show the coroutine running at each sample, not the ones awaiting
+    """
+    body = await request.get_data(as_text=True)
+    if sync_app.PROFILING_ENABLED and not sync_app.is_admin_call(request.headers, request.path, body):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+    stacks, error = await asyncio.to_thread(sync_app.sample_profile, await request.get_json(silent=True))
+    if error:
+        return jsonify(error[0]), error[1]
+    return Response(stacks, mimetype="text/plain")
+
+@app.route("/create_session")
+async def create_session():
+    """
+    Async version of app.create_session
+    """
+    token = request.headers.get("Authorization", None)
+    result, status = await verify_token(token, sync_app.is_trusted_internal_call(request.headers, request.path, token))
+    if not result.get("success"):
+        return jsonify(result), status
+
+    user_id = result["user_info"].get("sub")
+    await session_store.create(user_id, session_id_for(result["user_info"], token), token)
+    return jsonify(result), 201
+
+@app.route("/update_session")
+async def update_session():
+    """
+    Async version of app.update_session
+    """
+    token = request.headers.get("Authorization", None)
+    result, status = await verify_token(token, sync_app.is_trusted_internal_call(request.headers, request.path, token))
+    if not result.get("success"):
+        return jsonify(result), status
+
+    user_info = result["user_info"]
+    user_id = user_info.get("sub")
+    if not await session_store.refresh(user_id, session_id_for(user_info, token)):
+        return jsonify({"success": False, "error": "Session expired"}), 401
+
+    return jsonify({
+        "success": True,
+        "message": f"Hello, {user_info.get('name')}! Your session is updated.",
+        "user_id": user_id
+    }), 200
+
+@app.route("/delete_session")
+async def delete_session():
+    """
+    Async version of app.delete_session
+    """
+    token = request.headers.get("Authorization", None)
+    result, status = await verify_token(token, sync_app.is_trusted_internal_call(request.headers, request.path, token))
+    if not result.get("success"):
+        return jsonify(result), status
+
+    user_id = result["user_info"].get("sub")
+    current = session_id_for(result["user_info"], token)
+    session_id = request.args.get("session_id") or current
+    every_device = request.args.get("all") == "true"
+    if every_device:
+        await revoke_tokens([token] + await session_store.tokens([(user_id, sid) for sid, _ in await session_store.list(user_id)]))
+        deleted = await session_store.delete_user(user_id) > 0
+    else:
+        await revoke_tokens([token] if session_id == current else await session_store.tokens([(user_id, session_id)]))
+        deleted = await session_store.delete(user_id, session_id)
+    if deleted:
+        return jsonify({"success": True, "message": "Session deleted successfully"}), 200
+    else:
+        return jsonify({"success": False, "error": "User already logged out"}), 400
+
+@app.route("/list_sessions")
+async def list_sessions():
+    """
+    Async version of app.list_sessions
+    """
+    token = request.headers.get("Authorization", None)
+    result, status = await verify_token(token, sync_app.is_trusted_internal_call(request.headers, request.path, token))
+    if not result.get("success"):
+        return jsonify(result), status
+
+    user_id = result["user_info"].get("sub")
+    current = session_id_for(result["user_info"], token)
+    return jsonify({
+        "success": True,
+        "user_id": user_id,
+        "sessions": [
+            {"session_id": session_id, "ttl_seconds": ttl, "current": session_id == current}
+            for session_id, ttl in await session_store.list(user_id)
+        ]
+    }), 200
+
+@app.route("/create_sessions", methods=["POST"])
+async def create_sessions():
+    """
+    Async version of app.create_sessions
+    """
+    tokens, error = sync_app.parse_batch(await request.get_json(silent=True), "tokens")
+    if error:
+        return jsonify(error), 400
+
+    body = await request.get_data(as_text=True)
+    results, valid = await verify_tokens(tokens, sync_app.is_trusted_internal_call(request.headers, request.path, body))
+    await session_store.create_many([(user_id, session_id, token) for _, user_id, session_id, token in valid])
+    return jsonify({"success": True, "results": results}), 200
+
+@app.route("/update_sessions", methods=["POST"])
+async def update_sessions():
+    """
+    Async version of app.update_sessions
+    """
+    tokens, error = sync_app.parse_batch(await request.get_json(silent=True), "tokens")
+    if error:
+        return jsonify(error), 400
+
+    body = await request.get_data(as_text=True)
+    results, valid = await verify_tokens(tokens, sync_app.is_trusted_internal_call(request.headers, request.path, body))
+    refreshed = await session_store.refresh_many([(user_id, session_id) for _, user_id, session_id, _ in valid])
+    for (i, _, _, _), ok in zip(valid, refreshed):
+        if not ok:
+            results[i] = {"success": False, "error": "Session expired"}
+    return jsonify({"success": True, "results": results}), 200
+
+@app.route("/delete_sessions", methods=["POST"])
+async def delete_sessions():
+    """
+    Async version of app.delete_sessions
+    """
+    if not sync_app.is_admin_call(request.headers, request.path, await request.get_data(as_text=True)):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+
+    body = await request.get_json(silent=True)
+    if isinstance(body, dict) and body.get("all") is True:
+        deleted = await session_store.revoke_all()
+        sync_app.verified_token_cache.clear()
+        await sync_app.invalidation_bus.publish_async("clear", None, session_store.client)
+        return jsonify({"success": True, "deleted": deleted}), 200
+
+    user_ids, error = sync_app.parse_batch(body, "user_ids")
+    if error:
+        return jsonify(error), 400
+    user_sessions = await session_store.list_many(user_ids)
+    await revoke_tokens(await session_store.tokens([(user_id, sid) for user_id, sessions in zip(user_ids, user_sessions) for sid, _ in sessions]))
+    deleted = await session_store.delete_users(user_ids)
+    return jsonify({
+        "success": True,
+        "results": [{"user_id": user_id, "deleted": ok} for user_id, ok in zip(user_ids, deleted)]
+    }), 200
+
+@app.route("/lookup_sessions", methods=["POST"])
+async def lookup_sessions():
+    """
+    Async version of app.lookup_sessions
+    """
+    if not sync_app.is_admin_call(request.headers, request.path, await request.get_data(as_text=True)):
+        return jsonify({"success": False, "error": "Admin signature missing or invalid"}), 403
+
+    user_ids, error = sync_app.parse_batch(await request.get_json(silent=True), "user_ids")
+    if error:
+        return jsonify(error), 400
+    sessions = await session_store.list_many(user_ids)
+    return jsonify({
+        "success": True,
+        "results": [sync_app.lookup_result(user_id, user_sessions) for user_id, user_sessions in zip(user_ids, sessions)]
+    }), 200
+
+# -----------------------------
+# HELPERS
+# -----------------------------
+async def verify_token(token, trusted=False):
+    """
+    Async version of app.verify_token, the revocation check awaits on the async client
+    """
+    return (await verify_each([token], trusted))[0]
+
+async def verify_tokens(tokens, trusted=False):
+    """
+    Async version of app.verify_tokens
+    """
+    return sync_app.collect_verified(tokens, [result for result, _ in await verify_each(tokens, trusted)])
+
+async def verify_each(tokens, trusted=False):
+    """
+    Returns [(response dictionary, status code)] per token, like app.verify_token
+    - The revocation checks of every token share one pipelined round trip
+    """
+    decoded = [sync_app.decode_token(token, trusted) for token in tokens]
+    jtis = [user_info.get("jti") if user_info else None for user_info, _ in decoded]
+    revoked = await sync_app.revocation_list.are_revoked_async(jtis, session_store.client)
+    return [error or sync_app.verified_response(user_info, is_revoked) for (user_info, error), is_revoked in zip(decoded, revoked)]
+
+async def revoke_tokens(tokens):
+    """
+    Async version of app.revoke_tokens, the publish and the revocations are sent concurrently
+    """
+    keys, revocations = sync_app.drop_revoked_tokens(tokens)
+    await asyncio.gather(
+        *([sync_app.invalidation_bus.publish_async("tokens", keys, session_store.client)] if keys else []),
+        *(sync_app.revocation_list.revoke_async(jti, exp, session_store.client) for jti, exp in revocations)
+    )
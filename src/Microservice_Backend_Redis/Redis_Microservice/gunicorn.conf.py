@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import tempfile
+
+# -----------------------------
+# Production serving for the Redis microservice, run from this directory:
+#     gunicorn app:app
+# (gunicorn picks this file up by name). app.py is imported once in the
+# master (preload) and forked into workers, so the parsed public key is
+# shared copy-on-write and a broken app fails at startup instead of in every
+# worker. Each worker then gets its own Redis pool (redis-py resets pools
+# after a fork), verified token cache and background threads.
+# -----------------------------
+
+os.environ["DEFER_BACKGROUND_THREADS"] = "true" # app.py leaves its threads to post_fork
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ: # Workers share /metrics through snapshots here (common/metrics.py)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="redis-metrics-")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:7002")
+workers = int(os.getenv("GUNICORN_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread" # Threads overlap requests waiting on Redis, processes use the cores
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+
+# Recycle a worker after max_requests (+ jitter so they don't all restart at once)
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "1000"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30")) # Seconds before a stuck worker is killed
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30")) # Seconds to finish in-flight requests on reload/stop
+keepalive = 5
+
+
+def on_starting(server):
+    """
+    Drops metric snapshots left in PROMETHEUS_MULTIPROC_DIR by a previous run
+    """
+    from common.metrics import clear_directory
+    clear_directory(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def when_ready(server):
+    """
+    Archives the master's metrics (key loads during preload), workers count from zero after the fork
+    """
+    from common.metrics import REGISTRY, mark_process_dead
+    REGISTRY.flush()
+    mark_process_dead(os.getpid(), os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+def post_fork(server, worker):
+    """
+    Starts the forked worker's own key watcher, revocation list and invalidation bus
+    """
+    import app
+    app.start_background_threads()
+
+def post_worker_init(worker):
+    """
+    Installs the profiling signal handler once the worker has reset its signals
+    """
+    import app
+    app.install_signal_handlers()
+
+def worker_exit(server, worker):
+    """
+    Writes the worker's final metrics snapshot, child_exit then archives it
+    """
+    import app
+    app.REGISTRY.flush()
+
+def child_exit(server, worker):
+    """
+    Runs in the master: folds the exited worker's counters into the metrics archive
+    """
+    from common.metrics import mark_process_dead
+    mark_process_dead(worker.pid, os.environ["PROMETHEUS_MULTIPROC_DIR"])
@@ -0,0 +1,203 @@
+from cryptography.hazmat.primitives import serialization
+from common.jwk import algorithm_for_key, jwk_thumbprint
+from common.metrics import FAST_LATENCY_BUCKETS, REGISTRY
+from common.request_log import SampledLogger
+import os
+import threading
+import time
+import jwt
+
+# -----------------------------
+# Keeps the JWT verification keys in memory so requests never touch disk.
+# Each key is parsed once at startup and a background thread reloads them
+# when a PEM file on disk changes (key rotation). Several files can be
+# loaded at once (e.g. an RS256 and an EdDSA key while the Auth0
+# microservice moves between algorithms), tokens pick theirs by "kid".
+# A key replaced on disk keeps verifying its kid until the tokens it signed
+# have expired, like the Auth0 microservice's previous signing key.
+# -----------------------------
+
+DEFAULT_POLL_INTERVAL = 5 # Seconds between checks of the PEM files
+DEFAULT_PREVIOUS_KEY_TTL = 600 # Seconds a replaced key still verifies, the Auth0 microservice's token lifetime
+log = SampledLogger(__name__)
+
+VERIFY_SECONDS = REGISTRY.histogram("jwt_verify_duration_seconds", "JWT signature verification latency", ("algorithm",), FAST_LATENCY_BUCKETS)
+KEY_LOAD_SECONDS = REGISTRY.histogram("key_load_duration_seconds", "Time to read and parse a PEM key file", ("key",), FAST_LATENCY_BUCKETS)
+
+
+class VerificationKey:
+    """
+    A parsed public key and the algorithm it verifies
+    - kid is the RFC 7638 thumbprint of the key, the Auth0 microservice stamps it into each token header
+    - max_exp is the latest "exp" of the tokens it verified, retired_until is set once it's replaced
+    """
+    def __init__(self, public_key, path):
+        self.public_key = public_key
+        self.path = path
+        self.algorithm = algorithm_for_key(public_key)
+        jwk = jwt.algorithms.get_default_algorithms()[self.algorithm].to_jwk(public_key, as_dict=True)
+        self.kid = jwk_thumbprint(jwk)
+        self.max_exp = 0
+        self.retired_until = None
+
+    def decode(self, token):
+        with VERIFY_SECONDS.labels(algorithm=self.algorithm).time():
+            claims = jwt.decode(token, self.public_key, algorithms=[self.algorithm])
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)) and exp > self.max_exp:
+            self.max_exp = exp
+        return claims
+
+
+class PublicKeyStore:
+    """
+    Holds the public keys loaded from one or more PEM files
+     - load() reads and parses the files, done once at startup
+     - get() returns the first in-memory key with no disk I/O
+     - decode() verifies a token with the key named by its "kid"
+     - keys dropped by a reload are kept as previous keys and still verify their kid
+       for previous_key_ttl seconds, or until the latest exp they verified if that is later
+     - start_watcher() polls the files' modification times and sizes in a
+       background thread and reloads the keys when any of them changes
+     - reload_if_changed() does one such check now
+     - on_change, if set, is called after the watcher reloads a changed key
+    """
+    def __init__(self, paths, poll_interval=DEFAULT_POLL_INTERVAL, previous_key_ttl=DEFAULT_PREVIOUS_KEY_TTL):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.poll_interval = poll_interval
+        self.previous_key_ttl = previous_key_ttl
+        self.reload_count = 0
+        self._keys = []
+        self._keys_by_kid = {}
+        self._previous_by_kid = {}
+        self._file_signature = None
+        self._lock = threading.RLock() # Reentrant, held across check-and-load
+        self._watcher_pid = None
+        self.on_change = None
+        self.load()
+
+    def get(self):
+        """
+        Returns the first configured public key object
+        """
+        return self._keys[0].public_key
+
+    def keys(self):
+        """
+        Returns every loaded VerificationKey, in configured order
+        """
+        return self._keys
+
+    def decode(self, token):
+        """
+        Verifies the JWT and returns its claims, raises jwt.InvalidTokenError like jwt.decode
+        - Each key only accepts its own algorithm, the header's "alg" can't pick a weaker one
+        - Tokens without a kid try every key of the header's algorithm
+        """
+        header = jwt.get_unverified_header(token)
+        kid = header.get("kid")
+        if kid is not None:
+            key = self._keys_by_kid.get(kid) or self._previous_key(kid)
+            if key is None:
+                raise jwt.InvalidSignatureError(f"Unknown kid {kid}")
+            return key.decode(token)
+
+        candidates = [key for key in self._keys if key.algorithm == header.get("alg")]
+        for key in candidates[:-1]:
+            try:
+                return key.decode(token)
+            except jwt.InvalidSignatureError:
+                continue
+        if not candidates:
+            raise jwt.InvalidAlgorithmError(f"No key for algorithm {header.get('alg')}")
+        return candidates[-1].decode(token)
+
+    def load(self):
+        """
+        Reads and parses every PEM file, then swaps them in as the current keys
+        - Current keys missing from the new files become previous keys
+        - Raises if a file is missing, not a valid public key, or an unsupported key type,
+          leaving the keys unchanged
+        """
+        with self._lock:
+            signature = self._read_file_signature()
+            keys = []
+            for path in self.paths:
+                with KEY_LOAD_SECONDS.labels(key="public").time():
+                    with open(path, "rb") as f:
+                        keys.append(VerificationKey(serialization.load_pem_public_key(f.read()), path))
+            keys_by_kid = {key.kid: key for key in keys}
+
+            now = time.time()
+            previous = {kid: key for kid, key in self._previous_by_kid.items()
+                        if kid not in keys_by_kid and key.retired_until > now}
+            for key in self._keys:
+                if key.kid not in keys_by_kid:
+                    key.retired_until = max(now + self.previous_key_ttl, key.max_exp)
+                    previous[key.kid] = key
+            self._keys = keys
+            self._keys_by_kid = keys_by_kid
+            self._previous_by_kid = previous
+            self._file_signature = signature
+            self.reload_count += 1
+        return keys
+
+    def start_watcher(self):
+        """
+        Starts the reload thread for this process
+        - Safe to call more than once, a forked worker gets its own thread
+        """
+        if self.poll_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        thread = threading.Thread(target=self._watch, name="public-key-watcher", daemon=True)
+        thread.start()
+
+    def stats(self):
+        """
+        Returns the loaded keys as a list of dictionaries, previous keys last with the time they stop verifying
+        """
+        current = [{"path": key.path, "algorithm": key.algorithm, "kid": key.kid} for key in self._keys]
+        previous = [{"path": key.path, "algorithm": key.algorithm, "kid": key.kid, "retired_until": key.retired_until}
+                    for key in list(self._previous_by_kid.values()) if key.retired_until > time.time()]
+        return current + previous
+
+    def _watch(self):
+        """
+        Reloads the keys whenever a file changes
+        - A failed reload (file mid-write, bad PEM) keeps the previous keys
+        """
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if self.reload_if_changed() and self.on_change:
+                    self.on_change()
+            except (OSError, ValueError) as e:
+                log.warning("public_key_reload_failed", detail="keeping previous keys", error=str(e))
+
+    def reload_if_changed(self):
+        """
+        Reloads the keys if a file changed since the last load, returns True if it did
+        """
+        with self._lock: # Watcher and invalidation bus may both check
+            if self._read_file_signature() == self._file_signature:
+                return False
+            self.load()
+        log.info("public_keys_reloaded", paths=self.paths)
+        return True
+
+    def _previous_key(self, kid):
+        """
+        Returns the previous key with this kid, or None if there is none or it has retired
+        """
+        key = self._previous_by_kid.get(kid)
+        if key is None or key.retired_until <= time.time():
+            return None
+        return key
+
+    def _read_file_signature(self):
+        signature = []
+        for path in self.paths:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
@@ -0,0 +1,27 @@
+"""
+One-off migration of sessions stored under the bare user ID.
+
+Sessions from before multi-device sessions are a hash keyed by the user ID.
+The oldest ones also carry a "last_updated" field and no expiry, so Redis
+never removes them. Each one is moved to its per-device key and added to
+the user's session index with its remaining time as the TTL, so the user
+stays logged in. Sessions with no time left are deleted. Only hashes keyed
+by an Auth0 user ID in one of the two legacy formats are touched. It is
+safe to run while the microservice is serving traffic and safe to run more
+than once.
+
+Run from this directory:
+    python migrate_sessions.py
+"""
+
+from dotenv import load_dotenv
+from redis_client import create_redis_client
+from session_store import DEFAULT_TTL_SECONDS, migrate_legacy_sessions
+import os
+
+if __name__ == "__main__":
+    load_dotenv()
+    # Same connection settings as app.py (redis_client.py), which isn't imported so its key watcher doesn't start
+    client = create_redis_client(password=os.getenv("REDIS_DATABASE_PASSWORD"))
+    migrated, deleted = migrate_legacy_sessions(client, DEFAULT_TTL_SECONDS)
+    print(f"Migrated {migrated} sessions, deleted {deleted} expired sessions")
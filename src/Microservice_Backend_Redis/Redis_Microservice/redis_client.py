@@ -0,0 +1,404 @@
+from redis.backoff import ExponentialWithJitterBackoff
+from redis.cache import CacheConfig
+from redis.retry import Retry
+from redis.utils import HIREDIS_AVAILABLE
+from common.metrics import FAST_LATENCY_BUCKETS, REGISTRY
+from common.request_log import SampledLogger
+from common.tracing import TRACER
+from contextlib import nullcontext
+import os
+import threading
+import time
+import redis
+import redis.asyncio
+import redis.asyncio.cluster
+import redis.asyncio.retry
+import redis.asyncio.sentinel
+import redis.cluster
+import redis.sentinel
+
+# -----------------------------
+# Builds the Redis client for the microservice from environment variables.
+# All requests in a process share one bounded, blocking connection pool with
+# socket timeouts, TCP keepalive, periodic health checks and retries with
+# jittered exponential backoff. The pool records how long callers wait for a
+# connection so workers can be sized against Redis. The async client used by
+# asgi_app.py gets the same settings on a redis.asyncio pool.
+# With REDIS_CLIENT_CACHE=true the sync client speaks RESP3 and keeps a
+# bounded local cache of read replies, which Redis invalidates through
+# client tracking whenever any client writes one of the keys (Redis >= 7.4).
+# REDIS_MODE picks the deployment: one server ("standalone"), Redis Cluster
+# ("cluster", one instrumented pool per node) or a master found through
+# Sentinel ("sentinel", connections follow the master after a failover).
+# Every command's round trip is timed by name for /metrics, a pipeline
+# counts as one "PIPELINE" (or "MULTI") round trip.
+# -----------------------------
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+REDIS_DB = int(os.getenv("REDIS_DB", "0"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50")) # Per process
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5")) # Seconds to wait for a free connection
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2")) # Seconds per command
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "2"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30")) # Seconds idle before a PING
+REDIS_RETRY_ATTEMPTS = int(os.getenv("REDIS_RETRY_ATTEMPTS", "3"))
+REDIS_RETRY_BACKOFF_BASE = float(os.getenv("REDIS_RETRY_BACKOFF_BASE", "0.01")) # Seconds
+REDIS_RETRY_BACKOFF_CAP = float(os.getenv("REDIS_RETRY_BACKOFF_CAP", "0.5")) # Seconds
+REDIS_CLIENT_CACHE = os.getenv("REDIS_CLIENT_CACHE", "false").lower() == "true" # Sync client only
+REDIS_CLIENT_CACHE_SIZE = int(os.getenv("REDIS_CLIENT_CACHE_SIZE", "10000")) # Cached replies per process
+
+REDIS_MODE = os.getenv("REDIS_MODE", "standalone") # "standalone", "cluster" or "sentinel"
+REDIS_CLUSTER_NODES = os.getenv("REDIS_CLUSTER_NODES", f"{REDIS_HOST}:{REDIS_PORT}") # host:port,... any nodes, the rest are discovered
+REDIS_SENTINELS = os.getenv("REDIS_SENTINELS", "localhost:26379") # host:port,... of the sentinels
+REDIS_SENTINEL_SERVICE = os.getenv("REDIS_SENTINEL_SERVICE", "mymaster") # Master name the sentinels monitor
+REDIS_SENTINEL_PASSWORD = os.getenv("REDIS_SENTINEL_PASSWORD") # Only if the sentinels themselves require auth
+if REDIS_MODE not in ("standalone", "cluster", "sentinel"):
+    raise ValueError(f"REDIS_MODE must be 'standalone', 'cluster' or 'sentinel', got {REDIS_MODE!r}")
+if REDIS_MODE == "cluster" and REDIS_DB != 0:
+    raise ValueError("REDIS_MODE=cluster only has database 0, unset REDIS_DB")
+if REDIS_MODE == "cluster" and REDIS_CLIENT_CACHE:
+    raise ValueError("REDIS_CLIENT_CACHE is only supported with REDIS_MODE=standalone or sentinel")
+
+COMMAND_SECONDS = REGISTRY.histogram("redis_command_duration_seconds", "Redis round trip latency per command", ("command",), FAST_LATENCY_BUCKETS)
+COMMAND_ERRORS = REGISTRY.counter("redis_command_errors_total", "Redis commands that raised after retries", ("command",))
+log = SampledLogger(__name__)
+
+
+class PoolStatsMixin:
+    """
+    Saturation counters shared by the sync and async instrumented pools
+     - stats() reports connections in use, the high-water mark, wait times and timeouts
+    """
+    def _init_stats(self):
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._max_in_use = 0
+        self._acquired = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+        self._timeouts = 0
+
+    def _record_acquired(self, waited):
+        with self._stats_lock:
+            self._in_use += 1
+            self._max_in_use = max(self._max_in_use, self._in_use)
+            self._acquired += 1
+            self._wait_seconds_total += waited
+            self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+    def _record_released(self):
+        with self._stats_lock:
+            self._in_use = max(0, self._in_use - 1)
+
+    def _record_timeout(self):
+        with self._stats_lock:
+            self._timeouts += 1
+
+    def stats(self):
+        """
+        Returns pool metrics as a dictionary, wait times in milliseconds
+        """
+        with self._stats_lock:
+            return {
+                "max_connections": self.max_connections,
+                "in_use": self._in_use,
+                "max_in_use": self._max_in_use,
+                "saturation": self._in_use / self.max_connections,
+                "acquired": self._acquired,
+                "wait_avg_ms": (self._wait_seconds_total / self._acquired * 1000) if self._acquired else 0.0,
+                "wait_max_ms": self._wait_seconds_max * 1000,
+                "pool_timeouts": self._timeouts,
+                "parser": "hiredis" if HIREDIS_AVAILABLE else "python",
+            }
+
+
+class InstrumentedConnectionPool(PoolStatsMixin, redis.BlockingConnectionPool):
+    """
+    BlockingConnectionPool that tracks saturation
+     - Callers block up to `timeout` seconds when every connection is checked out
+     - Fork-safe: redis-py resets the pool in a forked worker, which also starts its stats over
+    """
+    def reset(self):
+        super().reset()
+        self._init_stats()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self._record_timeout()
+            raise
+        self._record_acquired(time.perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        self._record_released()
+
+
+class AsyncInstrumentedConnectionPool(PoolStatsMixin, redis.asyncio.BlockingConnectionPool):
+    """
+    redis.asyncio BlockingConnectionPool that tracks saturation
+     - Callers await up to `timeout` seconds when every connection is checked out
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._init_stats()
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self._record_timeout()
+            raise
+        self._record_acquired(time.perf_counter() - start)
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        self._record_released()
+
+
+class InstrumentedSentinelConnectionPool(redis.sentinel.SentinelConnectionPool, InstrumentedConnectionPool):
+    """
+    InstrumentedConnectionPool that connects to whichever node the sentinels report as master
+     - After a failover idle connections are dropped and new ones go to the new master
+    """
+
+
+class AsyncInstrumentedSentinelConnectionPool(redis.asyncio.sentinel.SentinelConnectionPool, AsyncInstrumentedConnectionPool):
+    """
+    AsyncInstrumentedConnectionPool that connects to whichever node the sentinels report as master
+    """
+
+
+class TimedCommandsMixin:
+    """
+    Times execute_command() and pipeline execute() into COMMAND_SECONDS
+    - Inside a traced request each command (or whole pipeline) is also a client span
+    """
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with _command_span(_command_name(args)):
+                return super().execute_command(*args, **options)
+        except redis.RedisError:
+            COMMAND_ERRORS.labels(command=_command_name(args)).inc()
+            raise
+        finally:
+            COMMAND_SECONDS.labels(command=_command_name(args)).observe(time.perf_counter() - start)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        name = _pipeline_name(args, kwargs, self.transaction_by_default)
+        execute = pipe.execute
+
+        def timed_execute(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with _command_span(name):
+                    return execute(*args, **kwargs)
+            except redis.RedisError:
+                COMMAND_ERRORS.labels(command=name).inc()
+                raise
+            finally:
+                COMMAND_SECONDS.labels(command=name).observe(time.perf_counter() - start)
+
+        pipe.execute = timed_execute
+        return pipe
+
+
+class AsyncTimedCommandsMixin:
+    """
+    TimedCommandsMixin for the redis.asyncio clients
+    """
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with _command_span(_command_name(args)):
+                return await super().execute_command(*args, **options)
+        except redis.RedisError:
+            COMMAND_ERRORS.labels(command=_command_name(args)).inc()
+            raise
+        finally:
+            COMMAND_SECONDS.labels(command=_command_name(args)).observe(time.perf_counter() - start)
+
+    def pipeline(self, *args, **kwargs):
+        pipe = super().pipeline(*args, **kwargs)
+        name = _pipeline_name(args, kwargs, self.transaction_by_default)
+        execute = pipe.execute
+
+        async def timed_execute(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with _command_span(name):
+                    return await execute(*args, **kwargs)
+            except redis.RedisError:
+                COMMAND_ERRORS.labels(command=name).inc()
+                raise
+            finally:
+                COMMAND_SECONDS.labels(command=name).observe(time.perf_counter() - start)
+
+        pipe.execute = timed_execute
+        return pipe
+
+
+class TimedRedis(TimedCommandsMixin, redis.Redis):
+    transaction_by_default = True # pipeline() wraps in MULTI/EXEC unless transaction=False
+
+class TimedRedisCluster(TimedCommandsMixin, redis.cluster.RedisCluster):
+    transaction_by_default = False
+
+class AsyncTimedRedis(AsyncTimedCommandsMixin, redis.asyncio.Redis):
+    transaction_by_default = True
+
+class AsyncTimedRedisCluster(AsyncTimedCommandsMixin, redis.asyncio.cluster.RedisCluster):
+    transaction_by_default = False
+
+
+def _command_name(args):
+    return str(args[0]).upper() if args else "UNKNOWN"
+
+def _pipeline_name(args, kwargs, transaction_by_default):
+    transaction = kwargs.get("transaction", args[0] if args else transaction_by_default)
+    return "MULTI" if transaction else "PIPELINE"
+
+def _command_span(name):
+    """
+    A span for one command, only under a request's span so background threads
+    (pub/sub, revocation rebuilds) don't start traces of their own
+    """
+    if TRACER.current_span() is None:
+        return nullcontext()
+    return TRACER.span(f"redis {name}", "client", **{"db.system": "redis", "db.operation": name})
+
+def parse_addresses(value):
+    """
+    "host:port,host:port" -> [(host, port)]
+    """
+    addresses = []
+    for item in value.split(","):
+        if item.strip():
+            host, port = item.strip().rsplit(":", 1)
+            addresses.append((host, int(port)))
+    return addresses
+
+def pool_settings(password=None):
+    """
+    Connection pool keyword arguments shared by the sync and async clients
+    """
+    return {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "db": REDIS_DB,
+        "password": password,
+        "decode_responses": True,
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "timeout": REDIS_POOL_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+def node_settings(settings):
+    """
+    pool_settings() without the address, for clients that find their nodes themselves
+    """
+    return {name: value for name, value in settings.items() if name not in ("host", "port", "db")}
+
+def sentinel_manager(sentinel_class):
+    return sentinel_class(
+        parse_addresses(REDIS_SENTINELS),
+        sentinel_kwargs={
+            "password": REDIS_SENTINEL_PASSWORD,
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_SOCKET_CONNECT_TIMEOUT,
+        }
+    )
+
+def retry_backoff():
+    return ExponentialWithJitterBackoff(cap=REDIS_RETRY_BACKOFF_CAP, base=REDIS_RETRY_BACKOFF_BASE)
+
+def pool_stats(client):
+    """
+    Returns the client's pool metrics, a cluster client reports {node: metrics}
+    - redis.asyncio cluster nodes keep their own connection lists, only their names are reported
+    """
+    if isinstance(client, redis.cluster.RedisCluster):
+        return {
+            node.name: node.redis_connection.connection_pool.stats()
+            for node in client.get_nodes() if node.redis_connection is not None
+        }
+    if isinstance(client, redis.asyncio.cluster.RedisCluster):
+        return {node.name: {} for node in client.get_nodes()}
+    return client.connection_pool.stats()
+
+def create_redis_client(password=None):
+    """
+    Returns a redis.Redis that uses the configured InstrumentedConnectionPool
+    - Responses are decoded to str
+    - Logs a warning if the hiredis parser isn't installed
+    - With REDIS_CLIENT_CACHE on, uses RESP3 client-side caching, get_cache() returns the cache
+    - REDIS_MODE=cluster returns a redis.cluster.RedisCluster, sentinel a redis.Redis bound to the master
+    """
+    if not HIREDIS_AVAILABLE:
+        log.warning("hiredis_missing", detail="Redis replies use the pure Python parser")
+
+    settings = pool_settings(password)
+    if REDIS_CLIENT_CACHE:
+        settings["protocol"] = 3
+        settings["cache_config"] = CacheConfig(max_size=REDIS_CLIENT_CACHE_SIZE)
+    retry = Retry(retry_backoff(), REDIS_RETRY_ATTEMPTS)
+    if REDIS_MODE == "cluster":
+        # redis-py only builds node pools with connection_pool_class when given a url,
+        # so the first node goes in as the url and the rest as extra startup nodes
+        (host, port), *others = parse_addresses(REDIS_CLUSTER_NODES)
+        return TimedRedisCluster(
+            url=f"redis://{host}:{port}",
+            startup_nodes=[redis.cluster.ClusterNode(host, port) for host, port in others],
+            connection_pool_class=InstrumentedConnectionPool,
+            retry=retry,
+            **node_settings(settings)
+        )
+    if REDIS_MODE == "sentinel":
+        return sentinel_manager(redis.sentinel.Sentinel).master_for(
+            REDIS_SENTINEL_SERVICE,
+            redis_class=TimedRedis,
+            connection_pool_class=InstrumentedSentinelConnectionPool,
+            retry=retry,
+            db=REDIS_DB,
+            **node_settings(settings)
+        )
+    pool = InstrumentedConnectionPool(retry=retry, **settings)
+    return TimedRedis(connection_pool=pool)
+
+def create_async_redis_client(password=None):
+    """
+    Returns a redis.asyncio.Redis with the same settings as create_redis_client()
+    - Must be created inside the event loop that will use it
+    """
+    settings = pool_settings(password)
+    retry = redis.asyncio.retry.Retry(retry_backoff(), REDIS_RETRY_ATTEMPTS)
+    if REDIS_MODE == "cluster":
+        settings = node_settings(settings)
+        del settings["timeout"] # Cluster nodes fail fast instead of waiting for a free connection
+        return AsyncTimedRedisCluster(
+            startup_nodes=[redis.asyncio.cluster.ClusterNode(host, port) for host, port in parse_addresses(REDIS_CLUSTER_NODES)],
+            retry=retry,
+            **settings
+        )
+    if REDIS_MODE == "sentinel":
+        return sentinel_manager(redis.asyncio.sentinel.Sentinel).master_for(
+            REDIS_SENTINEL_SERVICE,
+            redis_class=AsyncTimedRedis,
+            connection_pool_class=AsyncInstrumentedSentinelConnectionPool,
+            retry=retry,
+            db=REDIS_DB,
+            **node_settings(settings)
+        )
+    pool = AsyncInstrumentedConnectionPool(retry=retry, **settings)
+    return AsyncTimedRedis(connection_pool=pool)
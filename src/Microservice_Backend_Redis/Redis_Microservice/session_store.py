@@ -0,0 +1,469 @@
+from redis.asyncio.cluster import RedisCluster as AsyncRedisCluster
+from redis.cache import CacheEntryStatus, CacheKey
+import datetime
+import hashlib
+import threading
+import time
+
+import jwt
+
+# -----------------------------
+# Session reads and writes against Redis.
+# Every device a user logs in from gets its own session, keyed by the JWT's
+# "jti" claim, and each user has a sorted set index of their session IDs
+# scored by expiry, so listing or revoking a device never scans the keyspace.
+# Sessions expire through Redis' own key TTL (sliding expiration): every
+# refresh pushes the TTL out again and Redis deletes dead sessions itself,
+# so each operation is a single round trip and the keyspace can't grow
+# without bound.
+# The user ID sits in braces (a hash tag) so all of a user's keys share a
+# Redis Cluster slot and can be written in one MULTI/EXEC.
+# With a refresh_interval, refresh() first reads the session's expiry from
+# the index (ZSCORE) and skips the write if the session was refreshed less
+# than refresh_interval ago. On a client with RESP3 client-side caching that
+# read is answered locally until some client changes the index, so most
+# page views cost no round trip at all.
+# -----------------------------
+
+DEFAULT_TTL_SECONDS = 30 * 60 # Seconds of inactivity until a session expires
+MIGRATION_BATCH_SIZE = 500 # Keys per SCAN/pipeline batch when migrating
+LEGACY_KEY_PATTERN = "*|*" # Legacy sessions are keyed by the bare Auth0 user ID ("provider|id")
+REVOKE_BATCH_SIZE = 500 # Keys per SCAN/pipeline batch when revoking every session
+SESSION_PREFIX = "session:" # session:{user_id}:session_id -> hash {"JWT": token}
+INDEX_PREFIX = "sessions:" # sessions:{user_id} -> sorted set of session_id scored by expiry (ms)
+OWNED_KEY_PATTERNS = (f"{SESSION_PREFIX}*", f"{INDEX_PREFIX}*") # The only keys revoke_all may delete, never a bare "session*"
+
+
+def session_key(user_id, session_id):
+    return f"{SESSION_PREFIX}{{{user_id}}}:{session_id}"
+
+def index_key(user_id):
+    return f"{INDEX_PREFIX}{{{user_id}}}"
+
+def session_id_for(claims, token):
+    """
+    A session's ID is the JWT's "jti", tokens minted before jti existed use a hash of the token
+    """
+    return claims.get("jti") or hashlib.sha256(token.encode()).hexdigest()[:32]
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class SessionStore:
+    """
+    Stores one session per (user, device) as a Redis hash {"JWT": token} with
+    a TTL, plus a per-user index sorted set scored by expiry
+     - create() writes or overwrites a session, trims the user's expired index entries
+     - refresh() pushes one session's TTL out, False if the session is gone
+     - delete() removes one session (one device), delete_user() all of a user's sessions
+     - list() returns a user's live sessions from the index, O(log n + m)
+     - tokens() reads the JWTs stored in sessions, e.g. to revoke them
+     - *_many() do the same for many sessions or users in one pipelined round trip
+     - revoke_all() deletes every session with SCAN, never KEYS
+     - stats() reports how many refreshes were skipped and answered from the client-side cache
+    """
+    def __init__(self, client, ttl_seconds, refresh_interval=0):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.refresh_interval_ms = int(refresh_interval * 1000) # 0: every refresh writes
+        self._cache = client.get_cache() if refresh_interval else None # Client-side cache, if on
+        self._stats_lock = threading.Lock()
+        self._index_reads = 0
+        self._local_hits = 0
+        self._skipped = 0
+        self._written = 0
+
+    def create(self, user_id, session_id, token):
+        """
+        Creates or replaces a session in one MULTI/EXEC round trip
+        """
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_create(pipe, user_id, session_id, token, _now_ms())
+        pipe.execute()
+
+    def refresh(self, user_id, session_id):
+        """
+        Refreshes a session, returns False if it is missing or expired
+        - PEXPIRE replies 0 when the key doesn't exist, which is how Redis
+          reports a session that already timed out
+        - With a refresh_interval, a session refreshed less than refresh_interval
+          ago is only read (ZSCORE), its TTL is left as it is
+        """
+        if self.refresh_interval_ms and self._recently_refreshed(user_id, session_id):
+            with self._stats_lock:
+                self._skipped += 1
+            return True
+        with self._stats_lock:
+            self._written += 1
+        return self.refresh_many([(user_id, session_id)])[0]
+
+    def delete(self, user_id, session_id):
+        """
+        Deletes one session (logs out one device), returns False if there was none
+        """
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(session_key(user_id, session_id))
+        pipe.zrem(index_key(user_id), session_id)
+        return pipe.execute()[0] == 1
+
+    def delete_user(self, user_id):
+        """
+        Deletes all of a user's sessions (logs out every device), returns how many there were
+        """
+        return self.delete_users([user_id])[0]
+
+    def list(self, user_id):
+        """
+        Returns [(session_id, seconds left)] for the user's live sessions, soonest to expire first
+        """
+        return self.list_many([user_id])[0]
+
+    def create_many(self, sessions):
+        """
+        Creates or replaces sessions for a list of (user_id, session_id, token)
+        """
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id, session_id, token in sessions:
+            self._queue_create(pipe, user_id, session_id, token, now)
+        pipe.execute()
+
+    def refresh_many(self, sessions):
+        """
+        Refreshes a list of (user_id, session_id), returns a list of booleans in the same order
+        - Sessions found expired are dropped from their user's index with one more round trip
+        """
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id, session_id in sessions:
+            self._queue_refresh(pipe, user_id, session_id, now)
+        alive = [reply == 1 for reply in pipe.execute()[0::3]]
+        gone = [session for session, ok in zip(sessions, alive) if not ok]
+        if gone:
+            self._queue_forget(self.client.pipeline(transaction=False), gone).execute()
+        return alive
+
+    def delete_users(self, user_ids):
+        """
+        Deletes every session of many users, returns how many each user had
+        - Two round trips: read the indexes, then delete sessions and indexes
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrange(index_key(user_id), 0, -1)
+        session_ids = pipe.execute()
+        pipe = self._queue_delete_users(self.client.pipeline(transaction=False), user_ids, session_ids)
+        return _count_deleted(pipe.execute(), session_ids)
+
+    def list_many(self, user_ids):
+        """
+        Returns each user's live sessions as [(session_id, seconds left)]
+        """
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id in user_ids:
+            pipe.zrangebyscore(index_key(user_id), now, "+inf", withscores=True)
+        return [_with_seconds_left(entries, now) for entries in pipe.execute()]
+
+    def tokens(self, sessions):
+        """
+        Returns the JWT stored in each (user_id, session_id), None for missing sessions
+        """
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, session_id in sessions:
+            pipe.hget(session_key(user_id, session_id), "JWT")
+        return pipe.execute()
+
+    def revoke_all(self, batch_size=REVOKE_BATCH_SIZE):
+        """
+        Deletes every session and index, returns how many sessions were deleted
+        - SCANs the session: and sessions: namespaces in batches so Redis is never blocked,
+          safe while the service is live, other keys sharing the Redis are left alone
+        """
+        deleted = 0
+        batch = []
+        for pattern in OWNED_KEY_PATTERNS:
+            for key in self.client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self._revoke_batch(batch)
+                    batch = []
+        if batch:
+            deleted += self._revoke_batch(batch)
+        return deleted
+
+    def stats(self):
+        """
+        Returns refresh metrics as a dictionary
+        - local_hits: index reads answered from the client-side cache without a round trip
+        """
+        with self._stats_lock:
+            return {
+                "refresh_interval": self.refresh_interval_ms / 1000,
+                "client_cache": self._cache is not None,
+                "client_cache_entries": self._cache.size if self._cache is not None else 0,
+                "refreshes_skipped": self._skipped,
+                "refreshes_written": self._written,
+                "index_reads": self._index_reads,
+                "local_hits": self._local_hits,
+                "hit_rate": self._local_hits / self._index_reads if self._index_reads else 0.0,
+            }
+
+    def _recently_refreshed(self, user_id, session_id):
+        """
+        True if the session is alive and was refreshed less than refresh_interval ago
+        - Its index score is the expiry the last refresh set, a missing score
+          (logged out, expired, or never indexed) always goes on to a real refresh
+        """
+        index = index_key(user_id)
+        local = self._is_cached("ZSCORE", index, session_id)
+        expires_at = self.client.zscore(index, session_id)
+        with self._stats_lock:
+            self._index_reads += 1
+            self._local_hits += local
+        return expires_at is not None and expires_at - _now_ms() > self.ttl_ms - self.refresh_interval_ms
+
+    def _is_cached(self, command, key, *args):
+        """
+        True if the client-side cache holds a valid reply for this read (metrics only)
+        - Looks at the cache's dict directly so the LRU order isn't touched
+        """
+        if self._cache is None:
+            return False
+        entry = self._cache.collection.get(CacheKey(command=command, redis_keys=(key,), redis_args=(command, key, *args)))
+        return entry is not None and entry.status == CacheEntryStatus.VALID
+
+    def _revoke_batch(self, keys):
+        self.client.unlink(*keys)
+        return _count_sessions(keys)
+
+    def _queue_create(self, pipe, user_id, session_id, token, now, ttl_ms=None):
+        """
+        ttl_ms overrides the session's TTL (a migrated session keeps its remaining time)
+        """
+        ttl_ms = ttl_ms or self.ttl_ms
+        key = session_key(user_id, session_id)
+        index = index_key(user_id)
+        pipe.hset(key, mapping={"JWT": token})
+        pipe.pexpire(key, ttl_ms)
+        pipe.zremrangebyscore(index, "-inf", now) # Trim sessions that already expired
+        pipe.zadd(index, {session_id: now + ttl_ms})
+        pipe.pexpire(index, self.ttl_ms) # No session outlives the newest write
+
+    def _queue_refresh(self, pipe, user_id, session_id, now):
+        """
+        Three commands per session, the first (PEXPIRE on the session) says if it is alive
+        """
+        index = index_key(user_id)
+        pipe.pexpire(session_key(user_id, session_id), self.ttl_ms)
+        pipe.zadd(index, {session_id: now + self.ttl_ms}, xx=True)
+        pipe.pexpire(index, self.ttl_ms)
+
+    def _queue_delete_users(self, pipe, user_ids, session_ids):
+        """
+        One DEL per key: Redis Cluster pipelines refuse multi-key DEL even within one slot
+        """
+        for user_id, ids in zip(user_ids, session_ids):
+            pipe.delete(index_key(user_id))
+            for session_id in ids:
+                pipe.delete(session_key(user_id, session_id))
+        return pipe
+
+    def _queue_forget(self, pipe, sessions):
+        for user_id, session_id in sessions:
+            pipe.zrem(index_key(user_id), session_id)
+        return pipe
+
+
+class AsyncSessionStore(SessionStore):
+    """
+    SessionStore for a redis.asyncio client, same data model and commands, awaitable methods
+     - On a cluster client, create() and delete() send plain pipelines instead of MULTI/EXEC:
+       redis.asyncio queues cluster transactions through asyncio.run() on a helper thread,
+       which leaves connections bound to the wrong event loop
+    """
+    def __init__(self, client, ttl_seconds, refresh_interval=0):
+        super().__init__(client, ttl_seconds, refresh_interval)
+        self.transaction = not isinstance(client, AsyncRedisCluster)
+
+    async def create(self, user_id, session_id, token):
+        pipe = self.client.pipeline(transaction=self.transaction)
+        self._queue_create(pipe, user_id, session_id, token, _now_ms())
+        await pipe.execute()
+
+    async def refresh(self, user_id, session_id):
+        return (await self.refresh_many([(user_id, session_id)]))[0]
+
+    async def delete(self, user_id, session_id):
+        pipe = self.client.pipeline(transaction=self.transaction)
+        pipe.delete(session_key(user_id, session_id))
+        pipe.zrem(index_key(user_id), session_id)
+        return (await pipe.execute())[0] == 1
+
+    async def delete_user(self, user_id):
+        return (await self.delete_users([user_id]))[0]
+
+    async def list(self, user_id):
+        return (await self.list_many([user_id]))[0]
+
+    async def create_many(self, sessions):
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id, session_id, token in sessions:
+            self._queue_create(pipe, user_id, session_id, token, now)
+        await pipe.execute()
+
+    async def refresh_many(self, sessions):
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id, session_id in sessions:
+            self._queue_refresh(pipe, user_id, session_id, now)
+        alive = [reply == 1 for reply in (await pipe.execute())[0::3]]
+        gone = [session for session, ok in zip(sessions, alive) if not ok]
+        if gone:
+            await self._queue_forget(self.client.pipeline(transaction=False), gone).execute()
+        return alive
+
+    async def delete_users(self, user_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.zrange(index_key(user_id), 0, -1)
+        session_ids = await pipe.execute()
+        pipe = self._queue_delete_users(self.client.pipeline(transaction=False), user_ids, session_ids)
+        return _count_deleted(await pipe.execute(), session_ids)
+
+    async def list_many(self, user_ids):
+        pipe = self.client.pipeline(transaction=False)
+        now = _now_ms()
+        for user_id in user_ids:
+            pipe.zrangebyscore(index_key(user_id), now, "+inf", withscores=True)
+        return [_with_seconds_left(entries, now) for entries in await pipe.execute()]
+
+    async def tokens(self, sessions):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id, session_id in sessions:
+            pipe.hget(session_key(user_id, session_id), "JWT")
+        return await pipe.execute()
+
+    async def revoke_all(self, batch_size=REVOKE_BATCH_SIZE):
+        deleted = 0
+        batch = []
+        for pattern in OWNED_KEY_PATTERNS:
+            async for key in self.client.scan_iter(match=pattern, count=batch_size):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += await self._revoke_batch(batch)
+                    batch = []
+        if batch:
+            deleted += await self._revoke_batch(batch)
+        return deleted
+
+    async def _revoke_batch(self, keys):
+        await self.client.unlink(*keys)
+        return _count_sessions(keys)
+
+
+def _with_seconds_left(entries, now):
+    return [(session_id, (expires_at - now) / 1000) for session_id, expires_at in entries]
+
+def _count_deleted(replies, session_ids):
+    """
+    Splits the DEL replies queued by _queue_delete_users() into sessions deleted per user
+    """
+    counts = []
+    position = 0
+    for ids in session_ids:
+        counts.append(sum(replies[position + 1:position + 1 + len(ids)])) # Skip the index key's reply
+        position += 1 + len(ids)
+    return counts
+
+def _count_sessions(keys):
+    return sum(1 for key in keys if key.startswith(SESSION_PREFIX))
+
+def migrate_legacy_sessions(client, ttl_seconds, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Moves sessions stored under the bare user ID into the per-device layout
+    (session:{user_id}:session_id plus the user's sessions:{user_id} index)
+    - Two legacy formats are converted, anything else is left alone:
+        - {"JWT", "last_updated"} with no TTL (before Redis TTLs), its time
+          left is ttl_seconds minus the time since "last_updated"
+        - {"JWT"} with a TTL (before multi-device sessions), its time left is the TTL
+    - Only hashes keyed like an Auth0 user ID (LEGACY_KEY_PATTERN) are SCANned,
+      keys in the session: and sessions: namespaces are skipped
+    - The session ID comes from the token like on /create_session, so the
+      user stays logged in on that device
+    - Sessions with no time left (or an unreadable timestamp) are deleted
+    - Uses SCAN so Redis is never blocked, safe to run while the service is live
+      and more than once
+    - Returns (migrated, deleted) counts
+    """
+    store = SessionStore(client, ttl_seconds)
+    migrated = 0
+    deleted = 0
+    batch = []
+    for key in client.scan_iter(match=LEGACY_KEY_PATTERN, count=batch_size, _type="HASH"):
+        if key.startswith((SESSION_PREFIX, INDEX_PREFIX)):
+            continue
+        batch.append(key)
+        if len(batch) >= batch_size:
+            counts = _migrate_batch(store, batch)
+            migrated, deleted = migrated + counts[0], deleted + counts[1]
+            batch = []
+    if batch:
+        counts = _migrate_batch(store, batch)
+        migrated, deleted = migrated + counts[0], deleted + counts[1]
+    return migrated, deleted
+
+def _migrate_batch(store, keys):
+    """
+    Migrates one batch of keys with two pipelined round trips
+    """
+    pipe = store.client.pipeline(transaction=False)
+    for key in keys:
+        pipe.pttl(key)
+        pipe.hgetall(key)
+    replies = pipe.execute()
+
+    now = _now_ms()
+    migrated = 0
+    deleted = 0
+    pipe = store.client.pipeline(transaction=False)
+    for key, pttl, fields in zip(keys, replies[0::2], replies[1::2]):
+        remaining_ms = _legacy_remaining_ms(pttl, fields, store.ttl_seconds)
+        if remaining_ms is None:
+            continue # Not a legacy session
+        pipe.delete(key)
+        if remaining_ms <= 0:
+            deleted += 1
+            continue
+        token = fields["JWT"]
+        store._queue_create(pipe, key, session_id_for(_unverified_claims(token), token), token, now, remaining_ms)
+        migrated += 1
+    pipe.execute()
+    return migrated, deleted
+
+def _legacy_remaining_ms(pttl, fields, ttl_seconds):
+    """
+    Milliseconds a legacy session has left, None if the hash isn't a legacy session
+    """
+    if pttl == -1 and set(fields) == {"JWT", "last_updated"}:
+        try:
+            last_updated = datetime.datetime.fromisoformat(fields["last_updated"])
+        except ValueError:
+            return 0
+        elapsed = (datetime.datetime.now() - last_updated).total_seconds()
+        return int((ttl_seconds - elapsed) * 1000)
+    if pttl > 0 and set(fields) == {"JWT"}:
+        return pttl
+    return None
+
+def _unverified_claims(token):
+    """
+    The token's claims without checking its signature, only used to name its session
+    """
+    try:
+        return jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return {}
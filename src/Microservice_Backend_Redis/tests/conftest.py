@@ -0,0 +1,74 @@
+import datetime
+import os
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+import fakeredis
+import jwt
+import pytest
+
+# The service's modules are imported by name, as app.py does
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", "Redis_Microservice"))
+
+INTERNAL_AUTH_SECRET = "test-internal-secret"
+SIGNING_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def redis_server():
+    """
+    A fresh in-memory Redis (fakeredis) per test
+    """
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def redis_client(redis_server):
+    return fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+
+@pytest.fixture
+def async_redis_client(redis_server):
+    """
+    redis.asyncio client on the same server as redis_client
+    """
+    return fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True)
+
+@pytest.fixture(scope="session")
+def redis_service():
+    """
+    The Redis microservice's app.py, imported once against SIGNING_KEY's public key
+    """
+    key_dir = tempfile.mkdtemp()
+    public_key_path = os.path.join(key_dir, "public.pem")
+    with open(public_key_path, "wb") as f:
+        f.write(SIGNING_KEY.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+    os.environ["PUBLIC_KEY_PATH"] = public_key_path
+    os.environ["PUBLIC_KEY_POLL_INTERVAL"] = "0"
+    os.environ["INTERNAL_AUTH_SECRET"] = INTERNAL_AUTH_SECRET
+    import app
+    return app
+
+@pytest.fixture
+def service(redis_service, redis_client, monkeypatch):
+    """
+    redis_service with its session store, revocation list and invalidation bus on redis_client
+    """
+    from common.invalidation import InvalidationBus
+    from common.revocation import RevocationList
+    from session_store import SessionStore
+    monkeypatch.setattr(redis_service, "session_store", SessionStore(redis_client, redis_service.TIME_UNTIL_EXPIRED))
+    revocation_list = RevocationList(redis_client)
+    revocation_list.rebuild()
+    monkeypatch.setattr(redis_service, "revocation_list", revocation_list)
+    monkeypatch.setattr(redis_service, "invalidation_bus", InvalidationBus(redis_client))
+    redis_service.verified_token_cache.clear()
+    return redis_service
+
+def make_token(user_id, expires_minutes=10, jti="laptop", **claims):
+    """
+    A JWT for user_id signed like the Auth0 microservice's, jti names the device's session
+    """
+    payload = {"sub": user_id, "jti": jti, "exp": datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=expires_minutes), **claims}
+    return jwt.encode(payload, SIGNING_KEY, algorithm="RS256")
@@ -0,0 +1,117 @@
+"""
+Bulk routes (/create_sessions, /update_sessions, /delete_sessions,
+/lookup_sessions) and parse_batch(), run through the Flask test client
+against an in-memory Redis.
+"""
+
+import json
+
+import pytest
+
+from common.internal_auth import sign_request
+from conftest import INTERNAL_AUTH_SECRET, make_token
+from session_store import session_key
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+def post(client, path, body, signed=False):
+    data = json.dumps(body)
+    headers = sign_request(INTERNAL_AUTH_SECRET, path, data) if signed else {}
+    return client.post(path, data=data, headers=headers, content_type="application/json")
+
+@pytest.mark.parametrize("body", [
+    None,
+    [],
+    {},
+    {"tokens": "a single token"},
+    {"tokens": []},
+    {"tokens": ["ok", 42]},
+])
+def test_parse_batch_rejects_malformed_bodies(redis_service, body):
+    items, error = redis_service.parse_batch(body, "tokens")
+
+    assert items is None
+    assert error == {"success": False, "error": "Body must contain a non-empty 'tokens' list of strings"}
+
+def test_parse_batch_enforces_max_batch_sessions(redis_service, monkeypatch):
+    monkeypatch.setattr(redis_service, "MAX_BATCH_SESSIONS", 2)
+
+    assert redis_service.parse_batch({"user_ids": ["a", "b"]}, "user_ids") == (["a", "b"], None)
+    items, error = redis_service.parse_batch({"user_ids": ["a", "b", "c"]}, "user_ids")
+    assert items is None
+    assert error["error"] == "At most 2 user_ids per request"
+
+def test_create_sessions_reports_each_token_in_order(client, redis_client):
+    tokens = [make_token("auth0|a"), "not-a-jwt", make_token("auth0|b")]
+
+    res = post(client, "/create_sessions", {"tokens": tokens})
+
+    assert res.status_code == 200
+    assert res.get_json()["results"] == [
+        {"success": True, "user_id": "auth0|a"},
+        {"success": False, "error": "Invalid JWT"},
+        {"success": True, "user_id": "auth0|b"},
+    ]
+    assert redis_client.hget(session_key("auth0|a", "laptop"), "JWT") == tokens[0]
+    assert redis_client.hget(session_key("auth0|b", "laptop"), "JWT") == tokens[2]
+
+def test_create_sessions_rejects_a_malformed_body(client):
+    res = post(client, "/create_sessions", {"tokens": []})
+
+    assert res.status_code == 400
+
+def test_update_sessions_reports_expired_sessions(client, service):
+    active, logged_out = make_token("auth0|active"), make_token("auth0|gone")
+    service.session_store.create("auth0|active", "laptop", active)
+
+    res = post(client, "/update_sessions", {"tokens": [active, logged_out, make_token("auth0|old", expires_minutes=-1)]})
+
+    assert res.get_json()["results"] == [
+        {"success": True, "user_id": "auth0|active"},
+        {"success": False, "error": "Session expired"},
+        {"success": False, "error": "JWT expired"},
+    ]
+
+def test_admin_routes_require_a_signature(client, service):
+    service.session_store.create("auth0|a", "laptop", "token")
+
+    for path in ("/delete_sessions", "/lookup_sessions"):
+        res = post(client, path, {"user_ids": ["auth0|a"]})
+        assert res.status_code == 403
+    assert service.session_store.list("auth0|a") != []
+
+def test_delete_sessions_by_user_id_logs_out_every_device(client, service, redis_client):
+    service.session_store.create_many([("auth0|a", "laptop", "token-a"), ("auth0|a", "phone", "token-b")])
+
+    res = post(client, "/delete_sessions", {"user_ids": ["auth0|a", "auth0|b"]}, signed=True)
+
+    assert res.get_json()["results"] == [
+        {"user_id": "auth0|a", "deleted": 2},
+        {"user_id": "auth0|b", "deleted": 0},
+    ]
+    assert redis_client.keys() == []
+
+def test_delete_all_sessions_keeps_other_keys(client, service, redis_client):
+    service.session_store.create_many([("auth0|a", "laptop", "token-a"), ("google-oauth2|b", "laptop", "token-b")])
+    redis_client.hset("sessionfoo", mapping={"JWT": "not a session"})
+    redis_client.hset("auth0|profile", mapping={"name": "User"})
+
+    res = post(client, "/delete_sessions", {"all": True}, signed=True)
+
+    assert res.get_json() == {"success": True, "deleted": 2}
+    assert sorted(redis_client.keys()) == ["auth0|profile", "sessionfoo"]
+
+def test_lookup_sessions(client, service):
+    service.session_store.create("auth0|a", "laptop", "token")
+
+    res = post(client, "/lookup_sessions", {"user_ids": ["auth0|a", "auth0|b"]}, signed=True)
+
+    active, missing = res.get_json()["results"]
+    assert active["user_id"] == "auth0|a" and active["active"]
+    [session] = active["sessions"]
+    assert session["session_id"] == "laptop"
+    assert 0 < session["ttl_seconds"] <= service.TIME_UNTIL_EXPIRED
+    assert missing == {"user_id": "auth0|b", "active": False, "sessions": []}
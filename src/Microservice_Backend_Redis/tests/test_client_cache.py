@@ -0,0 +1,208 @@
+"""
+Client-side caching of session refreshes (REDIS_CLIENT_CACHE).
+
+With a refresh interval, SessionStore.refresh() answers a recently refreshed
+session with a ZSCORE of its index (_recently_refreshed), which a client-side
+cache serves locally after the first read. A logout or refresh made through
+another client must invalidate that cached score before the cached client's
+next read, or a logged out session would stay alive on this replica.
+
+Two ways to run it:
+- Always: the reader's cache is a redis-py DefaultCache filled by
+  KeyspaceTrackedClient and invalidated by RESP2 keyspace notifications, run
+  against fakeredis. Two writers and a reader show the cached score going
+  stale and being refreshed once the invalidation arrives.
+- With a Redis server >= 7.4 at REDIS_HOST/REDIS_PORT (skipped otherwise):
+  the real RESP3 client tracking that create_redis_client() turns on. redis-py
+  applies pending invalidations when the connection is next used, so those
+  tests check what that read returns rather than the cache itself. They write
+  keys under the user IDs "test-cache|*" and delete them.
+"""
+
+import os
+import time
+import uuid
+
+import fakeredis
+import pytest
+import redis
+from redis.cache import CacheConfig, CacheEntry, CacheEntryStatus, CacheKey, DefaultCache
+
+import redis_client
+from session_store import INDEX_PREFIX, SessionStore, index_key
+
+TTL_SECONDS = 30 * 60
+REFRESH_INTERVAL = 60 # Seconds, every refresh in these tests falls inside it
+PROPAGATION_GRACE = 0.05 # Seconds an invalidation may take to reach the cached client's socket
+
+
+# -----------------------------
+# RESP2 fallback: keyspace notifications on fakeredis
+# -----------------------------
+class KeyspaceTrackedClient:
+    """
+    A RESP2 client with a local ZSCORE cache, for servers without RESP3 client tracking
+    - Replies are kept in a redis-py DefaultCache, so SessionStore sees it through get_cache()
+    - Writes to a session index by any client arrive as keyspace notifications,
+      process_invalidations() drops the matching entries like a RESP3 push would
+    - Every other command goes straight to the wrapped client
+    """
+    def __init__(self, client):
+        self.client = client
+        self.cache = DefaultCache(CacheConfig(max_size=100))
+        self.round_trips = 0
+        client.config_set("notify-keyspace-events", "K$zg") # Keyspace events for string, sorted set and generic (DEL/EXPIRE) writes
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(f"__keyspace@0__:{INDEX_PREFIX}*")
+
+    def get_cache(self):
+        return self.cache
+
+    def zscore(self, key, member):
+        cache_key = CacheKey(command="ZSCORE", redis_keys=(key,), redis_args=("ZSCORE", key, member))
+        entry = self.cache.get(cache_key)
+        if entry is not None and entry.status == CacheEntryStatus.VALID:
+            return entry.cache_value
+        self.round_trips += 1
+        value = self.client.zscore(key, member)
+        self.cache.set(CacheEntry(cache_key, value, CacheEntryStatus.VALID, None))
+        return value
+
+    def process_invalidations(self):
+        """
+        Applies every invalidation that has arrived, returns how many keys were invalidated
+        """
+        keys = set() # One write can notify several events for the same key
+        while (message := self._pubsub.get_message(timeout=0.05)) is not None:
+            keys.add(message["channel"].split(":", 1)[1])
+        if keys:
+            self.cache.delete_by_redis_keys(list(keys))
+        return len(keys)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+@pytest.fixture
+def tracked(redis_server):
+    """
+    (reader store, writer 1 store, writer 2 store, reader client) on one in-memory Redis
+    """
+    reader = KeyspaceTrackedClient(fakeredis.FakeRedis(server=redis_server, decode_responses=True))
+    writers = [SessionStore(fakeredis.FakeRedis(server=redis_server, decode_responses=True), TTL_SECONDS) for _ in range(2)]
+    yield SessionStore(reader, TTL_SECONDS, refresh_interval=REFRESH_INTERVAL), *writers, reader
+    reader._pubsub.close()
+
+def test_reader_serves_recent_refreshes_from_its_cache(tracked):
+    reader_store, writer, _, reader = tracked
+    writer.create("auth0|user", "laptop", "token")
+
+    for _ in range(3):
+        assert reader_store.refresh("auth0|user", "laptop")
+
+    assert reader.round_trips == 1
+    stats = reader_store.stats()
+    assert stats["refreshes_skipped"] == 3
+    assert stats["local_hits"] == 2
+
+def test_logout_by_another_writer_makes_the_cached_score_stale_until_invalidated(tracked):
+    reader_store, first_writer, second_writer, reader = tracked
+    first_writer.create("auth0|user", "laptop", "token")
+    assert reader_store.refresh("auth0|user", "laptop") # Cached
+    reader.process_invalidations()
+
+    assert second_writer.delete("auth0|user", "laptop")
+
+    # Stale: the invalidation hasn't been applied, the cached score still says alive
+    assert reader_store.refresh("auth0|user", "laptop")
+    assert reader.round_trips == 1
+
+    # Refreshed: the next read after the invalidation goes to Redis and finds no session
+    assert reader.process_invalidations() >= 1
+    assert not reader_store.refresh("auth0|user", "laptop")
+    assert reader.round_trips == 2
+
+def test_refresh_by_another_writer_is_seen_once_invalidated(tracked):
+    reader_store, first_writer, second_writer, reader = tracked
+    first_writer.create("auth0|user", "laptop", "token")
+    index = index_key("auth0|user")
+    cached_score = reader.zscore(index, "laptop")
+    reader.process_invalidations()
+
+    time.sleep(0.01) # The refresh below sets a later expiry, so the score changes
+    assert second_writer.refresh("auth0|user", "laptop")
+    fresh_score = second_writer.client.zscore(index, "laptop")
+
+    assert reader.zscore(index, "laptop") == cached_score # Stale
+    reader.process_invalidations()
+    assert reader.zscore(index, "laptop") == fresh_score > cached_score # Refreshed
+
+# -----------------------------
+# RESP3 client tracking on a real Redis >= 7.4
+# -----------------------------
+@pytest.fixture
+def stores(monkeypatch):
+    """
+    (cached store, writer store, user ID): the cached store reads through a client-side caching client,
+    the writer store through a separate plain connection
+    """
+    if getattr(redis_client, "REDIS_MODE", "standalone") == "cluster":
+        pytest.skip("REDIS_CLIENT_CACHE isn't supported with REDIS_MODE=cluster")
+    password = os.getenv("REDIS_DATABASE_PASSWORD")
+    writer = redis.Redis(host=redis_client.REDIS_HOST, port=redis_client.REDIS_PORT, password=password, decode_responses=True)
+    try:
+        version = writer.info("server")["redis_version"]
+    except redis.RedisError as e:
+        pytest.skip(f"No Redis at {redis_client.REDIS_HOST}:{redis_client.REDIS_PORT}: {e}")
+    if tuple(int(part) for part in version.split(".")[:2]) < (7, 4):
+        pytest.skip(f"Client-side caching needs Redis >= 7.4, the server is {version}")
+
+    monkeypatch.setattr(redis_client, "REDIS_CLIENT_CACHE", True)
+    cached = redis_client.create_redis_client(password=password)
+    user_id = f"test-cache|{uuid.uuid4().hex}"
+    yield SessionStore(cached, TTL_SECONDS, refresh_interval=REFRESH_INTERVAL), SessionStore(writer, TTL_SECONDS), user_id
+    SessionStore(writer, TTL_SECONDS).delete_user(user_id)
+    cached.close()
+    writer.close()
+
+def cache_score(store, user_id, session_id):
+    """
+    Refreshes until the session's index score is served from the local cache
+    """
+    for _ in range(3): # The first read fills the cache, the next ones are local hits
+        assert store.refresh(user_id, session_id)
+    assert store._is_cached("ZSCORE", index_key(user_id), session_id)
+
+def test_delete_from_another_client_invalidates_cached_score(stores):
+    cached_store, writer_store, user_id = stores
+    writer_store.create(user_id, "device", "token")
+    cache_score(cached_store, user_id, "device")
+
+    assert writer_store.delete(user_id, "device")
+    time.sleep(PROPAGATION_GRACE)
+
+    assert not cached_store.refresh(user_id, "device")
+
+def test_refresh_from_another_client_invalidates_cached_score(stores):
+    cached_store, writer_store, user_id = stores
+    writer_store.create(user_id, "device", "token")
+    cache_score(cached_store, user_id, "device")
+    cached_score = cached_store.client.zscore(index_key(user_id), "device")
+
+    time.sleep(0.01) # The refresh below sets a later expiry, so the score changes
+    assert writer_store.refresh(user_id, "device")
+    time.sleep(PROPAGATION_GRACE)
+
+    score = cached_store.client.zscore(index_key(user_id), "device")
+    assert score == writer_store.client.zscore(index_key(user_id), "device")
+    assert score > cached_score
+
+def test_logout_of_every_device_invalidates_cached_score(stores):
+    cached_store, writer_store, user_id = stores
+    writer_store.create(user_id, "phone", "token")
+    writer_store.create(user_id, "laptop", "token")
+    cache_score(cached_store, user_id, "phone")
+
+    assert writer_store.delete_user(user_id) == 2
+    time.sleep(PROPAGATION_GRACE)
+
+    assert not cached_store.refresh(user_id, "phone")
@@ -0,0 +1,103 @@
+"""
+PublicKeyStore picks the verification key by kid, and after a rotation keeps
+verifying tokens signed with the replaced key until they have expired.
+"""
+
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+import jwt
+import pytest
+
+from common.jwk import algorithm_for_key, jwk_thumbprint
+from key_store import PublicKeyStore
+
+
+def write_public_key(path, private_key):
+    with open(path, "wb") as f:
+        f.write(private_key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo))
+    return str(path)
+
+def kid_for(private_key):
+    """
+    The kid the Auth0 microservice stamps into tokens signed with private_key
+    """
+    algorithm = algorithm_for_key(private_key)
+    return jwk_thumbprint(jwt.algorithms.get_default_algorithms()[algorithm].to_jwk(private_key.public_key(), as_dict=True))
+
+def sign(private_key, exp, kid=True):
+    headers = {"kid": kid_for(private_key)} if kid else None
+    return jwt.encode({"sub": "auth0|user", "exp": exp}, private_key, algorithm=algorithm_for_key(private_key), headers=headers)
+
+def in_minutes(minutes):
+    return int(time.time()) + minutes * 60
+
+@pytest.fixture
+def old_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture
+def new_key():
+    return ed25519.Ed25519PrivateKey.generate()
+
+def test_kid_matches_the_signing_side(tmp_path, old_key):
+    store = PublicKeyStore(write_public_key(tmp_path / "public.pem", old_key), poll_interval=0)
+
+    assert store.keys()[0].kid == kid_for(old_key)
+    assert store.decode(sign(old_key, in_minutes(10)))["sub"] == "auth0|user"
+    assert store.decode(sign(old_key, in_minutes(10), kid=False))["sub"] == "auth0|user"
+
+def test_unknown_kid_is_rejected(tmp_path, old_key, new_key):
+    store = PublicKeyStore(write_public_key(tmp_path / "public.pem", old_key), poll_interval=0)
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        store.decode(sign(new_key, in_minutes(10)))
+
+def test_replaced_key_still_verifies_its_tokens(tmp_path, old_key, new_key):
+    path = write_public_key(tmp_path / "public.pem", old_key)
+    store = PublicKeyStore(path, poll_interval=0, previous_key_ttl=600)
+    old_token = sign(old_key, in_minutes(10))
+
+    write_public_key(path, new_key)
+    assert store.reload_if_changed()
+
+    assert store.decode(old_token)["sub"] == "auth0|user"
+    assert store.decode(sign(new_key, in_minutes(10)))["sub"] == "auth0|user"
+    stats = store.stats()
+    assert [key["algorithm"] for key in stats] == [algorithm_for_key(new_key), "RS256"]
+    assert stats[1]["retired_until"] >= time.time() + 590
+
+def test_replaced_key_retires_after_its_ttl(tmp_path, old_key, new_key):
+    path = write_public_key(tmp_path / "public.pem", old_key)
+    store = PublicKeyStore(path, poll_interval=0, previous_key_ttl=0)
+
+    write_public_key(path, new_key)
+    store.reload_if_changed()
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        store.decode(sign(old_key, in_minutes(10)))
+    assert len(store.stats()) == 1
+
+def test_replaced_key_is_kept_until_the_latest_exp_it_verified(tmp_path, old_key, new_key):
+    path = write_public_key(tmp_path / "public.pem", old_key)
+    store = PublicKeyStore(path, poll_interval=0, previous_key_ttl=0)
+    long_lived = sign(old_key, in_minutes(60))
+    store.decode(long_lived)
+
+    write_public_key(path, new_key)
+    store.reload_if_changed()
+
+    assert store.decode(long_lived)["sub"] == "auth0|user"
+    assert store.decode(sign(old_key, in_minutes(10)))["sub"] == "auth0|user"
+
+def test_rotating_back_makes_the_previous_key_current_again(tmp_path, old_key, new_key):
+    path = write_public_key(tmp_path / "public.pem", old_key)
+    store = PublicKeyStore(path, poll_interval=0)
+
+    write_public_key(path, new_key)
+    store.reload_if_changed()
+    write_public_key(path, old_key)
+    store.reload_if_changed()
+
+    assert [key["algorithm"] for key in store.stats()] == ["RS256", algorithm_for_key(new_key)]
@@ -0,0 +1,95 @@
+"""
+migrate_legacy_sessions(): sessions stored under the bare user ID (with an ISO
+"last_updated" and no TTL, or just a TTL) move to the per-device layout with
+their remaining time, and nothing else in the database is touched.
+"""
+
+import datetime
+
+import jwt
+
+from session_store import SessionStore, index_key, migrate_legacy_sessions, session_id_for, session_key
+
+TTL_SECONDS = 30 * 60
+
+
+def legacy_token(user_id, jti=None):
+    claims = {"sub": user_id, **({"jti": jti} if jti else {})}
+    return jwt.encode(claims, "legacy-signing-secret-of-32-bytes", algorithm="HS256")
+
+def timestamped_session(client, user_id, age_seconds, token=None):
+    last_updated = datetime.datetime.now() - datetime.timedelta(seconds=age_seconds)
+    client.hset(user_id, mapping={"JWT": token or legacy_token(user_id), "last_updated": last_updated.isoformat()})
+
+def ttl_session(client, user_id, ttl_seconds, token=None):
+    client.hset(user_id, mapping={"JWT": token or legacy_token(user_id)})
+    client.expire(user_id, ttl_seconds)
+
+def test_timestamped_session_moves_with_its_remaining_time(redis_client):
+    token = legacy_token("auth0|active", jti="laptop")
+    timestamped_session(redis_client, "auth0|active", 10 * 60, token)
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS) == (1, 0)
+
+    key = session_key("auth0|active", "laptop")
+    assert not redis_client.exists("auth0|active")
+    assert redis_client.hgetall(key) == {"JWT": token}
+    assert 19 * 60 * 1000 < redis_client.pttl(key) <= 20 * 60 * 1000
+    assert redis_client.zrange(index_key("auth0|active"), 0, -1) == ["laptop"]
+
+def test_ttl_session_moves_with_its_ttl(redis_client):
+    ttl_session(redis_client, "auth0|active", 5 * 60)
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS) == (1, 0)
+
+    [(session_id, seconds_left)] = SessionStore(redis_client, TTL_SECONDS).list("auth0|active")
+    assert 4 * 60 < seconds_left <= 5 * 60
+    assert 4 * 60 * 1000 < redis_client.pttl(session_key("auth0|active", session_id)) <= 5 * 60 * 1000
+
+def test_migrated_session_is_found_by_its_token(redis_client):
+    token = legacy_token("auth0|active")
+    timestamped_session(redis_client, "auth0|active", 60, token)
+    migrate_legacy_sessions(redis_client, TTL_SECONDS)
+
+    # The routes derive the session ID from the token's claims, the same way the migration does
+    session_id = session_id_for({"sub": "auth0|active"}, token)
+    assert SessionStore(redis_client, TTL_SECONDS).refresh("auth0|active", session_id)
+
+def test_expired_and_unreadable_sessions_are_deleted(redis_client):
+    timestamped_session(redis_client, "auth0|expired", TTL_SECONDS + 60)
+    redis_client.hset("google-oauth2|garbled", mapping={"JWT": "token", "last_updated": "yesterday"})
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS) == (0, 2)
+
+    assert redis_client.keys() == []
+
+def test_unrelated_keys_are_left_alone(redis_client):
+    redis_client.hset("config", mapping={"JWT": "x", "last_updated": "2020-01-01T00:00:00"}) # Not an Auth0 user ID
+    redis_client.hset("auth0|profile", mapping={"name": "User", "last_updated": "2020-01-01T00:00:00"}) # Other fields
+    redis_client.hset("auth0|extra", mapping={"JWT": "x", "last_updated": "2020-01-01T00:00:00", "theme": "dark"})
+    redis_client.hset("auth0|pinned", mapping={"JWT": "x"}) # JWT only, but no TTL
+    redis_client.set("auth0|counter", "1") # Not a hash
+    before = sorted(redis_client.keys())
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS) == (0, 0)
+
+    assert sorted(redis_client.keys()) == before
+    assert redis_client.hget("auth0|extra", "theme") == "dark"
+    assert all(redis_client.pttl(key) == -1 for key in before)
+
+def test_current_sessions_are_left_alone(redis_client):
+    store = SessionStore(redis_client, TTL_SECONDS)
+    store.create("auth0|current", "laptop", "token")
+    before = sorted(redis_client.keys())
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS) == (0, 0)
+
+    assert sorted(redis_client.keys()) == before
+    assert [session_id for session_id, _ in store.list("auth0|current")] == ["laptop"]
+
+def test_batches_and_reruns(redis_client):
+    for i in range(7):
+        timestamped_session(redis_client, f"auth0|user{i}", 60)
+
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS, batch_size=3) == (7, 0)
+    assert migrate_legacy_sessions(redis_client, TTL_SECONDS, batch_size=3) == (0, 0)
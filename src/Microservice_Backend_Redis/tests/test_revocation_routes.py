@@ -0,0 +1,101 @@
+"""
+Logging out revokes the logged out tokens by jti, every route then rejects
+them, other replicas are told to drop them from their caches, and the async
+app does its revocation checks on its own client.
+"""
+
+import asyncio
+import json
+
+import jwt
+import pytest
+
+from conftest import SIGNING_KEY, make_token
+from session_store import AsyncSessionStore
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
+
+@pytest.fixture
+def asgi_service(service, async_redis_client, monkeypatch):
+    """
+    asgi_app.py on async_redis_client, sharing service's revocation list
+    """
+    import asgi_app
+    monkeypatch.setattr(asgi_app, "session_store", AsyncSessionStore(async_redis_client, service.TIME_UNTIL_EXPIRED))
+    return asgi_app
+
+def login(client, token):
+    assert client.get("/create_session", headers={"Authorization": token}).status_code == 201
+
+def test_logged_out_token_is_rejected_on_every_route(client):
+    token = make_token("auth0|user")
+    login(client, token)
+
+    assert client.get("/delete_session", headers={"Authorization": token}).status_code == 200
+
+    for path in ("/create_session", "/update_session", "/list_sessions", "/delete_session"):
+        res = client.get(path, headers={"Authorization": token})
+        assert res.status_code == 401, path
+        assert res.get_json()["error"] == "JWT revoked"
+
+def test_logout_tells_other_replicas_to_drop_the_token(client, service, redis_client):
+    token = make_token("auth0|user")
+    login(client, token)
+    pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe("invalidations")
+
+    client.get("/delete_session", headers={"Authorization": token})
+
+    messages = [pubsub.get_message(timeout=1) for _ in range(2)] # The first read consumes the subscribe reply
+    message = json.loads(next(m for m in messages if m)["data"])
+    assert message["kind"] == "tokens"
+    assert message["payload"] == [service.verified_token_cache.key_for(token)]
+    assert service.verified_token_cache.get(token) is None
+
+def test_logging_out_one_device_keeps_the_other(client):
+    laptop, phone = make_token("auth0|user", jti="laptop"), make_token("auth0|user", jti="phone")
+    login(client, laptop)
+    login(client, phone)
+
+    client.get("/delete_session?session_id=phone", headers={"Authorization": laptop})
+
+    assert client.get("/update_session", headers={"Authorization": laptop}).status_code == 200
+    assert client.get("/update_session", headers={"Authorization": phone}).get_json()["error"] == "JWT revoked"
+
+def test_revocations_skip_missing_tokens_and_tokens_without_a_jti(service):
+    without_jti = jwt.encode({"sub": "auth0|user", "exp": 4102444800}, SIGNING_KEY, algorithm="RS256")
+    with_jti = jwt.encode({"sub": "auth0|user", "jti": "laptop", "exp": 4102444800}, SIGNING_KEY, algorithm="RS256")
+
+    assert service.revocations_for([None, "not-a-jwt", without_jti, with_jti]) == [("laptop", 4102444800)]
+
+def test_async_bulk_verify_checks_revocations_in_one_round_trip(service, asgi_service, async_redis_client, redis_client, monkeypatch):
+    revoked, live = make_token("auth0|a", jti="revoked"), make_token("auth0|b", jti="live")
+    service.revocation_list.revoke("revoked", 4102444800)
+    service.revocation_list.revoke("live", 4102444800)
+    redis_client.delete("revoked:live") # Still a filter "maybe", Redis says no
+    monkeypatch.setattr(service.revocation_list.client, "exists", lambda *args: pytest.fail("sync EXISTS on the event loop"))
+    pipelines = []
+    pipeline = async_redis_client.pipeline
+    monkeypatch.setattr(async_redis_client, "pipeline", lambda *args, **kwargs: pipelines.append(1) or pipeline(*args, **kwargs))
+
+    results, valid = asyncio.run(asgi_service.verify_tokens([revoked, "not-a-jwt", live]))
+
+    assert results == [
+        {"success": False, "error": "JWT revoked"},
+        {"success": False, "error": "Invalid JWT"},
+        {"success": True, "user_id": "auth0|b"},
+    ]
+    assert [user_id for _, user_id, _, _ in valid] == ["auth0|b"]
+    assert len(pipelines) == 1
+
+def test_async_logout_revokes_on_the_async_client(service, asgi_service, async_redis_client, redis_client, monkeypatch):
+    token = make_token("auth0|user", jti="laptop")
+    monkeypatch.setattr(service.revocation_list.client, "pipeline", lambda *args, **kwargs: pytest.fail("sync Redis call on the event loop"))
+
+    asyncio.run(asgi_service.revoke_tokens([token, None]))
+
+    assert redis_client.exists("revoked:laptop")
+    assert service.revocation_list.is_revoked("laptop")
@@ -0,0 +1,118 @@
+"""
+SessionStore against an in-memory Redis: one session hash per device with a
+sliding TTL, plus a per-user index sorted set scored by expiry.
+"""
+
+import asyncio
+
+import pytest
+
+from session_store import AsyncSessionStore, SessionStore, index_key, session_id_for, session_key
+
+TTL_SECONDS = 30 * 60
+
+
+@pytest.fixture
+def store(redis_client):
+    return SessionStore(redis_client, TTL_SECONDS)
+
+def test_session_id_is_the_jti_or_a_token_hash():
+    assert session_id_for({"jti": "abc"}, "token") == "abc"
+    assert session_id_for({}, "token") == session_id_for({}, "token") != session_id_for({}, "other")
+
+def test_create_stores_token_with_ttl_and_index_entry(store, redis_client):
+    store.create("auth0|user", "laptop", "token")
+
+    key = session_key("auth0|user", "laptop")
+    assert key == "session:{auth0|user}:laptop"
+    assert redis_client.hgetall(key) == {"JWT": "token"}
+    assert 0 < redis_client.pttl(key) <= TTL_SECONDS * 1000
+    assert redis_client.zrange(index_key("auth0|user"), 0, -1) == ["laptop"]
+
+def test_each_device_gets_its_own_session(store):
+    store.create("auth0|user", "laptop", "token-a")
+    store.create("auth0|user", "phone", "token-b")
+
+    assert sorted(session_id for session_id, _ in store.list("auth0|user")) == ["laptop", "phone"]
+
+def test_create_trims_expired_index_entries(store, redis_client):
+    redis_client.zadd(index_key("auth0|user"), {"gone": 1})
+
+    store.create("auth0|user", "laptop", "token")
+
+    assert redis_client.zrange(index_key("auth0|user"), 0, -1) == ["laptop"]
+
+def test_refresh_resets_the_ttl(store, redis_client):
+    store.create("auth0|user", "laptop", "token")
+    redis_client.pexpire(session_key("auth0|user", "laptop"), 1000)
+
+    assert store.refresh("auth0|user", "laptop")
+
+    assert redis_client.pttl(session_key("auth0|user", "laptop")) > TTL_SECONDS * 1000 - 5000
+
+def test_refresh_of_expired_session_fails_and_drops_its_index_entry(store, redis_client):
+    store.create("auth0|user", "laptop", "token")
+    redis_client.delete(session_key("auth0|user", "laptop")) # Redis expired it
+
+    assert not store.refresh("auth0|user", "laptop")
+
+    assert not redis_client.exists(session_key("auth0|user", "laptop"))
+    assert store.list("auth0|user") == []
+
+def test_delete_logs_out_one_device(store, redis_client):
+    store.create("auth0|user", "laptop", "token-a")
+    store.create("auth0|user", "phone", "token-b")
+
+    assert store.delete("auth0|user", "laptop")
+    assert not store.delete("auth0|user", "laptop")
+
+    assert not redis_client.exists(session_key("auth0|user", "laptop"))
+    assert [session_id for session_id, _ in store.list("auth0|user")] == ["phone"]
+
+def test_delete_user_logs_out_every_device(store, redis_client):
+    store.create("auth0|user", "laptop", "token-a")
+    store.create("auth0|user", "phone", "token-b")
+
+    assert store.delete_user("auth0|user") == 2
+    assert store.delete_user("auth0|user") == 0
+
+    assert redis_client.keys() == []
+
+def test_list_reports_seconds_left(store):
+    store.create("auth0|user", "laptop", "token")
+
+    [(session_id, seconds_left)] = store.list("auth0|user")
+
+    assert session_id == "laptop"
+    assert TTL_SECONDS - 5 < seconds_left <= TTL_SECONDS
+
+def unrelated_keys(client):
+    client.hset("sessionfoo", mapping={"JWT": "not ours"}) # Shares the prefix, not the namespace
+    client.hset("auth0|legacy", mapping={"JWT": "token"}) # Bare user ID, left to the migration
+    client.set("config", "1")
+
+def test_revoke_all_deletes_only_the_session_namespaces(store, redis_client):
+    store.create_many([(f"auth0|user{i}", "laptop", f"token{i}") for i in range(5)])
+    unrelated_keys(redis_client)
+
+    assert store.revoke_all(batch_size=2) == 5
+
+    assert sorted(redis_client.keys()) == ["auth0|legacy", "config", "sessionfoo"]
+
+def test_async_store_uses_the_same_model(redis_client, async_redis_client):
+    async def run():
+        store = AsyncSessionStore(async_redis_client, TTL_SECONDS)
+        await store.create("auth0|user", "laptop", "token")
+        await store.create_many([(f"auth0|user{i}", "phone", f"token{i}") for i in range(3)])
+        refreshed = await store.refresh_many([("auth0|user", "laptop"), ("auth0|user", "gone")])
+        listed = await store.list("auth0|user")
+        revoked = await store.revoke_all(batch_size=2)
+        return refreshed, listed, revoked
+    unrelated_keys(redis_client)
+
+    refreshed, listed, revoked = asyncio.run(run())
+
+    assert refreshed == [True, False]
+    assert [session_id for session_id, _ in listed] == ["laptop"]
+    assert revoked == 4
+    assert sorted(redis_client.keys()) == ["auth0|legacy", "config", "sessionfoo"]
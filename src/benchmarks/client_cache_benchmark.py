@@ -0,0 +1,114 @@
+"""
+Benchmark and consistency check for client-side caching of session refreshes.
+
+Times SessionStore.refresh() on a plain client (every refresh writes) and on
+a RESP3 client-side caching client with a refresh interval (refreshes inside
+the interval are a ZSCORE answered from the local cache), then checks that
+the cached reader never reports a session alive after another client has
+logged it out: --writers threads each create a session, let the cached
+client refresh it until the read is served locally, delete it through a
+second connection and refresh again. Invalidations travel over the cached
+client's own connections, so a read racing the logout can still see the
+session for the moment the message is in flight; once PROPAGATION_GRACE
+has passed the refresh must fail.
+
+Needs a Redis server >= 7.4 (client tracking with RESP3), e.g. the one in
+src/Microservice_Backend_Redis/Redis_Server. Uses REDIS_HOST/REDIS_PORT and
+writes keys under the user IDs "bench-cache|*", which it deletes afterwards.
+
+    python src/benchmarks/client_cache_benchmark.py --iterations 5000 --writers 4
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+REDIS_SERVICE_DIR = os.path.join(os.path.dirname(__file__), "..", "Microservice_Backend_Redis", "Redis_Microservice")
+sys.path.insert(0, os.path.abspath(REDIS_SERVICE_DIR))
+os.environ["REDIS_CLIENT_CACHE"] = "true"
+
+from redis_client import REDIS_HOST, REDIS_PORT, create_redis_client
+from session_store import SessionStore
+import redis
+
+TTL_SECONDS = 30 * 60
+PROPAGATION_GRACE = 0.05 # Seconds an invalidation may take to reach the cached client
+
+
+def time_refreshes(store, user_id, iterations):
+    """
+    Returns per-call latencies in seconds of refreshing one live session
+    """
+    store.create(user_id, "device", "token")
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        if not store.refresh(user_id, "device"):
+            raise SystemExit("Session expired during the benchmark")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def check_consistency(cached_store, writer_store, writer_id, rounds, lagged, stale):
+    """
+    Logs sessions out behind the cached client's back
+    - lagged: still reported alive right after the logout, the invalidation was in flight
+    - stale: still reported alive PROPAGATION_GRACE seconds later, a real consistency bug
+    """
+    user_id = f"bench-cache|writer-{writer_id}"
+    for i in range(rounds):
+        session_id = f"device-{i}"
+        writer_store.create(user_id, session_id, "token")
+        for _ in range(3): # First refresh caches the ZSCORE, the rest are local hits
+            cached_store.refresh(user_id, session_id)
+        writer_store.delete(user_id, session_id)
+        if cached_store.refresh(user_id, session_id):
+            lagged.append((user_id, session_id))
+            time.sleep(PROPAGATION_GRACE)
+            if cached_store.refresh(user_id, session_id):
+                stale.append((user_id, session_id))
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    print(f"{name:<22} mean={statistics.fmean(latencies) * 1e6:.0f}us  "
+          f"p50={latencies[len(latencies) // 2] * 1e6:.0f}us  p99={latencies[int(len(latencies) * 0.99)] * 1e6:.0f}us")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--refresh-interval", type=float, default=60)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=500, help="Logouts per writer thread")
+    args = parser.parse_args()
+
+    plain = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    cached = create_redis_client(password=os.getenv("REDIS_DATABASE_PASSWORD"))
+    plain_store = SessionStore(plain, TTL_SECONDS)
+    cached_store = SessionStore(cached, TTL_SECONDS, refresh_interval=args.refresh_interval)
+    try:
+        report("refresh (plain)", time_refreshes(plain_store, "bench-cache|plain", args.iterations))
+        report("refresh (client cache)", time_refreshes(cached_store, "bench-cache|cached", args.iterations))
+
+        lagged = []
+        stale = []
+        threads = [
+            threading.Thread(target=check_consistency, args=(cached_store, plain_store, i, args.rounds, lagged, stale))
+            for i in range(args.writers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"consistency            {args.writers * args.rounds} logouts, {len(lagged)} read before the "
+              f"invalidation arrived, {len(stale)} still alive after {PROPAGATION_GRACE * 1000:.0f}ms")
+        print(f"stats                  {cached_store.stats()}")
+    finally:
+        for key in plain.scan_iter(match="session*bench-cache|*"):
+            plain.delete(key)
+    if stale:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
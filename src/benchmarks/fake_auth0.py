@@ -0,0 +1,112 @@
+"""
+Local stand-in for the Auth0 endpoints the Auth0 microservice calls.
+
+Implements just enough of the OAuth authorization code flow for load tests,
+without network access or an Auth0 tenant:
+    GET  /authorize     redirects to redirect_uri with a code and the state
+    POST /oauth/token   exchanges any code for an access token
+    GET  /userinfo      returns the user the access token was issued for
+
+The code picks the user: code "user-42" logs in as "fake-auth0|user-42", so a
+load test can log in as many distinct users as it likes. --latency-ms delays
+every response to model the real Auth0 round trip.
+
+Point the Auth0 microservice at it with AUTH0_BASE_URL:
+    python src/benchmarks/fake_auth0.py --port 7010
+    AUTH0_BASE_URL=http://127.0.0.1:7010 python app.py
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+import argparse
+import json
+import secrets
+import time
+
+ACCESS_TOKEN_PREFIX = "fake-access-"
+
+
+class FakeAuth0Handler(BaseHTTPRequestHandler):
+    """
+    Answers /authorize, /oauth/token and /userinfo, keep-alive like the real Auth0
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Headers and body are separate writes, Nagle would hold the body for a delayed ACK (~40 ms)
+    latency = 0.0 # Seconds, set by serve()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.latency)
+        if url.path == "/authorize":
+            params = parse_qs(url.query)
+            redirect_uri = params.get("redirect_uri", [""])[0]
+            query = urlencode({"code": f"user-{secrets.token_hex(4)}", "state": params.get("state", [""])[0]})
+            self._send(302, b"", {"Location": f"{redirect_uri}?{query}"})
+        elif url.path == "/userinfo":
+            access_token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            if not access_token.startswith(ACCESS_TOKEN_PREFIX):
+                self._send_json(401, {"error": "invalid_token"})
+                return
+            user = access_token.removeprefix(ACCESS_TOKEN_PREFIX)
+            self._send_json(200, {
+                "sub": f"fake-auth0|{user}",
+                "name": f"Load Test {user}",
+                "email": f"{user}@example.com",
+            })
+        else:
+            self._send_json(404, {"error": "not_found"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        time.sleep(self.latency)
+        if urlparse(self.path).path != "/oauth/token":
+            self._send_json(404, {"error": "not_found"})
+            return
+        code = parse_qs(body).get("code", [""])[0]
+        if not code:
+            self._send_json(403, {"error": "invalid_grant"})
+            return
+        self._send_json(200, {
+            "access_token": ACCESS_TOKEN_PREFIX + code,
+            "token_type": "Bearer",
+            "expires_in": 86400,
+        })
+
+    def log_message(self, format, *args):
+        pass # One line per request would cost more than the handler
+
+    def _send_json(self, status, body):
+        self._send(status, json.dumps(body).encode(), {"Content-Type": "application/json"})
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(host, port, latency_ms=0):
+    """
+    Serves the fake Auth0 until interrupted
+    """
+    FakeAuth0Handler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer((host, port), FakeAuth0Handler)
+    server.daemon_threads = True
+    print(f"Fake Auth0 on http://{host}:{port} ({latency_ms}ms latency)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7010)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency_ms)
+
+if __name__ == "__main__":
+    main()
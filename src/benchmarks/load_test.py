@@ -0,0 +1,433 @@
+"""
+Offline load test of the full login flow across both microservices.
+
+Starts everything on free local ports, with nothing reaching the internet:
+    - Redis: an embedded redis-server (if on PATH) or fakeredis' TCP server,
+      or an existing server with --redis-url
+    - Auth0: fake_auth0.py, a local stand-in for /oauth/token and /userinfo
+    - a throwaway signing key pair (--algorithm)
+    - the Auth0 and Redis microservices (--server flask, uvicorn or gunicorn)
+
+Then --concurrency virtual users each repeat, for --duration seconds:
+    GET /callback          Auth0 microservice: code exchange, userinfo, sign, /create_session
+    GET /update_session    Redis microservice, --page-views times
+    GET /delete_session    Redis microservice: logout and revoke
+
+and it reports throughput and p50/p95/p99 latency per route. Results are
+saved as JSON (--output), and --compare checks a run against a saved one,
+exiting 1 if any route lost more than --tolerance of its throughput or
+gained more than --tolerance on p99:
+
+    python src/benchmarks/load_test.py --concurrency 32 --duration 20
+    python src/benchmarks/load_test.py --compare src/benchmarks/results/baseline.json
+
+Environment variables the run inherits (INTERNAL_TRUST, TOKEN_CACHE_SIZE,
+SESSION_WRITE_BEHIND, ...) reach both microservices, so settings can be
+compared run against run. Service output goes to log files in a temporary
+directory, printed if a service fails to start.
+"""
+
+from urllib.parse import urlparse
+from urllib.request import urlopen
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import redis
+
+from signing_algorithms_benchmark import KEY_FACTORIES, write_key_pair
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+AUTH0_SERVICE_DIR = os.path.join(BENCHMARKS_DIR, "..", "Microservice_Backend_Auth0")
+REDIS_SERVICE_DIR = os.path.join(BENCHMARKS_DIR, "..", "Microservice_Backend_Redis", "Redis_Microservice")
+RESULTS_DIR = os.path.join(BENCHMARKS_DIR, "results")
+ROUTES = ("callback", "update_session", "delete_session")
+COOKIE_NAME = "jwt_calorie_counter_profile"
+STARTUP_TIMEOUT = 30 # Seconds a service may take to answer its first request
+
+
+# -----------------------------
+# Local stand-ins and services
+# -----------------------------
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_process(name, command, log_dir, cwd=None, env=None):
+    """
+    Starts a background process with its output in log_dir/name.log
+    """
+    log = open(os.path.join(log_dir, f"{name}.log"), "wb")
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    process.name = name
+    process.log_path = log.name
+    return process
+
+def stop_process(process):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def wait_until_ready(process, check):
+    """
+    Calls check() until it stops raising, fails early if the process exits
+    """
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            return check()
+        except (OSError, redis.RedisError):
+            if process.poll() is not None or time.monotonic() > deadline:
+                with open(process.log_path, errors="replace") as f:
+                    output = f.read()[-4000:]
+                raise SystemExit(f"{process.name} failed to start:\n{output}")
+            time.sleep(0.2)
+
+def start_redis(backend, log_dir):
+    """
+    Starts an embedded Redis, returns (process, port, backend actually used)
+    - "auto" uses redis-server when it is on PATH, fakeredis otherwise
+    """
+    if backend == "auto":
+        backend = "server" if shutil.which("redis-server") else "fake"
+    port = free_port()
+    if backend == "server":
+        command = ["redis-server", "--port", str(port), "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"]
+    else:
+        try:
+            import fakeredis # Optional, only needed without redis-server
+        except ImportError:
+            raise SystemExit("No redis-server on PATH: install Redis, pip install fakeredis, or pass --redis-url")
+        command = [sys.executable, "-c", f"from fakeredis import TcpFakeServer; TcpFakeServer(('127.0.0.1', {port})).serve_forever()"]
+    process = start_process("redis", command, log_dir)
+    wait_until_ready(process, lambda: redis.Redis(port=port).ping())
+    return process, port, backend
+
+def server_command(server, port, workers):
+    """
+    Command line that serves a microservice's app.py (flask, gunicorn) or asgi_app.py (uvicorn)
+    """
+    if server == "flask":
+        return [sys.executable, "-m", "flask", "--app", "app", "run", "--host", "127.0.0.1", "--port", str(port), "--with-threads"]
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "asgi_app:application", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+    return [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+
+def start_services(args, redis_url, keys, log_dir):
+    """
+    Starts the fake Auth0 and both microservices, returns (processes, auth0 URL, Redis microservice URL)
+    """
+    private_path, public_path = keys
+    redis_target = urlparse(redis_url)
+    auth0_port, fake_auth0_port, redis_service_port = free_port(), free_port(), free_port()
+    auth0_url = f"http://127.0.0.1:{auth0_port}"
+    redis_service_url = f"http://127.0.0.1:{redis_service_port}"
+
+    fake_auth0 = start_process("fake_auth0", [
+        sys.executable, os.path.join(BENCHMARKS_DIR, "fake_auth0.py"),
+        "--port", str(fake_auth0_port), "--latency-ms", str(args.auth0_latency_ms),
+    ], log_dir)
+
+    redis_env = {
+        **os.environ,
+        "REDIS_MODE": "standalone",
+        "REDIS_HOST": redis_target.hostname,
+        "REDIS_PORT": str(redis_target.port or 6379),
+        "REDIS_DB": redis_target.path.lstrip("/") or "0",
+        "PUBLIC_KEY_PATH": public_path,
+    }
+    if redis_target.password:
+        redis_env["REDIS_DATABASE_PASSWORD"] = redis_target.password
+    redis_service = start_process("redis_microservice", server_command(args.server, redis_service_port, args.workers),
+                                  log_dir, cwd=REDIS_SERVICE_DIR, env=redis_env)
+
+    auth0_env = {
+        **os.environ,
+        "AUTH0_BASE_URL": f"http://127.0.0.1:{fake_auth0_port}",
+        "CLIENT_ID": "load-test",
+        "CLIENT_SECRET": "load-test",
+        "CALLBACK_URL": f"{auth0_url}/callback",
+        "FRONTEND_URL": "http://127.0.0.1/",
+        "REDIS_MICROSERVICE_DOMAIN": redis_service_url,
+        "PRIVATE_KEY_PATH": private_path,
+        "SHARED_REDIS_URL": redis_url,
+        "SHARED_REDIS_MODE": "standalone",
+    }
+    auth0_service = start_process("auth0_microservice", server_command(args.server, auth0_port, args.workers),
+                                  log_dir, cwd=AUTH0_SERVICE_DIR, env=auth0_env)
+
+    processes = [fake_auth0, redis_service, auth0_service]
+    wait_until_ready(fake_auth0, lambda: socket.create_connection(("127.0.0.1", fake_auth0_port)).close())
+    wait_until_ready(redis_service, lambda: urlopen(f"{redis_service_url}/stats").close())
+    wait_until_ready(auth0_service, lambda: urlopen(f"{auth0_url}/stats").close())
+    return processes, auth0_url, redis_service_url
+
+def fetch_stats(url):
+    """
+    Returns a microservice's /stats, or None if it doesn't answer
+    """
+    try:
+        with urlopen(f"{url}/stats", timeout=5) as response:
+            return json.load(response)
+    except (OSError, ValueError):
+        return None
+
+
+# -----------------------------
+# Load generation
+# -----------------------------
+
+class Connection:
+    """
+    One keep-alive HTTP/1.1 connection, reconnects when the server closes it
+    - Requests are written straight onto asyncio streams, an HTTP client library
+      would spend more CPU per request than the services under test
+    """
+    def __init__(self, url):
+        target = urlparse(url)
+        self.host = target.hostname
+        self.port = target.port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path, token=None):
+        """
+        Sends a GET (token in "Authorization"), returns (status code, lower-cased headers)
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        authorization = f"Authorization: {token}\r\n" if token else ""
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n{authorization}\r\n".encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+        headers = {name.lower(): value for name, value in headers.items()}
+        await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, headers
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader, self.writer = None, None
+
+def session_cookie(headers):
+    """
+    The JWT /callback set in its cookie, or None
+    """
+    cookie = headers.get("set-cookie", "")
+    name, _, rest = cookie.partition("=")
+    return rest.split(";", 1)[0] if name == COOKIE_NAME else None
+
+async def run_load(auth0_url, redis_service_url, concurrency, duration, warmup, page_views):
+    """
+    Runs the virtual users, returns {route: {"latencies": [...], "errors": n}} and completed flows
+    - Requests that start during the warmup aren't recorded
+    """
+    results = {route: {"latencies": [], "errors": 0} for route in ROUTES}
+    flows = 0
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + duration
+
+    async def timed(route, connection, path, token=None, expected=200):
+        start = time.perf_counter()
+        try:
+            status, headers = await connection.get(path, token)
+        except (OSError, asyncio.IncompleteReadError):
+            connection.close()
+            status, headers = None, {}
+        if start >= measure_from:
+            if status == expected:
+                results[route]["latencies"].append(time.perf_counter() - start)
+            else:
+                results[route]["errors"] += 1
+        return status == expected, headers
+
+    async def user(user_id):
+        nonlocal flows
+        auth0 = Connection(auth0_url)
+        redis_service = Connection(redis_service_url)
+        login = 0
+        while time.perf_counter() < deadline:
+            login += 1
+            started = time.perf_counter()
+            ok, headers = await timed("callback", auth0, f"/callback?code=user-{user_id}-{login}&state=Flask", expected=302)
+            token = session_cookie(headers)
+            if not ok or not token:
+                continue
+            for _ in range(page_views):
+                await timed("update_session", redis_service, "/update_session", token)
+            ok, _ = await timed("delete_session", redis_service, "/delete_session", token)
+            if ok and started >= measure_from:
+                flows += 1
+        auth0.close()
+        redis_service.close()
+
+    await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return results, flows
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def summarize(results, duration):
+    """
+    Per route counts, throughput and latency percentiles in milliseconds
+    """
+    summary = {}
+    for route, result in results.items():
+        latencies = sorted(result["latencies"])
+        summary[route] = {
+            "requests": len(latencies),
+            "errors": result["errors"],
+            "throughput": len(latencies) / duration,
+            "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+        }
+    return summary
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+
+def print_summary(summary, flows, duration):
+    print(f"{'route':<16}{'ok':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, row in summary.items():
+        print(f"{route:<16}{row['requests']:>9}{row['errors']:>8}{row['throughput']:>9.0f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    print(f"full flows      {flows} ({flows / duration:.1f}/s)")
+
+def compare(summary, baseline, tolerance):
+    """
+    Prints the change against a saved run per route, returns the regressed routes
+    - Throughput down or p99 up by more than tolerance (a fraction) is a regression
+    """
+    regressions = []
+    print(f"\n{'vs baseline':<16}{'req/s':>18}{'p99 ms':>20}")
+    for route, row in summary.items():
+        before = baseline["routes"].get(route)
+        if not before:
+            continue
+        throughput_change = _change(row["throughput"], before["throughput"])
+        p99_change = _change(row["p99_ms"], before["p99_ms"])
+        regressed = throughput_change < -tolerance or p99_change > tolerance
+        if regressed:
+            regressions.append(route)
+        print(f"{route:<16}{before['throughput']:>7.0f} -> {row['throughput']:<5.0f}{throughput_change:>+6.0%}"
+              f"{before['p99_ms']:>7.1f} -> {row['p99_ms']:<6.1f}{p99_change:>+6.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+def _change(now, before):
+    return (now - before) / before if before else 0.0
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_results(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(record, f, indent=2)
+    print(f"\nSaved results to {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="Virtual users")
+    parser.add_argument("--duration", type=float, default=10, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=2, help="Unmeasured seconds first")
+    parser.add_argument("--page-views", type=int, default=5, help="/update_session calls per login")
+    parser.add_argument("--server", choices=("flask", "uvicorn", "gunicorn"), default="flask")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes per microservice (uvicorn, gunicorn)")
+    parser.add_argument("--redis", choices=("auto", "server", "fake"), default="auto", help="Embedded Redis to start")
+    parser.add_argument("--redis-url", help="Use this Redis instead of starting one, e.g. redis://:password@localhost:6379/0")
+    parser.add_argument("--auth0-latency-ms", type=float, default=0, help="Delay added by the fake Auth0 per call")
+    parser.add_argument("--algorithm", choices=tuple(KEY_FACTORIES), default="RS256")
+    parser.add_argument("--output", help="Results file (default: src/benchmarks/results/load_test_<time>.json)")
+    parser.add_argument("--compare", help="Saved results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional change before a regression")
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            redis_backend = "external"
+            redis_url = args.redis_url
+            if not redis_url:
+                redis_process, redis_port, redis_backend = start_redis(args.redis, directory)
+                processes.append(redis_process)
+                redis_url = f"redis://127.0.0.1:{redis_port}/0"
+            keys = write_key_pair(directory, args.algorithm)
+            services, auth0_url, redis_service_url = start_services(args, redis_url, keys, directory)
+            processes.extend(services)
+
+            print(f"Load testing {args.concurrency} users for {args.duration:.0f}s ({args.server}, Redis: {redis_backend}, "
+                  f"{args.algorithm}, Auth0 latency {args.auth0_latency_ms:.0f}ms)")
+            results, flows = asyncio.run(run_load(
+                auth0_url, redis_service_url, args.concurrency, args.duration, args.warmup, args.page_views
+            ))
+            service_stats = {"auth0": fetch_stats(auth0_url), "redis": fetch_stats(redis_service_url)}
+        finally:
+            for process in reversed(processes):
+                stop_process(process)
+
+    summary = summarize(results, args.duration)
+    print_summary(summary, flows, args.duration)
+
+    record = {
+        "recorded_at": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "page_views": args.page_views,
+            "server": args.server,
+            "workers": args.workers,
+            "redis": redis_backend,
+            "auth0_latency_ms": args.auth0_latency_ms,
+            "algorithm": args.algorithm,
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "routes": summary,
+        "flows_per_second": flows / args.duration,
+        "service_stats": service_stats,
+    }
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    save_results(args.output or os.path.join(RESULTS_DIR, f"load_test_{stamp}.json"), record)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["config"] != record["config"]:
+            print("Note: the baseline ran with a different configuration")
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            raise SystemExit(f"Regressed: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
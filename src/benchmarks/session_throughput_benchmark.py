@@ -0,0 +1,135 @@
+"""
+Throughput benchmark for the Redis microservice's /update_session route.
+
+Logs in --users users with /create_session, then keeps --concurrency
+keep-alive connections sending /update_session for --duration seconds and
+reports requests per second and latency percentiles. Point it at either
+serving mode:
+
+    # sync Flask app
+    cd src/Microservice_Backend_Redis/Redis_Microservice && python app.py
+    # async app
+    cd src/Microservice_Backend_Redis/Redis_Microservice && uvicorn asgi_app:application --port 7002
+
+    python src/benchmarks/session_throughput_benchmark.py --private-key private.pem
+
+The private key must match the public.pem the service was started with.
+Requests are written straight onto asyncio streams rather than through an
+HTTP client library, which would spend more CPU per request than the service
+under test and end up measuring itself.
+"""
+
+from cryptography.hazmat.primitives import serialization
+from urllib.parse import urlparse
+import argparse
+import asyncio
+import datetime
+import statistics
+import time
+import jwt
+
+
+def make_tokens(private_key_path, users):
+    with open(private_key_path, "rb") as f:
+        private_key = serialization.load_pem_private_key(f.read(), password=None)
+    exp = datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=10)
+    return [
+        jwt.encode({"sub": f"bench|{i}", "name": f"User {i}", "exp": exp}, private_key, algorithm="RS256")
+        for i in range(users)
+    ]
+
+
+class Connection:
+    """
+    One keep-alive HTTP/1.1 connection, reconnects when the server closes it
+    """
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def get(self, path, token):
+        """
+        Sends a GET with the token in "Authorization", returns the status code
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAuthorization: {token}\r\n\r\n".encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        headers = dict(line.lower().split(": ", 1) for line in lines[1:] if ": " in line)
+        await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader, self.writer = None, None
+
+async def run(url, tokens, concurrency, duration):
+    """
+    Returns (successful request latencies in seconds, failed request count)
+    """
+    target = urlparse(url)
+    setup = Connection(target.hostname, target.port)
+    for token in tokens:
+        status = await setup.get("/create_session", token)
+        if status != 201:
+            raise SystemExit(f"/create_session returned {status}, does the private key match public.pem?")
+    setup.close()
+
+    latencies = []
+    failures = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id):
+        nonlocal failures
+        connection = Connection(target.hostname, target.port)
+        i = worker_id
+        while time.perf_counter() < deadline:
+            token = tokens[i % len(tokens)]
+            i += concurrency
+            start = time.perf_counter()
+            try:
+                ok = await connection.get("/update_session", token) == 200
+            except (OSError, asyncio.IncompleteReadError):
+                connection.close()
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failures += 1
+        connection.close()
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return latencies, failures
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:7002")
+    parser.add_argument("--private-key", required=True)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    tokens = make_tokens(args.private_key, args.users)
+    latencies, failures = asyncio.run(run(args.url, tokens, args.concurrency, args.duration))
+    if not latencies:
+        print(f"No successful requests ({failures} failures)")
+        return
+    latencies.sort()
+    print(f"requests   {len(latencies)} ok, {failures} failed")
+    print(f"throughput {len(latencies) / args.duration:.0f} req/s")
+    print(f"latency    mean={statistics.fmean(latencies) * 1000:.1f}ms  p50={percentile(latencies, 0.50) * 1000:.1f}ms  "
+          f"p95={percentile(latencies, 0.95) * 1000:.1f}ms  p99={percentile(latencies, 0.99) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Microbenchmark for the Auth0 microservice's JWT signing.
+
+Compares the old create_private_jwt path (open private.pem + parse PEM +
+sign on every login) against the JWTSigner path (sign with the key parsed
+once per process). Uses a throwaway RSA key so it runs without the real key.
+
+Run from anywhere:
+    python src/benchmarks/sign_jwt_benchmark.py --iterations 500
+"""
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import jwt
+
+AUTH0_SERVICE_DIR = os.path.join(os.path.dirname(__file__), "..", "Microservice_Backend_Auth0")
+sys.path.insert(0, os.path.abspath(AUTH0_SERVICE_DIR))
+
+from signing import JWTSigner
+
+
+def write_private_key(directory):
+    """
+    Writes a new RSA private key to directory/private.pem and returns the path
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = os.path.join(directory, "private.pem")
+    with open(path, "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    return path
+
+def make_payload():
+    return {
+        "sub": "auth0|benchmark",
+        "email": "bench@example.com",
+        "name": "Benchmark User",
+        "exp": datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=10),
+    }
+
+def sign_uncached(path):
+    """
+    The original create_private_jwt path: disk read and PEM parse per login
+    """
+    with open(path, "rb") as f:
+        private_key = serialization.load_pem_private_key(f.read(), password=None)
+    return jwt.encode(make_payload(), private_key, algorithm="RS256")
+
+def sign_cached(signer):
+    """
+    The current create_private_jwt path: key already parsed in memory
+    """
+    return signer.sign(make_payload())
+
+def time_calls(func, iterations):
+    """
+    Returns per-call latencies in milliseconds
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<10} mean={statistics.fmean(samples):7.2f}ms  p50={statistics.median(samples):7.2f}ms  p99={p99:7.2f}ms")
+    return p99
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_private_key(directory)
+        signer = JWTSigner(path, poll_interval=0)
+
+        # Warm up both paths so imports and first-call costs are excluded
+        time_calls(lambda: sign_uncached(path), 20)
+        time_calls(lambda: sign_cached(signer), 20)
+
+        before = summarize("uncached", time_calls(lambda: sign_uncached(path), args.iterations))
+        after = summarize("cached", time_calls(lambda: sign_cached(signer), args.iterations))
+        print(f"p99 drop   {before - after:.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Sign and verify throughput per JWT algorithm.
+
+Signs with the Auth0 microservice's JWTSigner and verifies with the Redis
+microservice's PublicKeyStore, the same calls /callback and verify_user
+make, for RS256 (RSA 2048), ES256 (P-256) and EdDSA (Ed25519). Uses
+throwaway keys so it runs without the real keys or Redis. The verify
+store holds all three public keys, so tokens are routed by "kid" as
+during an algorithm migration.
+
+Run from anywhere:
+    python src/benchmarks/signing_algorithms_benchmark.py --seconds 2
+"""
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "Microservice_Backend_Auth0"))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "Microservice_Backend_Redis", "Redis_Microservice"))
+
+from key_store import PublicKeyStore
+from signing import JWTSigner
+
+KEY_FACTORIES = {
+    "RS256": lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    "ES256": lambda: ec.generate_private_key(ec.SECP256R1()),
+    "EdDSA": lambda: ed25519.Ed25519PrivateKey.generate(),
+}
+
+
+def write_key_pair(directory, algorithm):
+    """
+    Writes a new key pair for algorithm to directory, returns (private path, public path)
+    """
+    private_key = KEY_FACTORIES[algorithm]()
+    private_path = os.path.join(directory, f"private_{algorithm}.pem")
+    public_path = os.path.join(directory, f"public_{algorithm}.pem")
+    with open(private_path, "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption(),
+        ))
+    with open(public_path, "wb") as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_path, public_path
+
+def make_payload():
+    return {
+        "sub": "auth0|benchmark",
+        "email": "bench@example.com",
+        "name": "Benchmark User",
+        "exp": datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=10),
+    }
+
+def ops_per_second(func, seconds):
+    """
+    Calls func for about seconds, returns calls per second
+    """
+    for _ in range(20): # Warm up
+        func()
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(50):
+            func()
+        count += 50
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=2, help="Run time per measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pairs = {algorithm: write_key_pair(directory, algorithm) for algorithm in KEY_FACTORIES}
+        store = PublicKeyStore([public for _, public in pairs.values()], poll_interval=0)
+
+        print(f"{'algorithm':<10}{'sign/s':>10}{'verify/s':>10}{'token bytes':>13}")
+        for algorithm, (private_path, _) in pairs.items():
+            signer = JWTSigner(private_path, algorithm=algorithm, poll_interval=0)
+            token = signer.sign(make_payload())
+            if store.decode(token)["sub"] != "auth0|benchmark":
+                raise SystemExit(f"{algorithm} token did not verify")
+            signs = ops_per_second(lambda: signer.sign(make_payload()), args.seconds)
+            verifies = ops_per_second(lambda: store.decode(token), args.seconds)
+            print(f"{algorithm:<10}{signs:>10.0f}{verifies:>10.0f}{len(token):>13}")
+
+if __name__ == "__main__":
+    main()
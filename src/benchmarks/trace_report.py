@@ -0,0 +1,118 @@
+"""
+Summarizes spans written with TRACING_EXPORTER=file.
+
+Reads one or more JSON lines files (every service can append to the same
+one), groups the spans by trace and prints:
+    - time per span name across all traces: count, total, p50/p95 and
+      self time (the span's duration minus its children's)
+    - the --slowest traces as indented waterfalls, so one slow login shows
+      which hop (Auth0, signing, the Redis microservice, a Redis command)
+      took the time
+
+    TRACING_EXPORTER=file TRACING_FILE=/tmp/traces.jsonl python src/benchmarks/load_test.py --duration 5
+    python src/benchmarks/trace_report.py /tmp/traces.jsonl --root "GET /callback"
+"""
+
+import argparse
+import json
+
+
+def load_spans(paths):
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            spans.extend(json.loads(line) for line in f if line.strip())
+    return spans
+
+def group_traces(spans):
+    traces = {}
+    for span in spans:
+        traces.setdefault(span["trace_id"], []).append(span)
+    return traces
+
+def children_by_parent(spans):
+    children = {}
+    for span in spans:
+        children.setdefault(span["parent_id"], []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["start_ns"])
+    return children
+
+def roots_of(spans):
+    """
+    Spans whose parent isn't in this file, e.g. a frontend span when only the backends export
+    """
+    ids = {span["span_id"] for span in spans}
+    return sorted((span for span in spans if span["parent_id"] not in ids), key=lambda span: span["start_ns"])
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+def span_totals(spans):
+    """
+    {span name: [duration_ms, ...], self_ms total} across every trace
+    """
+    children = children_by_parent(spans)
+    totals = {}
+    for span in spans:
+        own = span["duration_ms"] - sum(child["duration_ms"] for child in children.get(span["span_id"], ()))
+        entry = totals.setdefault((span["service"], span["name"]), {"durations": [], "self_ms": 0.0})
+        entry["durations"].append(span["duration_ms"])
+        entry["self_ms"] += max(own, 0.0)
+    return totals
+
+def print_totals(spans):
+    print(f"{'service':<20} {'span':<32} {'count':>7} {'total ms':>11} {'self ms':>11} {'p50 ms':>9} {'p95 ms':>9}")
+    totals = span_totals(spans)
+    for (service, name), entry in sorted(totals.items(), key=lambda item: -sum(item[1]["durations"])):
+        durations = sorted(entry["durations"])
+        print(
+            f"{service:<20} {name:<32} {len(durations):>7} {sum(durations):>11.1f} {entry['self_ms']:>11.1f} "
+            f"{percentile(durations, 0.5):>9.2f} {percentile(durations, 0.95):>9.2f}"
+        )
+
+def print_waterfall(trace_spans):
+    children = children_by_parent(trace_spans)
+    roots = roots_of(trace_spans)
+    origin = roots[0]["start_ns"]
+
+    def walk(span, depth):
+        offset = (span["start_ns"] - origin) / 1e6
+        error = f"  ERROR {span['error']}" if span.get("error") else ""
+        print(f"  {offset:>9.2f} ms  {'  ' * depth}{span['name']} [{span['service']}] {span['duration_ms']:.2f} ms{error}")
+        for child in children.get(span["span_id"], ()):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="Span files written with TRACING_EXPORTER=file")
+    parser.add_argument("--root", help="Only traces with a span of this name, e.g. \"GET /callback\"")
+    parser.add_argument("--slowest", type=int, default=3, help="Traces to print as waterfalls")
+    args = parser.parse_args()
+
+    traces = group_traces(load_spans(args.files))
+    if args.root:
+        traces = {trace_id: spans for trace_id, spans in traces.items() if any(span["name"] == args.root for span in spans)}
+    if not traces:
+        print("No traces found")
+        return
+
+    spans = [span for trace_spans in traces.values() for span in trace_spans]
+    print(f"{len(traces)} traces, {len(spans)} spans\n")
+    print_totals(spans)
+
+    def trace_duration(trace_spans):
+        return (max(span["end_ns"] for span in trace_spans) - min(span["start_ns"] for span in trace_spans)) / 1e6
+
+    for trace_id, trace_spans in sorted(traces.items(), key=lambda item: -trace_duration(item[1]))[:args.slowest]:
+        print(f"\nTrace {trace_id}, {trace_duration(trace_spans):.2f} ms")
+        print_waterfall(trace_spans)
+
+
+if __name__ == "__main__":
+    main()
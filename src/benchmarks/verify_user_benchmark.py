@@ -0,0 +1,101 @@
+"""
+Microbenchmark for the Redis microservice's JWT verification.
+
+Compares the old verify path (open public.pem + parse PEM + decode on every
+call) against the cached PublicKeyStore path (decode with the in-memory key).
+Uses a throwaway RSA key pair so it runs without the real keys or Redis.
+
+Run from anywhere:
+    python src/benchmarks/verify_user_benchmark.py --iterations 2000
+"""
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+import jwt
+
+REDIS_SERVICE_DIR = os.path.join(os.path.dirname(__file__), "..", "Microservice_Backend_Redis", "Redis_Microservice")
+sys.path.insert(0, os.path.abspath(REDIS_SERVICE_DIR))
+
+from key_store import PublicKeyStore
+
+
+def make_key_pair(directory):
+    """
+    Writes a new RSA public key to directory/public.pem and returns (private_key, path)
+    """
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    path = os.path.join(directory, "public.pem")
+    with open(path, "wb") as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_key, path
+
+def make_token(private_key):
+    payload = {
+        "sub": "auth0|benchmark",
+        "email": "bench@example.com",
+        "name": "Benchmark User",
+        "exp": datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=10),
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256")
+
+def verify_uncached(token, path):
+    """
+    The original verify_user path: disk read and PEM parse per call
+    """
+    with open(path, "rb") as f:
+        public_key = serialization.load_pem_public_key(f.read())
+    return jwt.decode(token, public_key, algorithms=["RS256"])
+
+def verify_cached(token, store):
+    """
+    The current verify_user path: key already parsed in memory
+    """
+    return jwt.decode(token, store.get(), algorithms=["RS256"])
+
+def time_calls(func, iterations):
+    """
+    Returns per-call latencies in microseconds
+    """
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<10} mean={statistics.fmean(samples):8.1f}us  p50={statistics.median(samples):8.1f}us  p99={p99:8.1f}us")
+    return statistics.fmean(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        private_key, path = make_key_pair(directory)
+        token = make_token(private_key)
+        store = PublicKeyStore(path, poll_interval=0)
+
+        # Warm up both paths so imports and first-call costs are excluded
+        time_calls(lambda: verify_uncached(token, path), 50)
+        time_calls(lambda: verify_cached(token, store), 50)
+
+        before = summarize("uncached", time_calls(lambda: verify_uncached(token, path), args.iterations))
+        after = summarize("cached", time_calls(lambda: verify_cached(token, store), args.iterations))
+        print(f"speedup    {before / after:.2f}x")
+
+if __name__ == "__main__":
+    main()
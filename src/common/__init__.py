@@ -0,0 +1,5 @@
+# -----------------------------
+# Code shared by both microservices and the Web and CLI frontends.
+# Install once per environment with `pip install -e src/common`, then
+# import from the package, e.g. `from common.tracing import TRACER`.
+# -----------------------------
@@ -0,0 +1,168 @@
+from common.request_log import SampledLogger
+import json
+import os
+import threading
+import time
+import uuid
+import redis
+
+# -----------------------------
+# Cache invalidation bus shared by every replica of both microservices.
+# A replica that logs a token out or rotates a key publishes a message on a
+# Redis pub/sub channel, and every other replica drops the matching entries
+# from its in-process caches.
+# Pub/sub is fire-and-forget, so messages sent while a replica is
+# disconnected are lost. Instead of replaying them, a replica runs its resync
+# handlers (which clear its caches) every time it (re)subscribes. The caches
+# only save work, so starting cold is always correct.
+# Shared by both services (src/common).
+# -----------------------------
+
+CHANNEL = "invalidations"
+log = SampledLogger(__name__)
+
+
+class InvalidationBus:
+    """
+    Publishes and receives cache invalidations over Redis pub/sub
+     - publish(kind, payload) tells every other replica, publish_async() does it
+       through an asyncio caller's redis.asyncio client
+     - on(kind, handler) registers handler(payload) for a kind of message
+     - on_resync(handler) registers handler() run after every (re)subscribe
+     - start() starts the subscriber thread for this process
+     - stats() reports messages sent, received and reconnects
+    """
+    def __init__(self, client, channel=CHANNEL):
+        self.client = client
+        self.channel = channel
+        self.origin = uuid.uuid4().hex # Identifies this process, its own messages are skipped
+        self._handlers = {}
+        self._resync_handlers = []
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._reconnected = False
+        self._published = 0
+        self._publish_errors = 0
+        self._received = 0
+        self._resyncs = 0
+        self._reconnects = 0
+
+    def on(self, kind, handler):
+        self._handlers.setdefault(kind, []).append(handler)
+
+    def on_resync(self, handler):
+        self._resync_handlers.append(handler)
+
+    def publish(self, kind, payload=None):
+        """
+        Sends an invalidation to the other replicas, returns False if Redis can't be reached
+        - Never raises, a missed invalidation is caught by the receivers' resync
+        """
+        try:
+            self.client.publish(self.channel, self._message(kind, payload))
+        except redis.RedisError as e:
+            return self._publish_failed(e)
+        with self._lock:
+            self._published += 1
+        return True
+
+    async def publish_async(self, kind, payload, client):
+        """
+        publish() through a redis.asyncio client, same return value, never raises
+        """
+        try:
+            await client.publish(self.channel, self._message(kind, payload))
+        except redis.RedisError as e:
+            return self._publish_failed(e)
+        with self._lock:
+            self._published += 1
+        return True
+
+    def _message(self, kind, payload):
+        return json.dumps({"kind": kind, "origin": self.origin, "payload": payload})
+
+    def _publish_failed(self, error):
+        log.warning("invalidation_publish_failed", error=str(error))
+        with self._lock:
+            self._publish_errors += 1
+        return False
+
+    def start(self):
+        """
+        Starts the subscriber thread for this process
+        - Safe to call more than once, a forked worker gets its own thread and origin
+        """
+        if self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        self.origin = uuid.uuid4().hex
+        thread = threading.Thread(target=self._watch, name="invalidation-bus", daemon=True)
+        thread.start()
+
+    def stats(self):
+        """
+        Returns bus counters as a dictionary
+        """
+        with self._lock:
+            return {
+                "published": self._published,
+                "publish_errors": self._publish_errors,
+                "received": self._received,
+                "resyncs": self._resyncs,
+                "reconnects": self._reconnects,
+            }
+
+    def _watch(self):
+        """
+        Subscribes and dispatches messages, resubscribing with backoff after a lost connection
+        """
+        backoff = 1
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # redis-py reconnects and resubscribes by itself when it can, flag it so we resync
+                pubsub.connection.register_connect_callback(self._on_reconnect)
+                self._resync() # Subscribed first, so nothing is missed between the two
+                backoff = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if self._reconnected:
+                        self._reconnected = False
+                        with self._lock:
+                            self._reconnects += 1
+                        self._resync()
+                    if message is not None and message["type"] == "message":
+                        self._dispatch(message["data"])
+            except redis.RedisError as e:
+                log.warning("invalidation_bus_disconnected", error=str(e))
+                with self._lock:
+                    self._reconnects += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                pubsub.close()
+
+    def _on_reconnect(self, connection):
+        self._reconnected = True
+
+    def _resync(self):
+        with self._lock:
+            self._resyncs += 1
+        for handler in self._resync_handlers:
+            handler()
+
+    def _dispatch(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("origin") == self.origin:
+            return
+        with self._lock:
+            self._received += 1
+        for handler in self._handlers.get(message.get("kind"), []):
+            try:
+                handler(message.get("payload"))
+            except Exception as e:
+                log.warning("invalidation_handler_failed", kind=message.get("kind"), error=str(e))
@@ -0,0 +1,42 @@
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+import base64
+import hashlib
+import json
+
+# -----------------------------
+# Key helpers behind the "kid" header: the Auth0 microservice stamps the
+# RFC 7638 thumbprint of its signing key into each token and the Redis
+# microservice looks the verification key up by the same thumbprint, so
+# both sides must compute it identically.
+# Shared by both services (src/common).
+# -----------------------------
+
+THUMBPRINT_MEMBERS = { # RFC 7638 required JWK members per key type
+    "RSA": ("e", "kty", "n"),
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+}
+
+
+def algorithm_for_key(key):
+    """
+    Returns the JWT algorithm for a private or public key
+    - RSA -> RS256, P-256 -> ES256, Ed25519 -> EdDSA
+    - Raises ValueError for key types the services don't sign with
+    """
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name == "secp256r1":
+        return "ES256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Unsupported signing key type: {type(key).__name__}")
+
+def jwk_thumbprint(jwk):
+    """
+    Returns the RFC 7638 SHA-256 thumbprint of a JWK, base64url without padding
+    """
+    members = {name: jwk[name] for name in THUMBPRINT_MEMBERS[jwk["kty"]]}
+    canonical = json.dumps(members, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
@@ -0,0 +1,130 @@
+"""
+Verifies JWTs from the Auth0 microservice locally using its published JWKS.
+
+The key set at {BACKEND_URL}/.well-known/jwks.json is fetched once and
+cached for as long as its Cache-Control max-age allows. After that it is
+revalidated with If-None-Match, so an unchanged key set costs a 304 with no
+body. Each page view is then a local signature check instead of a request
+to /verify-user.
+
+A signature check alone can't tell that a token was logged out. Given a
+RevocationList (common/revocation.py) on the microservices' Redis, verify()
+also rejects revoked tokens, usually answered by its in-memory filter.
+Without one, a logged out token is accepted until its "exp" (the Auth0
+microservice issues 10 minute tokens).
+"""
+
+import re
+import threading
+import time
+import jwt
+import requests
+
+DEFAULT_MAX_AGE = 300 # Seconds to cache the key set if the server sends no max-age
+MIN_REFRESH_INTERVAL = 30 # Seconds between forced refreshes for an unknown kid
+REQUEST_TIMEOUT = 5 # Seconds
+
+
+class JWKSUnavailable(Exception):
+    """
+    Raised when the key set can't be fetched and no cached copy exists
+    """
+
+
+class JWKSVerifier:
+    """
+    Caches the Auth0 microservice's JWKS and verifies tokens against it
+     - verify(token) returns the same dictionary shape as /verify-user
+     - A token with an unknown "kid" triggers one early refresh, so a key
+       rotation on the backend is picked up without waiting for max-age
+     - With revocations (a RevocationList), tokens revoked at logout are rejected
+    """
+    def __init__(self, backend_url, max_age=DEFAULT_MAX_AGE, revocations=None):
+        self.jwks_url = backend_url.rstrip("/") + "/.well-known/jwks.json"
+        self.default_max_age = max_age
+        self.revocations = revocations
+        self._keys = {} # kid -> PyJWK
+        self._etag = None
+        self._expires_at = 0
+        self._last_forced_refresh = 0
+        self._lock = threading.Lock()
+
+    def verify(self, token):
+        """
+        Verifies the token locally
+        - Raises JWKSUnavailable if the key set has never been fetched
+        """
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError:
+            return {"success": False, "error": "Invalid JWT"}
+
+        key = self._get_key(kid)
+        if key is None:
+            return {"success": False, "error": "Invalid JWT"}
+
+        try:
+            user_info = jwt.decode(token, key.key, algorithms=[key.algorithm_name])
+        except jwt.ExpiredSignatureError:
+            return {"success": False, "error": "JWT expired"}
+        except jwt.InvalidTokenError:
+            return {"success": False, "error": "Invalid JWT"}
+
+        if self.revocations is not None and self.revocations.is_revoked(user_info.get("jti")):
+            return {"success": False, "error": "JWT revoked"}
+
+        return {
+            "success": True,
+            "message": f"Hello, {user_info.get('name')}! You are authenticated.",
+            "user_info": user_info
+        }
+
+    def _get_key(self, kid):
+        """
+        Returns the cached key for kid, refreshing the key set when stale or the kid is unknown
+        """
+        if time.time() >= self._expires_at:
+            self._refresh()
+        elif kid not in self._keys and time.time() - self._last_forced_refresh >= MIN_REFRESH_INTERVAL:
+            self._last_forced_refresh = time.time()
+            self._refresh(force=True)
+        return self._keys.get(kid)
+
+    def _refresh(self, force=False):
+        """
+        Fetches the key set, sending If-None-Match so an unchanged set returns 304
+        - On a network error the stale keys are kept if there are any
+        """
+        with self._lock:
+            if not force and time.time() < self._expires_at:
+                return # Another thread refreshed while this one waited
+
+            headers = {"If-None-Match": self._etag} if self._etag and not force else {}
+            try:
+                res = requests.get(self.jwks_url, headers=headers, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                if not self._keys:
+                    raise JWKSUnavailable(f"Could not fetch {self.jwks_url}: {e}") from e
+                return
+
+            if res.status_code == 304:
+                self._expires_at = time.time() + self._max_age(res)
+                return
+            if res.status_code != 200:
+                if not self._keys:
+                    raise JWKSUnavailable(f"Could not fetch {self.jwks_url}, status code: {res.status_code}")
+                return
+
+            keys = {}
+            for jwk in res.json().get("keys", []):
+                try:
+                    keys[jwk.get("kid")] = jwt.PyJWK(jwk)
+                except jwt.PyJWKError:
+                    continue # Skip key types this client doesn't support
+            self._keys = keys
+            self._etag = res.headers.get("ETag")
+            self._expires_at = time.time() + self._max_age(res)
+
+    def _max_age(self, response):
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        return int(match.group(1)) if match else self.default_max_age
@@ -0,0 +1,379 @@
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+# -----------------------------
+# Minimal in-process metrics for the microservice.
+# Histograms and counters are grouped into labelled families in REGISTRY,
+# which GET /metrics renders in the Prometheus text format.
+# Under gunicorn a scrape reaches one worker at a time, so with a shared
+# directory (PROMETHEUS_MULTIPROC_DIR, set by gunicorn.conf.py) every
+# worker writes a snapshot of its metrics there every flush_interval
+# seconds and /metrics answers with the sum over all of them. When a worker
+# exits the master folds its counters and histograms into an archive file
+# (mark_process_dead), so totals never go backwards across restarts.
+# -----------------------------
+
+SNAPSHOT_PREFIX = "metrics-" # metrics-<pid>.json, one per live process
+ARCHIVE_FILE = "archive.json" # Counters and histograms of processes that exited
+LOCK_FILE = ".lock"
+DEFAULT_FLUSH_INTERVAL = 5.0 # Seconds between a process' snapshots in multiprocess mode
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds
+FAST_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0) # Seconds, in-process work and Redis commands
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram
+     - observe() records one duration in seconds
+     - time() records the duration of a with block
+     - stats() returns the count, sum and cumulative bucket counts ("le" = less or equal)
+    """
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * len(self.buckets)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._count += 1
+            self._sum += seconds
+            for i, upper_bound in enumerate(self.buckets):
+                if seconds <= upper_bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for upper_bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(upper_bound)] = cumulative
+            buckets["+Inf"] = self._count
+            return {
+                "count": self._count,
+                "sum_seconds": self._sum,
+                "avg_ms": (self._sum / self._count * 1000) if self._count else 0.0,
+                "buckets": buckets,
+            }
+
+    def snapshot(self):
+        with self._lock:
+            return {"counts": list(self._counts), "count": self._count, "sum": self._sum}
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * len(self.buckets)
+            self._count = 0
+            self._sum = 0.0
+
+
+class Counter:
+    """
+    Monotonic counter
+    """
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+
+
+class MetricFamily:
+    """
+    One named metric with a Histogram or Counter per combination of label values
+     - labels(**values) returns that combination's Histogram/Counter, created on first use
+     - children() returns {label values tuple: Histogram/Counter}
+    """
+    def __init__(self, name, kind, help_text, label_names, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **values):
+        key = tuple(str(values[name]) for name in self.label_names)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = Histogram(self.buckets) if self.kind == "histogram" else Counter()
+                    self._children[key] = child
+        return child
+
+    def children(self):
+        with self._lock:
+            return dict(self._children)
+
+
+class MetricsRegistry:
+    """
+    The process' metric families plus gauges read at scrape time
+     - histogram()/counter() return the family with this name, created on first call
+     - gauge() registers a callback returning {label values tuple: value}, e.g. cache hit
+       ratios computed from a component's stats()
+     - render() returns every metric in the Prometheus text exposition format
+     - share_across_processes(directory) turns on multiprocess mode: start() runs this process'
+       snapshot writer, render() sums every process' snapshot found in directory
+    """
+    def __init__(self):
+        self.directory = None
+        self.flush_interval = DEFAULT_FLUSH_INTERVAL
+        self._families = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid() # Process the current values were recorded in
+        self._writer_pid = None
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._family(name, "histogram", help_text, label_names, buckets)
+
+    def counter(self, name, help_text, label_names=()):
+        return self._family(name, "counter", help_text, label_names)
+
+    def gauge(self, name, help_text, label_names, collect):
+        with self._lock:
+            self._gauges[name] = (help_text, tuple(label_names), collect)
+
+    def share_across_processes(self, directory, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """
+        Starts this process' snapshot writer in multiprocess mode
+        - Safe to call more than once, a forked worker gets its own thread
+        - A forked worker first zeroes the values it inherited, they belong to the parent's snapshot
+        """
+        if self.directory is None or self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+        if self._pid != os.getpid():
+            for family in self._families.values():
+                for child in family.children().values():
+                    child.reset()
+            self._pid = os.getpid()
+        threading.Thread(target=self._run_writer, name="metrics-writer", daemon=True).start()
+
+    def flush(self):
+        """
+        Writes this process' snapshot to directory now (multiprocess mode only), e.g. before it exits
+        """
+        if self.directory is not None:
+            _write_json(os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{os.getpid()}.json"), self.snapshot())
+
+    def snapshot(self):
+        """
+        This process' metrics as JSON-safe data, gauges are read from their callbacks now
+        """
+        with self._lock:
+            families = list(self._families.values())
+            gauges = dict(self._gauges)
+        return {
+            "pid": os.getpid(),
+            "families": {
+                family.name: {
+                    "kind": family.kind,
+                    "help": family.help_text,
+                    "labels": list(family.label_names),
+                    "buckets": sorted(family.buckets or ()),
+                    "children": [[list(values), child.snapshot()] for values, child in family.children().items()],
+                }
+                for family in families
+            },
+            "gauges": {
+                name: {"help": help_text, "labels": list(label_names), "values": [[list(values), value] for values, value in collect().items()]}
+                for name, (help_text, label_names, collect) in gauges.items()
+            },
+        }
+
+    def render(self):
+        if self.directory is None:
+            return render_snapshot(self.snapshot())
+        self.flush() # This worker's own numbers are current, the others' at most flush_interval old
+        with _locked(self.directory, exclusive=False):
+            snapshots = _read_snapshots(self.directory)
+        return render_snapshot(merge_snapshots(snapshots))
+
+    def _run_writer(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError:
+                pass # The previous snapshot stays in place, the next interval tries again
+
+    def _family(self, name, kind, help_text, label_names, buckets=None):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, kind, help_text, label_names, buckets)
+                self._families[name] = family
+            return family
+
+
+def merge_snapshots(snapshots):
+    """
+    Sums counters and histograms across processes by name and label values
+    - Gauges aren't summed (a hit ratio per worker), each process' values get a "pid" label
+    """
+    merged = {"families": {}, "gauges": {}}
+    for snapshot in snapshots:
+        _merge_families(merged["families"], snapshot["families"])
+        for name, gauge in snapshot["gauges"].items():
+            target = merged["gauges"].setdefault(name, {"help": gauge["help"], "labels": gauge["labels"] + ["pid"], "values": []})
+            target["values"].extend([values + [snapshot["pid"]], value] for values, value in gauge["values"])
+    return merged
+
+def render_snapshot(snapshot):
+    """
+    Prometheus text format for one snapshot, a process' own or merge_snapshots() of all of them
+    """
+    lines = []
+    for name, family in snapshot["families"].items():
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        for values, data in sorted(family["children"]):
+            labels = _labels(family["labels"], values)
+            if family["kind"] == "counter":
+                lines.append(f"{name}{_braces(labels)} {data}")
+                continue
+            cumulative = 0
+            for upper_bound, count in zip(family["buckets"], data["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_braces(labels + _labels(('le',), (upper_bound,)))} {cumulative}")
+            lines.append(f"{name}_bucket{_braces(labels + _labels(('le',), ('+Inf',)))} {data['count']}")
+            lines.append(f"{name}_sum{_braces(labels)} {data['sum']}")
+            lines.append(f"{name}_count{_braces(labels)} {data['count']}")
+    for name, gauge in snapshot["gauges"].items():
+        lines.append(f"# HELP {name} {gauge['help']}")
+        lines.append(f"# TYPE {name} gauge")
+        for values, value in sorted(gauge["values"]):
+            lines.append(f"{name}{_braces(_labels(gauge['labels'], values))} {value}")
+    return "\n".join(lines) + "\n"
+
+def mark_process_dead(pid, directory):
+    """
+    Folds an exited process' counters and histograms into the archive and removes its snapshot
+    - Call from one process only (gunicorn's master, child_exit), the dead process' gauges are dropped
+    """
+    path = os.path.join(directory, f"{SNAPSHOT_PREFIX}{pid}.json")
+    with _locked(directory, exclusive=True):
+        snapshot = _read_json(path)
+        if snapshot is None:
+            return
+        archive = _read_json(os.path.join(directory, ARCHIVE_FILE)) or {"pid": None, "families": {}, "gauges": {}}
+        _merge_families(archive["families"], snapshot["families"])
+        _write_json(os.path.join(directory, ARCHIVE_FILE), archive)
+        os.remove(path)
+
+def clear_directory(directory):
+    """
+    Removes the snapshots and archive of a previous run, so counters restart from zero
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _locked(directory, exclusive=True):
+        for name in os.listdir(directory):
+            if name.startswith(SNAPSHOT_PREFIX) or name == ARCHIVE_FILE:
+                os.remove(os.path.join(directory, name))
+
+def _merge_families(target, families):
+    for name, family in families.items():
+        merged = target.setdefault(name, {**family, "children": []})
+        children = {tuple(values): data for values, data in merged["children"]}
+        for values, data in family["children"]:
+            key = tuple(values)
+            if key not in children:
+                children[key] = data
+            elif family["kind"] == "counter":
+                children[key] += data
+            else:
+                children[key] = {
+                    "counts": [a + b for a, b in zip(children[key]["counts"], data["counts"])],
+                    "count": children[key]["count"] + data["count"],
+                    "sum": children[key]["sum"] + data["sum"],
+                }
+        merged["children"] = [[list(values), data] for values, data in children.items()]
+
+def _read_snapshots(directory):
+    snapshots = []
+    for name in sorted(os.listdir(directory)):
+        if (name.startswith(SNAPSHOT_PREFIX) and name.endswith(".json")) or name == ARCHIVE_FILE:
+            snapshot = _read_json(os.path.join(directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+    return snapshots
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _write_json(path, data):
+    # Readers only ever see a whole file: write next to it, then rename over it
+    temporary = f"{path}.{threading.get_ident()}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
+
+@contextmanager
+def _locked(directory, exclusive):
+    """
+    Keeps a scrape from reading while the master moves a dead worker's snapshot into the archive
+    """
+    import fcntl # Unix only like gunicorn, single-process mode never takes the lock
+    with open(os.path.join(directory, LOCK_FILE), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _labels(names, values):
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return [f'{name}="{value}"' for name, value in zip(names, escaped)]
+
+def _braces(labels):
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+REGISTRY = MetricsRegistry() # Shared by every module of this process
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "Requests served", ("route", "method", "status"))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram("http_request_duration_seconds", "Request latency from routing to response", ("route",))
+
+def record_request(route, method, status, seconds):
+    """
+    Counts one served request, route is the URL rule ("unmatched" for 404s) so label values stay bounded
+    """
+    HTTP_REQUESTS.labels(route=route, method=method, status=status).inc()
+    HTTP_REQUEST_SECONDS.labels(route=route).observe(seconds)
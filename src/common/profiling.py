@@ -0,0 +1,214 @@
+from collections import Counter
+from common.request_log import SampledLogger
+import cProfile
+import os
+import pstats
+import random
+import re
+import signal
+import sys
+import threading
+import time
+
+# -----------------------------
+# Opt-in profiling for production workers.
+# SamplingProfiler snapshots every thread's stack at a fixed interval
+# (sys._current_frames, no tracing hooks), so a live worker can be sampled
+# for a few seconds at little cost: JWT decode, JSON serialization and
+# waiting on Redis sockets show up as separate stacks. RequestProfiler runs
+# cProfile on a sample of requests and keeps the ones slower than a
+# threshold. Both write "collapsed" stacks (one "frame;frame;frame count"
+# line per stack), the input format of flamegraph.pl and speedscope.
+# -----------------------------
+
+DEFAULT_INTERVAL = 0.005 # Seconds between stack samples
+log = SampledLogger(__name__)
+
+
+class ProfilerBusy(Exception):
+    """
+    Another sampling run is already in progress in this process
+    """
+
+
+class SamplingProfiler:
+    """
+    Wall-clock stack sampler for every thread of the process
+     - profile(seconds) blocks while sampling and returns the collapsed stacks
+     - profile_to_file(seconds, directory) does the same in a background thread
+       and writes sample-<pid>-<time>.collapsed (the signal handler uses this)
+     - One run at a time per process, a second one raises ProfilerBusy
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL, max_seconds=25):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._runs = 0
+
+    def profile(self, seconds, interval=None):
+        """
+        Samples for seconds (capped at max_seconds), counts are samples per stack
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        try:
+            return render_collapsed(self._sample(min(seconds, self.max_seconds), interval or self.interval))
+        finally:
+            self._runs += 1
+            self._lock.release()
+
+    def profile_to_file(self, seconds, directory):
+        def run():
+            try:
+                stacks = self.profile(seconds)
+            except ProfilerBusy:
+                log.warning("sampling_profile_busy", detail="signal ignored")
+                return
+            path = os.path.join(directory, f"sample-{os.getpid()}-{int(time.time())}.collapsed")
+            _write(path, stacks)
+            log.info("sampling_profile_written", path=path)
+        threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+
+    def install_signal_handler(self, signum, seconds, directory):
+        """
+        Profiles for seconds each time the process receives signum
+        - Only possible from the main thread, returns False elsewhere
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return False
+        signal.signal(signum, lambda *_: self.profile_to_file(seconds, directory))
+        return True
+
+    def stats(self):
+        return {"running": self._lock.locked(), "runs": self._runs}
+
+    def _sample(self, seconds, interval):
+        own_thread = threading.get_ident()
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own_thread:
+                    counts[_thread_root(names.get(ident, "unknown")) + ";" + _collapse_frames(frame)] += 1
+            time.sleep(interval)
+        return counts
+
+
+class RequestProfiler:
+    """
+    cProfile for a sample_rate fraction of requests, saved when slower than threshold_ms
+     - start() returns a running cProfile.Profile, or None when the request isn't sampled
+       or another request of this process is being profiled (one at a time keeps the cost bounded)
+     - finish() stops it and, for a slow request, writes <name>-<ms>ms-<time>.prof (pstats,
+       e.g. for snakeviz) and the same profile as .collapsed, up to max_captures per process
+    """
+    def __init__(self, directory, threshold_ms, sample_rate=0.01, max_captures=100):
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_captures = max_captures
+        self._lock = threading.Lock()
+        self._profiled = 0
+        self._captured = 0
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0 and self.sample_rate > 0
+
+    def start(self):
+        if self._captured >= self.max_captures or random.random() >= self.sample_rate:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError: # Another profiler (e.g. a debugger) owns the hook
+            self._lock.release()
+            return None
+        return profile
+
+    def finish(self, profile, name, seconds):
+        profile.disable()
+        self._lock.release()
+        self._profiled += 1
+        elapsed_ms = seconds * 1000
+        if elapsed_ms < self.threshold_ms or self._captured >= self.max_captures:
+            return None
+        self._captured += 1
+        base = os.path.join(self.directory, f"{_safe_name(name)}-{int(elapsed_ms)}ms-{int(time.time() * 1000)}")
+        os.makedirs(self.directory, exist_ok=True)
+        profile.dump_stats(base + ".prof")
+        _write(base + ".collapsed", collapsed_from_profile(profile))
+        return base
+
+    def stats(self):
+        return {
+            "threshold_ms": self.threshold_ms,
+            "sample_rate": self.sample_rate,
+            "profiled": self._profiled,
+            "captured": self._captured,
+        }
+
+
+def collapsed_from_profile(profile):
+    """
+    Collapsed stacks from a cProfile run, counts in microseconds
+    - cProfile keeps caller -> callee totals, not whole stacks, so each function's
+      own time is split across its call paths in proportion to the time each caller spent in it
+    """
+    entries = pstats.Stats(profile).stats # func -> (primitive calls, calls, own time, cumulative time, callers)
+    callees = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, cumulative) in callers.items():
+            callees.setdefault(caller, []).append((func, cumulative))
+
+    counts = Counter()
+    def walk(func, path, share):
+        _, _, own, cumulative, _ = entries[func]
+        path = path + [_frame_name(*func)]
+        micros = int(own * share * 1e6)
+        if micros:
+            counts[";".join(path)] += micros
+        if len(path) >= 100:
+            return
+        for callee, edge_cumulative in callees.get(func, ()):
+            if callee not in entries or _frame_name(*callee) in path: # Recursion is folded into the first call
+                continue
+            child_share = min(share * edge_cumulative / entries[callee][3], 1.0) if entries[callee][3] else 0
+            if entries[callee][3] * child_share >= 1e-6: # Paths under a microsecond are dropped
+                walk(callee, path, child_share)
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, [], 1.0)
+    return render_collapsed(counts)
+
+def render_collapsed(counts):
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+def _collapse_frames(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(_frame_name(code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _frame_name(filename, line, function):
+    # Last two path parts keep library modules apart (jwt/api_jwt.py, redis/client.py)
+    short = "/".join(filename.replace("\\", "/").split("/")[-2:])
+    return f"{function} ({short}:{line})"
+
+def _thread_root(name):
+    # Pool threads differ only by number, one root per pool keeps their stacks together
+    return "thread " + re.sub(r"\d+", "N", name)
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_") or "request"
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
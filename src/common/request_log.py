@@ -0,0 +1,81 @@
+import contextvars
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+
+# -----------------------------
+# Sampled structured logging for per-request events.
+# A print on every request is a blocking stdout write on the hot path,
+# so routine events (a token verified, a session refreshed) are logged as
+# one JSON line for a random LOG_SAMPLE_RATE fraction of requests. Exact
+# counts live in /metrics, the sampled lines show what requests look like.
+# Problems are logged with warning(), at most once per interval per event
+# so a failure hit on every request (Redis down) can't flood stderr.
+# Lines written while serving a request carry its request id.
+# -----------------------------
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_request_id = contextvars.ContextVar("request_id", default=None)
+
+def bind_request_id(request_id=None):
+    """
+    Sets the id logged with every line of the current request (thread or task), returns it
+    - Pass the caller's X-Request-ID to keep one id across services, a new one is made otherwise
+    """
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    return request_id
+
+def current_request_id():
+    return _request_id.get()
+
+
+
+class SampledLogger:
+    """
+    Writes JSON lines to stderr through the standard logging module
+     - event() logs a routine event for sample_rate of calls, each line carries the rate
+     - warning() logs once per warning_interval seconds per event, the next line counts the ones skipped
+     - info() always logs, for rare lifecycle events (a key reload)
+    """
+    def __init__(self, name, sample_rate=0.01, warning_interval=10.0):
+        self.sample_rate = sample_rate
+        self.warning_interval = warning_interval
+        self._lock = threading.Lock()
+        self._warned = {} # event -> (monotonic time last logged, calls skipped since)
+        self._logger = logging.getLogger(name)
+        if not self._logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+
+    def event(self, event, **fields):
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            self._write(logging.INFO, event, fields, sample_rate=self.sample_rate)
+
+    def warning(self, event, **fields):
+        now = time.monotonic()
+        with self._lock:
+            last, skipped = self._warned.get(event, (None, 0))
+            if last is not None and now - last < self.warning_interval:
+                self._warned[event] = (last, skipped + 1)
+                return
+            self._warned[event] = (now, 0)
+        self._write(logging.WARNING, event, fields, **({"skipped": skipped} if skipped else {}))
+
+    def info(self, event, **fields):
+        self._write(logging.INFO, event, fields)
+
+    def _write(self, level, event, fields, **extra):
+        record = {"ts": round(time.time(), 3), "level": logging.getLevelName(level).lower(), "logger": self._logger.name, "event": event}
+        request_id = _request_id.get()
+        if request_id is not None:
+            record["request_id"] = request_id
+        self._logger.log(level, json.dumps({**record, **fields, **extra}, default=str))
@@ -0,0 +1,306 @@
+from common.request_log import SampledLogger
+import hashlib
+import math
+import os
+import threading
+import time
+import redis
+
+# -----------------------------
+# Token revocation list keyed by the JWT's "jti" claim.
+# A revoked jti is a Redis key that expires at the token's own "exp", so the
+# list only ever holds tokens that would otherwise still be valid. Each
+# process keeps a Bloom filter of revoked jtis: a "no" from the filter is
+# certain and costs no network hop, only a "maybe" is confirmed in Redis.
+# The filter is kept current over pub/sub and rebuilt from Redis with SCAN
+# every rebuild_interval seconds (dropping expired entries) and after the
+# subscriber reconnects (picking up revocations it missed).
+# Shared by both services (src/common).
+# -----------------------------
+
+KEY_PREFIX = "revoked:"
+CHANNEL = "revocations"
+DEFAULT_CAPACITY = 100000 # Revoked, unexpired tokens the filter is sized for
+DEFAULT_ERROR_RATE = 0.001 # Target false-positive rate at capacity
+DEFAULT_REBUILD_INTERVAL = 300 # Seconds between rebuilds from Redis
+SCAN_BATCH_SIZE = 1000
+log = SampledLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings
+     - Sized for capacity items at error_rate, k bit positions per item from
+       one BLAKE2b digest (double hashing)
+     - expected_error_rate() estimates the current false-positive rate from how full it is
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size_bits + 7) // 8)
+
+    def add(self, item):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def size_bytes(self):
+        return len(self._bits)
+
+    def expected_error_rate(self):
+        return (1 - math.exp(-self.hash_count * self.count / self.size_bits)) ** self.hash_count
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hash_count)]
+
+
+class RevocationList:
+    """
+    Revoked jtis in Redis with an in-process Bloom filter in front
+     - revoke(jti, exp) stores the jti until exp and tells every process over pub/sub
+     - is_revoked(jti) answers from the filter, and confirms a "maybe" with one EXISTS
+     - revoke_async()/is_revoked_async() do the same for asyncio callers, through their
+       redis.asyncio client (same Redis), so an event loop never blocks on this one
+     - are_revoked_async(jtis) checks many jtis, confirming every "maybe" in one pipelined round trip
+     - from_url(url) connects to the Redis at url
+     - start() loads the filter and starts the subscriber/rebuild thread for this process
+     - stats() reports lookups, Redis checks and the measured false-positive rate
+    """
+    def __init__(self, client, capacity=DEFAULT_CAPACITY, error_rate=DEFAULT_ERROR_RATE,
+                 rebuild_interval=DEFAULT_REBUILD_INTERVAL):
+        self.client = client
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._ready = False # False until the filter is loaded, lookups go straight to Redis
+        self._pending = None # jtis published during a rebuild, added to the new filter
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        self._reconnected = False
+        self._lookups = 0
+        self._filter_negatives = 0
+        self._redis_checks = 0
+        self._confirmed = 0
+        self._false_positives = 0
+        self._rebuilds = 0
+        self._last_rebuild_seconds = 0.0
+        self._reconnects = 0
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        A RevocationList on the Redis at url (redis://...), for processes without a Redis client of their own
+        """
+        return cls(redis.Redis.from_url(url, decode_responses=True, socket_timeout=2, socket_connect_timeout=2), **kwargs)
+
+    def revoke(self, jti, exp):
+        """
+        Revokes a token until its exp (seconds since epoch)
+        - Returns False if there is nothing to do (no jti, or already expired)
+        """
+        if not jti or exp is None or exp <= time.time():
+            return False
+        # Two calls rather than one pipeline: Redis Cluster pipelines can't carry PUBLISH
+        self.client.set(KEY_PREFIX + jti, "1", exat=int(math.ceil(exp)))
+        self.client.publish(CHANNEL, jti)
+        self._add(jti)
+        return True
+
+    async def revoke_async(self, jti, exp, client):
+        """
+        revoke() through a redis.asyncio client
+        """
+        if not jti or exp is None or exp <= time.time():
+            return False
+        pipe = client.pipeline(transaction=False)
+        pipe.set(KEY_PREFIX + jti, "1", exat=int(math.ceil(exp)))
+        pipe.publish(CHANNEL, jti)
+        await pipe.execute()
+        self._add(jti)
+        return True
+
+    def is_revoked(self, jti):
+        """
+        Returns True if the token with this jti was revoked
+        - Filter "no": answered in memory. Filter "maybe" or not loaded yet: one EXISTS
+        - If Redis can't be reached a "maybe" counts as revoked, an unloaded filter as not revoked
+        """
+        maybe, ready = self._check_filter(jti)
+        if not maybe:
+            return False
+        try:
+            revoked = self.client.exists(KEY_PREFIX + jti) == 1
+        except redis.RedisError as e:
+            log.warning("revocation_check_failed", error=str(e))
+            return ready
+        return self._record_check(revoked, ready)
+
+    async def is_revoked_async(self, jti, client):
+        """
+        is_revoked() through a redis.asyncio client, a filter "no" still never leaves the process
+        """
+        return (await self.are_revoked_async([jti], client))[0]
+
+    async def are_revoked_async(self, jtis, client):
+        """
+        Returns is_revoked() for each jti, in order
+        - Filter "no"s are answered in memory, every "maybe" is confirmed with
+          one pipelined EXISTS per jti, a single round trip for the batch
+        """
+        checks = [self._check_filter(jti) for jti in jtis]
+        maybes = [jti for jti, (maybe, _) in zip(jtis, checks) if maybe]
+        if not maybes:
+            return [False] * len(jtis)
+        pipe = client.pipeline(transaction=False)
+        for jti in maybes:
+            pipe.exists(KEY_PREFIX + jti)
+        try:
+            replies = iter(await pipe.execute())
+        except redis.RedisError as e:
+            log.warning("revocation_check_failed", error=str(e))
+            return [maybe and ready for maybe, ready in checks]
+        return [self._record_check(next(replies) == 1, ready) if maybe else False for maybe, ready in checks]
+
+    def start(self):
+        """
+        Loads the filter and starts the subscriber/rebuild thread for this process
+        - Safe to call more than once, a forked worker gets its own thread
+        """
+        if self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        thread = threading.Thread(target=self._watch, name="revocation-list", daemon=True)
+        thread.start()
+
+    def rebuild(self):
+        """
+        Replaces the filter with one built from the revoked keys in Redis (SCAN, never KEYS)
+        - Expired revocations are gone from Redis, so they drop out of the filter here
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = BloomFilter(self.capacity, self.error_rate)
+            for key in self.client.scan_iter(match=KEY_PREFIX + "*", count=SCAN_BATCH_SIZE):
+                fresh.add(key[len(KEY_PREFIX):])
+        except redis.RedisError:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for jti in self._pending:
+                fresh.add(jti)
+            self._pending = None
+            self._filter = fresh
+            self._ready = True
+            self._rebuilds += 1
+            self._last_rebuild_seconds = time.perf_counter() - start
+
+    def stats(self):
+        """
+        Returns revocation metrics as a dictionary
+        - measured_false_positive_rate: filter "maybe" answers Redis said were
+          not revoked, over all lookups of tokens that were not revoked
+        """
+        with self._lock:
+            negatives = self._filter_negatives + self._false_positives
+            return {
+                "ready": self._ready,
+                "lookups": self._lookups,
+                "filter_negatives": self._filter_negatives,
+                "redis_checks": self._redis_checks,
+                "confirmed_revoked": self._confirmed,
+                "false_positives": self._false_positives,
+                "measured_false_positive_rate": self._false_positives / negatives if negatives else 0.0,
+                "expected_false_positive_rate": self._filter.expected_error_rate(),
+                "filter_entries": self._filter.count,
+                "filter_capacity": self._filter.capacity,
+                "filter_bytes": self._filter.size_bytes(),
+                "rebuilds": self._rebuilds,
+                "last_rebuild_ms": self._last_rebuild_seconds * 1000,
+                "reconnects": self._reconnects,
+            }
+
+    def _check_filter(self, jti):
+        """
+        Returns (Redis has to confirm, filter loaded) for one lookup
+        """
+        if not jti:
+            return False, False
+        with self._lock:
+            self._lookups += 1
+            if self._ready and jti not in self._filter:
+                self._filter_negatives += 1
+                return False, True
+            return True, self._ready
+
+    def _record_check(self, revoked, ready):
+        with self._lock:
+            self._redis_checks += 1
+            if revoked:
+                self._confirmed += 1
+            elif ready:
+                self._false_positives += 1
+        return revoked
+
+    def _add(self, jti):
+        with self._lock:
+            self._filter.add(jti)
+            if self._pending is not None:
+                self._pending.append(jti)
+
+    def _on_reconnect(self, connection):
+        """
+        Called by redis-py when the subscriber connection is re-established
+        """
+        with self._lock:
+            self._ready = False # Missed messages, check Redis until the rebuild
+            self._reconnects += 1
+        self._reconnected = True
+
+    def _watch(self):
+        """
+        Subscribes to revocations, rebuilds every rebuild_interval seconds,
+        and resubscribes + rebuilds after a lost connection
+        - While disconnected the filter is marked not ready, so lookups go to Redis
+        """
+        backoff = 1
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(CHANNEL)
+                # redis-py reconnects and resubscribes by itself when it can, flag it so we rebuild
+                pubsub.connection.register_connect_callback(self._on_reconnect)
+                self.rebuild() # Subscribed first, so nothing published during the SCAN is missed
+                backoff = 1
+                next_rebuild = time.monotonic() + self.rebuild_interval
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        self._add(message["data"])
+                    if self._reconnected:
+                        self._reconnected = False
+                        next_rebuild = 0 # Messages may have been missed while disconnected
+                    if time.monotonic() >= next_rebuild:
+                        self.rebuild()
+                        next_rebuild = time.monotonic() + self.rebuild_interval
+            except redis.RedisError as e:
+                log.warning("revocation_subscriber_disconnected", error=str(e))
+                with self._lock:
+                    self._ready = False # Missed messages, check Redis until the next rebuild
+                    self._reconnects += 1
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                pubsub.close()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# src, for the common package when it isn't pip installed
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIR, "..", ".."))
@@ -0,0 +1,91 @@
+"""
+sign_request()/verify_request(): a signature is only valid for its secret,
+route and token, and only within max_skew seconds of its timestamp.
+"""
+
+import pytest
+
+from common import internal_auth
+from common.internal_auth import SIGNATURE_HEADER, TIMESTAMP_HEADER, sign_request, verify_request
+
+SECRET = "shared-secret"
+PATH = "/update_session"
+TOKEN = "header.payload.signature"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Controls internal_auth's time.time(), starting at a fixed instant
+    """
+    now = [1_800_000_000.0]
+    monkeypatch.setattr(internal_auth.time, "time", lambda: now[0])
+    return now
+
+def test_valid_signature(clock):
+    headers = sign_request(SECRET, PATH, TOKEN)
+
+    assert headers[TIMESTAMP_HEADER] == "1800000000"
+    assert verify_request(SECRET, headers, PATH, TOKEN)
+
+@pytest.mark.parametrize("secret, path, token", [
+    ("other-secret", PATH, TOKEN),
+    (SECRET, "/create_session", TOKEN),
+    (SECRET, PATH, "header.payload.other"),
+])
+def test_signature_is_bound_to_secret_route_and_token(clock, secret, path, token):
+    headers = sign_request(SECRET, PATH, TOKEN)
+
+    assert not verify_request(secret, headers, path, token)
+
+def test_replayed_signature_is_rejected_once_older_than_max_skew(clock):
+    headers = sign_request(SECRET, PATH, TOKEN)
+
+    clock[0] += 30
+    assert verify_request(SECRET, headers, PATH, TOKEN, max_skew=30)
+    clock[0] += 1
+    assert not verify_request(SECRET, headers, PATH, TOKEN, max_skew=30)
+
+def test_replayed_signature_is_rejected_on_another_route(clock):
+    headers = sign_request(SECRET, "/update_session", TOKEN)
+
+    assert not verify_request(SECRET, headers, "/delete_session", TOKEN)
+
+def test_timestamp_from_the_future_is_rejected(clock):
+    clock[0] += 31
+    headers = sign_request(SECRET, PATH, TOKEN)
+    clock[0] -= 31
+
+    assert not verify_request(SECRET, headers, PATH, TOKEN, max_skew=30)
+
+def test_rewritten_timestamp_invalidates_the_signature(clock):
+    headers = sign_request(SECRET, PATH, TOKEN)
+    headers[TIMESTAMP_HEADER] = str(int(clock[0]) + 1)
+
+    assert not verify_request(SECRET, headers, PATH, TOKEN)
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {TIMESTAMP_HEADER: "1800000000"},
+    {SIGNATURE_HEADER: "0" * 64},
+    {TIMESTAMP_HEADER: "yesterday", SIGNATURE_HEADER: "0" * 64},
+])
+def test_missing_or_malformed_headers_are_rejected(clock, headers):
+    assert not verify_request(SECRET, headers, PATH, TOKEN)
+
+def test_no_secret_configured_rejects_everything(clock):
+    headers = sign_request(SECRET, PATH, TOKEN)
+
+    assert not verify_request("", headers, PATH, TOKEN)
+    assert not verify_request(None, headers, PATH, TOKEN)
+
+def test_empty_payload_is_signed_like_any_other(clock):
+    headers = sign_request(SECRET, "/admin/profile", "") # An admin request without a body
+
+    assert verify_request(SECRET, headers, "/admin/profile", "")
+    assert not verify_request(SECRET, headers, "/admin/profile", "{}")
+
+def test_missing_token_is_rejected(clock):
+    headers = sign_request(SECRET, PATH, "")
+
+    assert not verify_request(SECRET, headers, PATH, None)
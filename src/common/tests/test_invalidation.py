@@ -0,0 +1,107 @@
+"""
+InvalidationBus between two replicas on one in-memory Redis: a logout on one
+replica drops the token from the other's verified token cache, a replica
+ignores its own messages and clears its cache whenever it (re)subscribes.
+"""
+
+import asyncio
+import threading
+
+import fakeredis
+import pytest
+import redis
+
+from common.invalidation import InvalidationBus
+from common.token_cache import VerifiedTokenCache
+
+CLAIMS = {"sub": "auth0|user", "exp": 4102444800}
+
+
+class Replica:
+    """
+    One service process: a verified token cache kept in step by its bus, wired like app.py
+    """
+    def __init__(self, client):
+        self.cache = VerifiedTokenCache(max_size=100)
+        self.bus = InvalidationBus(client)
+        self.resynced = threading.Event()
+        self.received = threading.Event()
+        self.bus.on("tokens", self.drop)
+        self.bus.on("clear", lambda _: self.cache.clear())
+        self.bus.on_resync(self.resync)
+
+    def drop(self, keys):
+        for key in keys:
+            self.cache.invalidate_key(key)
+        self.received.set()
+
+    def resync(self):
+        self.cache.clear()
+        self.resynced.set()
+
+    def start(self):
+        self.bus.start()
+        assert self.resynced.wait(5)
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def replica(server):
+    return Replica(fakeredis.FakeRedis(server=server, decode_responses=True))
+
+def test_logout_on_one_replica_drops_the_token_on_the_other(server):
+    a, b = replica(server), replica(server)
+    b.start()
+    for r in (a, b):
+        r.cache.put("token", CLAIMS)
+        r.cache.put("other", CLAIMS)
+
+    key = a.cache.key_for("token")
+    a.cache.invalidate_key(key)
+    assert a.bus.publish("tokens", [key])
+
+    assert b.received.wait(5)
+    assert b.cache.get("token") is None
+    assert b.cache.get("other") == CLAIMS
+    assert b.bus.stats()["received"] == 1
+
+def test_replica_ignores_its_own_messages(server):
+    a = replica(server)
+    a.start()
+    a.cache.put("token", CLAIMS)
+
+    a.bus.publish("tokens", [a.cache.key_for("token")])
+    a.bus.publish("clear")
+
+    assert not a.received.wait(0.5)
+    assert a.cache.get("token") == CLAIMS
+
+def test_subscribing_clears_the_cache(server):
+    a = replica(server)
+    a.cache.put("token", CLAIMS)
+
+    a.start()
+
+    assert a.cache.get("token") is None
+    assert a.bus.stats()["resyncs"] == 1
+
+def test_async_publish_reaches_other_replicas(server):
+    a, b = replica(server), replica(server)
+    b.start()
+    b.cache.put("token", CLAIMS)
+    async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+    assert asyncio.run(a.bus.publish_async("tokens", [b.cache.key_for("token")], async_client))
+
+    assert b.received.wait(5)
+    assert b.cache.get("token") is None
+
+def test_publish_never_raises_when_redis_is_down(server, monkeypatch):
+    a = replica(server)
+    def down(*args):
+        raise redis.ConnectionError("down")
+    monkeypatch.setattr(a.bus.client, "publish", down)
+
+    assert not a.bus.publish("clear")
+    assert a.bus.stats()["publish_errors"] == 1
@@ -0,0 +1,36 @@
+"""
+The kid helpers both services share: RFC 7638 thumbprints and the algorithm
+each key type signs with.
+"""
+
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+import jwt
+import pytest
+
+from common.jwk import algorithm_for_key, jwk_thumbprint
+
+RFC_7638_JWK = { # The example key of RFC 7638 section 3.1
+    "kty": "RSA",
+    "n": "0vx7agoebGcQSuuPiLJXZptN9nndrQmbXEps2aiAFbWhM78LhWx4cbbfAAtVT86zwu1RK7aPFFxuhDR1L6tSoc_BJECPebWKRXjBZCiFV4n3oknjhMstn64tZ_2W-5JsGY4Hc5n9yBXArwl93lqt7_RN5w6Cf0h4QyQ5v-65YGjQR0_FDW2QvzqY368QQMicAtaSqzs8KJZgnYb9c7d0zgdAZHzu6qMQvRL5hajrn1n91CbOpbISD08qNLyrdkt-bFTWhAI4vMQFh6WeZu0fM4lFd2NcRwr3XPksINHaQ-G_xBniIqbw0Ls1jF44-csFCur-kEgU8awapJzKnqDKgw",
+    "e": "AQAB",
+    "alg": "RS256",
+    "kid": "2011-04-29",
+}
+
+
+def test_thumbprint_matches_rfc_7638():
+    assert jwk_thumbprint(RFC_7638_JWK) == "NzbLsXh8uDCcd-6MNwXF4W_7noWXFZAfHkxZsRGC9Xs"
+
+@pytest.mark.parametrize("private_key, algorithm", [
+    (rsa.generate_private_key(public_exponent=65537, key_size=2048), "RS256"),
+    (ec.generate_private_key(ec.SECP256R1()), "ES256"),
+    (ed25519.Ed25519PrivateKey.generate(), "EdDSA"),
+])
+def test_private_and_public_halves_agree(private_key, algorithm):
+    assert algorithm_for_key(private_key) == algorithm_for_key(private_key.public_key()) == algorithm
+    jwk = jwt.algorithms.get_default_algorithms()[algorithm].to_jwk(private_key.public_key(), as_dict=True)
+    assert jwk_thumbprint({**jwk, "kid": "ignored", "use": "sig"}) == jwk_thumbprint(jwk)
+
+def test_unsupported_key_type():
+    with pytest.raises(ValueError):
+        algorithm_for_key(ec.generate_private_key(ec.SECP384R1()))
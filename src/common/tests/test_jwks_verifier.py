@@ -0,0 +1,92 @@
+"""
+JWKSVerifier: tokens are verified locally against the cached key set, and
+with a RevocationList tokens revoked at logout are rejected.
+"""
+
+import datetime
+import json
+import time
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+import fakeredis
+import jwt
+import pytest
+import requests
+
+from common import jwks_verifier
+from common.jwks_verifier import JWKSUnavailable, JWKSVerifier
+from common.revocation import RevocationList
+
+BACKEND_URL = "http://auth0-microservice.test"
+SIGNING_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+KID = "test-key"
+
+
+def jwks_response(status_code=200):
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(SIGNING_KEY.public_key()))
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps({"keys": [{**jwk, "kid": KID, "alg": "RS256", "use": "sig"}]}).encode()
+    response.headers["Cache-Control"] = "max-age=300"
+    return response
+
+def make_token(jti="laptop", expires_minutes=10, kid=KID):
+    claims = {"sub": "auth0|user", "name": "User", "jti": jti,
+              "exp": datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(minutes=expires_minutes)}
+    return jwt.encode(claims, SIGNING_KEY, algorithm="RS256", headers={"kid": kid})
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """
+    Serves the JWKS to the verifier and records each fetch
+    """
+    calls = []
+    def get(url, headers=None, timeout=None):
+        calls.append(url)
+        return jwks_response()
+    monkeypatch.setattr(jwks_verifier.requests, "get", get)
+    return calls
+
+@pytest.fixture
+def revocations():
+    revocations = RevocationList(fakeredis.FakeRedis(decode_responses=True))
+    revocations.rebuild()
+    return revocations
+
+def test_valid_token_is_verified_with_one_fetch(fetches):
+    verifier = JWKSVerifier(BACKEND_URL)
+
+    for _ in range(3):
+        result = verifier.verify(make_token())
+        assert result["success"]
+        assert result["user_info"]["sub"] == "auth0|user"
+
+    assert fetches == [BACKEND_URL + "/.well-known/jwks.json"]
+
+@pytest.mark.parametrize("token, error", [
+    ("not-a-jwt", "Invalid JWT"),
+    (make_token(kid="unknown"), "Invalid JWT"),
+    (make_token(expires_minutes=-1), "JWT expired"),
+])
+def test_rejected_tokens(fetches, token, error):
+    assert JWKSVerifier(BACKEND_URL).verify(token) == {"success": False, "error": error}
+
+def test_revoked_token_is_rejected(fetches, revocations):
+    verifier = JWKSVerifier(BACKEND_URL, revocations=revocations)
+    revocations.revoke("logged-out", time.time() + 600)
+
+    assert verifier.verify(make_token(jti="logged-out")) == {"success": False, "error": "JWT revoked"}
+    assert verifier.verify(make_token(jti="still-logged-in"))["success"]
+
+def test_without_revocations_a_logged_out_token_is_accepted_until_exp(fetches, revocations):
+    revocations.revoke("logged-out", time.time() + 600)
+
+    assert JWKSVerifier(BACKEND_URL).verify(make_token(jti="logged-out"))["success"]
+
+def test_unreachable_backend_without_cached_keys_raises(monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(jwks_verifier.requests, "get", unreachable)
+
+    with pytest.raises(JWKSUnavailable):
+        JWKSVerifier(BACKEND_URL).verify(make_token())
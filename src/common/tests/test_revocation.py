@@ -0,0 +1,130 @@
+"""
+BloomFilter and RevocationList against an in-memory Redis: a filter "no" is
+answered without Redis, a "maybe" is confirmed with EXISTS, and the measured
+false-positive rate stays near the configured one.
+"""
+
+import asyncio
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from common.revocation import KEY_PREFIX, BloomFilter, RevocationList
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def client(server):
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+@pytest.fixture
+def revocations(client):
+    revocations = RevocationList(client, capacity=1000, error_rate=0.01)
+    revocations.rebuild()
+    return revocations
+
+def in_an_hour():
+    return time.time() + 3600
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+
+def test_bloom_filter_false_positive_rate_at_capacity():
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"revoked-{i}")
+
+    false_positives = sum(f"other-{i}" in bloom for i in range(20000))
+
+    assert false_positives / 20000 < 0.02
+    assert bloom.expected_error_rate() == pytest.approx(0.01, rel=0.2)
+
+def test_revoked_token_is_stored_until_its_exp(revocations, client):
+    exp = in_an_hour()
+
+    assert revocations.revoke("jti-1", exp)
+
+    assert revocations.is_revoked("jti-1")
+    assert client.exists(KEY_PREFIX + "jti-1")
+    assert abs(client.ttl(KEY_PREFIX + "jti-1") - 3600) <= 2
+
+def test_nothing_to_revoke(revocations, client):
+    assert not revocations.revoke(None, in_an_hour())
+    assert not revocations.revoke("jti-1", None)
+    assert not revocations.revoke("jti-1", time.time() - 1) # Already expired
+    assert client.keys() == []
+    assert not revocations.is_revoked(None)
+
+def test_filter_no_is_answered_without_redis(revocations, client, monkeypatch):
+    monkeypatch.setattr(client, "exists", lambda *args: pytest.fail("EXISTS sent for a filter no"))
+
+    assert not revocations.is_revoked("never-revoked")
+
+    assert revocations.stats()["filter_negatives"] == 1
+
+def test_filter_maybe_denied_by_redis_is_a_false_positive(revocations, client):
+    revocations.revoke("jti-1", in_an_hour())
+    client.delete(KEY_PREFIX + "jti-1") # Still in the filter until the next rebuild
+
+    assert not revocations.is_revoked("jti-1")
+
+    stats = revocations.stats()
+    assert stats["redis_checks"] == 1
+    assert stats["false_positives"] == 1
+    assert stats["measured_false_positive_rate"] == 1.0
+
+def test_rebuild_loads_revocations_from_redis_and_drops_expired_ones(client):
+    client.set(KEY_PREFIX + "from-another-process", "1")
+    revocations = RevocationList(client)
+    revocations.rebuild()
+    assert revocations.is_revoked("from-another-process")
+
+    client.delete(KEY_PREFIX + "from-another-process") # Expired
+    revocations.rebuild()
+    assert not revocations.is_revoked("from-another-process")
+    assert revocations.stats()["filter_negatives"] == 1
+
+def test_unloaded_filter_asks_redis(client):
+    revocations = RevocationList(client)
+    client.set(KEY_PREFIX + "jti-1", "1")
+
+    assert revocations.is_revoked("jti-1")
+    assert not revocations.is_revoked("jti-2")
+    assert revocations.stats()["redis_checks"] == 2
+
+def test_redis_down_fails_closed_only_for_a_filter_maybe(revocations, client, monkeypatch):
+    revocations.revoke("jti-1", in_an_hour())
+    def down(*args):
+        raise redis.ConnectionError("down")
+    monkeypatch.setattr(client, "exists", down)
+
+    assert revocations.is_revoked("jti-1")
+    assert not RevocationList(client).is_revoked("jti-1") # Filter not loaded yet
+
+def test_async_lookups_confirm_every_maybe_in_one_round_trip(revocations, server):
+    async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    sent = []
+    pipeline = async_client.pipeline
+    def recording_pipeline(*args, **kwargs):
+        sent.append(kwargs)
+        return pipeline(*args, **kwargs)
+    async_client.pipeline = recording_pipeline
+
+    async def run():
+        await revocations.revoke_async("jti-1", in_an_hour(), async_client)
+        await revocations.revoke_async("jti-2", in_an_hour(), async_client)
+        sent.clear()
+        return await revocations.are_revoked_async(["jti-1", None, "jti-3", "jti-2"], async_client)
+
+    assert asyncio.run(run()) == [True, False, False, True]
+    assert len(sent) == 1
+    assert revocations.stats()["redis_checks"] == 2
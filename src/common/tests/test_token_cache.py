@@ -0,0 +1,85 @@
+"""
+VerifiedTokenCache: claims are served until the token's exp, a logout
+(invalidate) removes them, and the LRU bound holds.
+"""
+
+import time
+
+from common.token_cache import VerifiedTokenCache
+
+
+def claims(exp_in=600, **extra):
+    return {"sub": "auth0|user", "exp": time.time() + exp_in, **extra}
+
+def test_get_returns_a_copy_of_the_cached_claims():
+    cache = VerifiedTokenCache()
+    cache.put("token", claims())
+
+    first = cache.get("token")
+    first["sub"] = "changed"
+
+    assert cache.get("token")["sub"] == "auth0|user"
+    assert cache.stats()["hits"] == 2
+
+def test_invalidate_drops_the_token():
+    cache = VerifiedTokenCache()
+    cache.put("token", claims())
+    cache.put("other", claims())
+
+    assert cache.invalidate("token")
+    assert cache.get("token") is None
+    assert cache.get("other") is not None
+    assert not cache.invalidate("token")
+    assert cache.stats()["invalidations"] == 1
+
+def test_invalidated_token_is_cached_again_only_after_a_new_put():
+    cache = VerifiedTokenCache()
+    cache.put("token", claims())
+    cache.invalidate("token")
+    assert cache.get("token") is None
+
+    cache.put("token", claims())
+    assert cache.get("token") is not None
+
+def test_expired_entry_is_a_miss():
+    cache = VerifiedTokenCache()
+    cache.put("token", claims(exp_in=-1))
+
+    assert cache.get("token") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["size"] == 0
+
+def test_token_without_numeric_exp_is_not_cached():
+    cache = VerifiedTokenCache()
+    cache.put("no-exp", {"sub": "auth0|user"})
+    cache.put("string-exp", {"sub": "auth0|user", "exp": "soon"})
+
+    assert cache.get("no-exp") is None
+    assert cache.get("string-exp") is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerifiedTokenCache(max_size=2)
+    cache.put("a", claims())
+    cache.put("b", claims())
+    cache.get("a") # b is now the least recently used
+    cache.put("c", claims())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_max_size_zero_disables_the_cache():
+    cache = VerifiedTokenCache(max_size=0)
+    cache.put("token", claims())
+
+    assert cache.get("token") is None
+    assert cache.stats()["size"] == 0
+
+def test_entries_are_keyed_by_token_hash():
+    cache = VerifiedTokenCache()
+    cache.put("token", claims())
+
+    assert "token" not in cache._entries
+    assert VerifiedTokenCache.key_for("token") in cache._entries
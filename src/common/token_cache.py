@@ -0,0 +1,112 @@
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+# -----------------------------
+# Remembers the claims of JWTs that already passed RS256 verification so
+# the same token sent on every page view is only verified once.
+# Entries are keyed by a SHA-256 of the token (the raw JWT is never stored),
+# expire at the token's own "exp" claim and are evicted least recently used.
+# -----------------------------
+
+DEFAULT_MAX_SIZE = 10000
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU cache of token hash -> decoded claims
+     - get() returns the claims if the token was verified and hasn't expired
+     - put() stores claims after a successful decode
+     - invalidate() drops one token, e.g. on logout, invalidate_key() by its hash
+     - stats() reports hits, misses, evictions and size
+    A max_size of 0 disables the cache
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict() # token hash -> (claims, exp)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def key_for(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        """
+        Returns a copy of the cached claims, or None on a miss or expired entry
+        """
+        if self.max_size <= 0:
+            return None
+        key = self.key_for(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            claims, exp = entry
+            if time.time() >= exp:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return dict(claims)
+
+    def put(self, token, claims):
+        """
+        Caches verified claims until their "exp"
+        - Tokens without a numeric "exp" are not cached
+        """
+        exp = claims.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        key = self.key_for(token)
+        with self._lock:
+            self._entries[key] = (dict(claims), exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, token):
+        """
+        Removes a token from the cache, returns True if it was cached
+        """
+        return self.invalidate_key(self.key_for(token))
+
+    def invalidate_key(self, key):
+        """
+        Same as invalidate() for a key_for() hash, e.g. received from another replica
+        """
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+            if removed:
+                self._invalidations += 1
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns cache counters as a dictionary
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
@@ -0,0 +1,346 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from common.request_log import SampledLogger
+import contextvars
+import json
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+import urllib.request
+
+# -----------------------------
+# Minimal distributed tracing with W3C Trace Context propagation.
+# Each request gets a server span whose parent comes from the incoming
+# "traceparent" header, outgoing calls (Redis microservice, Auth0, Redis
+# commands) get client spans and pass their own traceparent on, so a login
+# shows up as one trace across the frontend and both microservices.
+# Finished spans are queued and written by a background thread, either as
+# JSON lines to a file or as OTLP/HTTP JSON to a local collector. With no
+# exporter configured spans are never created and propagation is skipped.
+# -----------------------------
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318/v1/traces" # OpenTelemetry collector, OTLP/HTTP
+OTLP_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+log = SampledLogger(__name__)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    One timed operation of a trace
+     - set_attribute() adds a key/value shown with the span
+     - record_error() marks the span as failed
+     - traceparent() returns the W3C header value naming this span as the parent
+    """
+    def __init__(self, tracer, name, kind, trace_id, parent_id, sampled, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = dict(attributes)
+        self.error = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, description):
+        self.error = str(description)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if self.sampled:
+                self.tracer.exporter.export(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.tracer.service_name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """
+    Creates spans and tracks the current one per thread/task (contextvars)
+     - configure() sets the service name, exporter and sample rate, tracing is off until then
+     - span() is a with block around an operation, a child of the current span
+     - start_span()/finish() do the same for code split across hooks (before/after request)
+     - inject() adds the current span's traceparent to a dictionary of outgoing headers
+    """
+    def __init__(self):
+        self.service_name = None
+        self.exporter = None
+        self.sample_rate = 1.0
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def configure(self, service_name, exporter, sample_rate=1.0):
+        self.service_name = service_name
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start(self):
+        """
+        Starts the exporter thread for this process, safe to call more than once
+        """
+        if self.exporter is not None:
+            self.exporter.start()
+
+    def current_span(self):
+        return _current_span.get()
+
+    def start_span(self, name, kind="internal", traceparent=None, **attributes):
+        """
+        Starts a span and makes it current, returns (span, token) for finish()
+        - The parent is the incoming traceparent if given and valid, otherwise the current span
+        - New traces are sampled at sample_rate, children follow their parent's decision
+        """
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is None:
+            current = _current_span.get()
+            if current is not None:
+                parent = (current.trace_id, current.span_id, current.sampled)
+        if parent is None:
+            trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < self.sample_rate
+        else:
+            trace_id, parent_id, sampled = parent
+        span = Span(self, name, kind, trace_id, parent_id, sampled, attributes)
+        return span, _current_span.set(span)
+
+    def finish(self, span, token, error=None):
+        if error is not None:
+            span.record_error(error)
+        span.end()
+        _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name, kind="internal", **attributes):
+        """
+        Times the with block as a child span, yields the span (None when tracing is off)
+        - An exception leaving the block is recorded on the span and re-raised
+        """
+        if self.exporter is None:
+            yield None
+            return
+        span, token = self.start_span(name, kind, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(repr(e))
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+
+    def inject(self, headers=None):
+        """
+        Returns a copy of headers with the current span's traceparent added
+        """
+        headers = dict(headers or {})
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT_HEADER] = span.traceparent()
+        return headers
+
+    def current_traceparent(self):
+        span = _current_span.get()
+        return span.traceparent() if span is not None else None
+
+
+def parse_traceparent(value):
+    """
+    Returns (trace_id, parent span_id, sampled) from a traceparent header, None if it's malformed
+    """
+    match = TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+class SpanExporter(ABC):
+    """
+    Bounded queue + worker thread writing finished spans in batches
+     - export() never blocks, spans are dropped and counted when the queue is full
+     - write(batch) is abstract, a subclass without it can't be created
+     - stats() reports the exported and dropped counts
+    """
+    def __init__(self, max_queue_size=10000, batch_size=512, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker_pid = None
+        self._lock = threading.Lock()
+        self._exported = 0
+        self._dropped = 0
+        self._failed = 0
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def start(self):
+        """
+        Starts the writer thread for this process
+        - Safe to call more than once, a forked worker gets its own thread
+        """
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        thread.start()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "exported": self._exported,
+                "dropped": self._dropped,
+                "failed": self._failed,
+            }
+
+    @abstractmethod
+    def write(self, batch):
+        """
+        Sends one batch of finished spans, raising marks the batch as failed
+        """
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+                with self._lock:
+                    self._exported += len(batch)
+            except Exception as e: # Tracing must never take the service down
+                with self._lock:
+                    self._failed += len(batch)
+                log.warning("span_export_failed", dropped=len(batch), error=str(e))
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Appends one JSON object per span to a file
+    - Each batch is a single append, so workers can share the file
+    """
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+
+    def write(self, batch):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in batch)
+        with open(self.path, "a") as f:
+            f.write(lines)
+
+
+class OTLPSpanExporter(SpanExporter):
+    """
+    Posts spans to an OpenTelemetry collector as OTLP/HTTP JSON
+    """
+    def __init__(self, endpoint=DEFAULT_OTLP_ENDPOINT, timeout=5.0, **kwargs):
+        super().__init__(**kwargs)
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def write(self, batch):
+        by_service = {}
+        for span in batch:
+            by_service.setdefault(span.tracer.service_name, []).append(_otlp_span(span))
+        body = {"resourceSpans": [
+            {
+                "resource": {"attributes": _otlp_attributes({"service.name": service})},
+                "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+            }
+            for service, spans in by_service.items()
+        ]}
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+def _otlp_span(span):
+    otlp = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": OTLP_SPAN_KINDS.get(span.kind, 1),
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        otlp["parentSpanId"] = span.parent_id
+    return otlp
+
+def _otlp_attributes(attributes):
+    result = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        result.append({"key": key, "value": typed})
+    return result
+
+def create_exporter(kind, file_path, otlp_endpoint):
+    """
+    Returns the exporter for TRACING_EXPORTER ("file", "otlp"), None for "none"
+    - Raises ValueError for anything else
+    """
+    if kind == "none":
+        return None
+    if kind == "file":
+        return FileSpanExporter(file_path)
+    if kind == "otlp":
+        return OTLPSpanExporter(otlp_endpoint)
+    raise ValueError(f"Unknown TRACING_EXPORTER {kind}, expected none, file or otlp")
+
+
+TRACER = Tracer() # Shared by every module of this process
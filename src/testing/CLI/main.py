@@ -10,6 +10,7 @@ from dataclasses import dataclass
 
 from time import sleep
 
+import os
 import requests
 
 from textual.app import App, ComposeResult
@@ -18,9 +19,31 @@ from textual.screen import Screen
 from textual.reactive import reactive
 
 from auth_and_preferences import User, validate_credentials, VALID_USERS
+from common.jwks_verifier import JWKSVerifier, JWKSUnavailable
+from common.revocation import RevocationList
+from common.tracing import TRACER, create_exporter
 import preference_options
 
 BACKEND_URL = "http://127.0.0.1:7001"
+# The microservices' Redis, e.g. redis://:password@localhost:6379/0
+# Unset: a logged out token is still accepted until it expires (up to 10 minutes)
+SHARED_REDIS_URL = os.getenv("SHARED_REDIS_URL")
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none") # none, file or otlp, same settings as the backend
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+
+# Tokens revoked at logout, checked in memory through a Bloom filter kept in sync over Redis pub/sub
+revocation_list = None
+if SHARED_REDIS_URL:
+    revocation_list = RevocationList.from_url(SHARED_REDIS_URL)
+    revocation_list.start()
+
+# Verifies JWTs locally with the backend's cached public keys
+jwks_verifier = JWKSVerifier(BACKEND_URL, revocations=revocation_list)
+
+# The /verify-user fallback passes its traceparent on to the backend
+TRACER.configure("cli_frontend", create_exporter(TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT))
+TRACER.start()
 
 
 class AuthState:
@@ -105,14 +128,20 @@ class LoginScreen(BaseCLIScreen):
         raw = inp.value.strip()
 
         # If input is a valid token, proceed and save user info
-        headers = {"Authorization": raw}
-        resp = requests.get(f"{BACKEND_URL}/verify-user", headers=headers)
-        if not resp.json().get("success"):
+        # Verified locally against the backend's JWKS, falls back to /verify-user if it can't be fetched
+        with TRACER.span("cli verify token"):
+            try:
+                result = jwks_verifier.verify(raw)
+            except JWKSUnavailable:
+                with TRACER.span("GET /verify-user", "client", upstream="auth0_microservice"):
+                    headers = TRACER.inject({"Authorization": raw})
+                    result = requests.get(f"{BACKEND_URL}/verify-user", headers=headers).json()
+        if not result.get("success"):
             self._log("User verification failed.")
             self.clear_input()
             return
 
-        user_info = resp.json().get("user_info")
+        user_info = result.get("user_info")
         app.auth.user = User(username=user_info["email"])
         app.auth.username = app.auth.user.username
         app.pop_screen()
@@ -11,12 +11,34 @@ Way 2: Not used on this app. Uses JWT_SHARED_SECRET to verify user. Should only
 """
 
 from flask import Flask, redirect, request, url_for, render_template, make_response
-import jwt
+from common.jwks_verifier import JWKSVerifier, JWKSUnavailable
+from common.revocation import RevocationList
+from common.tracing import TRACER, create_exporter
+import os
 import requests
 
 BACKEND_URL = 'http://localhost:7001/'
+# The microservices' Redis, e.g. redis://:password@localhost:6379/0
+# Unset: a logged out token is still accepted until it expires (up to 10 minutes)
+SHARED_REDIS_URL = os.getenv("SHARED_REDIS_URL")
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none") # none, file or otlp, same settings as the backend
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
 app = Flask(__name__)
 
+# Tokens revoked at logout, checked in memory through a Bloom filter kept in sync over Redis pub/sub
+revocation_list = None
+if SHARED_REDIS_URL:
+    revocation_list = RevocationList.from_url(SHARED_REDIS_URL)
+    revocation_list.start()
+
+# Verifies JWTs locally with the backend's cached public keys
+jwks_verifier = JWKSVerifier(BACKEND_URL, revocations=revocation_list)
+
+# Login and /verify-user calls start the trace the backend microservices continue
+TRACER.configure("web_frontend", create_exporter(TRACING_EXPORTER, TRACING_FILE, TRACING_OTLP_ENDPOINT))
+TRACER.start()
+
 # ---------------------
 # Routes
 # ---------------------
@@ -26,8 +48,11 @@ def welcome():
 
 @app.route("/login")
 def login():
-    # Http 302 code response and URL
-    return redirect(f"{BACKEND_URL}/login?app-type=Flask")
+    # Http 302 code response and URL, the backend's /login joins this trace through ?traceparent=
+    with TRACER.span("GET /login", "server"):
+        traceparent = TRACER.current_traceparent()
+    trace_link = f"&traceparent={traceparent}" if traceparent else ""
+    return redirect(f"{BACKEND_URL}/login?app-type=Flask{trace_link}")
     
 @app.route("/calorie-counter/home")
 def calorie_counter_home():
@@ -40,15 +65,20 @@ def calorie_counter_home():
         print("Cookie not found")
         return redirect(url_for("login"))
 
-    # TODO Send request to backend/verify-user and decide to redirect based on the response.
-    # user_info can be in the response if it's successful.
-    headers = {"Authorization": token}
-    resp = requests.get(f"{BACKEND_URL}/verify-user", headers=headers)
-    if not resp.json().get("success"):
+    # Verify locally against the backend's JWKS, only call backend/verify-user if it can't be fetched.
+    # user_info is in the result if it's successful.
+    with TRACER.span("GET /calorie-counter/home", "server"):
+        try:
+            result = jwks_verifier.verify(token)
+        except JWKSUnavailable:
+            with TRACER.span("GET /verify-user", "client", upstream="auth0_microservice"):
+                headers = TRACER.inject({"Authorization": token})
+                result = requests.get(f"{BACKEND_URL}/verify-user", headers=headers).json()
+    if not result.get("success"):
         print("User verification failed.")
         return redirect(url_for("logout"))
 
-    return render_template("calorie-counter/home.html", user=resp.json().get("user_info"))
+    return render_template("calorie-counter/home.html", user=result.get("user_info"))
 
 @app.route("/logout")
 def logout():